@@ -0,0 +1,211 @@
+"""Controle de admissão: limita as requisições simultâneas por classe de prioridade.
+
+Cada classe tem o próprio semáforo e uma fila de espera limitada. Quem encontra a
+fila cheia, ou espera mais que o `timeout` da classe, recebe 503 com `Retry-After`
+na hora, em vez de segurar conexões do pool do Motor. Como as classes não
+compartilham vagas, relatórios pesados não atrasam escritas nem o CRUD.
+
+As rotas são classificadas em `ROUTE_CLASSES`; as demais vão para a classe padrão
+do router (ver app/main.py) ou, sem ela, `write` para escritas e `read` para GETs.
+Os limites vêm do ambiente, por classe: `ADMISSION_<CLASSE>_LIMIT`, `_QUEUE`,
+`_TIMEOUT` e `_RETRY_AFTER`.
+"""
+import asyncio
+import math
+import os
+from typing import Optional
+
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+
+from app import metrics
+from app.loops import PerLoop
+
+WRITE = "write"
+READ = "read"
+HEAVY = "heavy"
+
+# Rotas com classe própria; `None` deixa a rota fora do controle (streams longos)
+ROUTE_CLASSES: dict[tuple[str, str], Optional[str]] = {
+    ("GET", "/clients/total/schedules/by/client"): HEAVY,
+    ("GET", "/schedules/"): HEAVY,
+    ("GET", "/clients/export"): HEAVY,
+    ("GET", "/schedules/export"): HEAVY,
+    ("POST", "/import/"): HEAVY,
+    ("GET", "/schedules/feed"): None,
+}
+
+OVERLOADED = "Servidor sobrecarregado, tente novamente em instantes"
+
+admission_rejected = metrics.Counter(
+    "admission_rejected_total", "Requisições recusadas com 503 por classe de prioridade e motivo.",
+    ("class", "reason"),
+)
+
+
+class AdmissionPool:
+    """Semáforo com fila de espera limitada e contadores de admissão."""
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float, retry_after: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "timeout": 0}
+        self._semaphore = PerLoop(self._new_semaphore)
+
+    def _new_semaphore(self) -> asyncio.Semaphore:
+        # Vagas de outro loop não voltam: o app que as segurava já terminou
+        self.active = 0
+        self.waiting = 0
+        return asyncio.Semaphore(self.limit)
+
+    def _reject(self, reason: str) -> HTTPException:
+        self.rejected[reason] += 1
+        admission_rejected.inc((self.name, reason))
+        return HTTPException(
+            status_code=503, detail=OVERLOADED, headers={"Retry-After": str(math.ceil(self.retry_after))}
+        )
+
+    async def acquire(self) -> None:
+        semaphore = self._semaphore.get()
+        if semaphore.locked():
+            if self.waiting >= self.queue_size:
+                raise self._reject("queue_full")
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("timeout")
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+
+        self.active += 1
+        self.admitted += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.get().release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+
+def _pool(name: str, limit: int, queue_size: int, timeout: float, retry_after: float) -> AdmissionPool:
+    prefix = f"ADMISSION_{name.upper()}"
+    return AdmissionPool(
+        name,
+        limit=int(os.getenv(f"{prefix}_LIMIT", str(limit))),
+        queue_size=int(os.getenv(f"{prefix}_QUEUE", str(queue_size))),
+        timeout=float(os.getenv(f"{prefix}_TIMEOUT", str(timeout))),
+        retry_after=float(os.getenv(f"{prefix}_RETRY_AFTER", str(retry_after))),
+    )
+
+
+# A soma dos limites deve caber no MONGO_MAX_POOL_SIZE (padrão 100)
+POOLS = {
+    WRITE: _pool(WRITE, limit=40, queue_size=200, timeout=10, retry_after=1),
+    READ: _pool(READ, limit=40, queue_size=100, timeout=5, retry_after=1),
+    HEAVY: _pool(HEAVY, limit=4, queue_size=8, timeout=2, retry_after=5),
+}
+
+
+def priority_class(method: str, path: str, default: Optional[str] = None) -> Optional[str]:
+    if (method, path) in ROUTE_CLASSES:
+        return ROUTE_CLASSES[(method, path)]
+    if default is not None:
+        return default
+    return READ if method in ("GET", "HEAD") else WRITE
+
+
+# Chave do escopo ASGI com as vagas que o `AdmissionMiddleware` libera ao fim da resposta
+HELD_SLOTS = "admission.held"
+
+
+class Admission:
+    """Dependência que segura uma vaga da classe da rota até o fim da resposta.
+
+    Com o `AdmissionMiddleware` a vaga só é liberada depois do último pedaço do
+    corpo, o que cobre as respostas em streaming: o FastAPI encerra as
+    dependências com `yield` antes de iterar o corpo de um `StreamingResponse`.
+    """
+
+    def __init__(self, default: Optional[str] = None):
+        self.default = default
+
+    async def __call__(self, connection: HTTPConnection):
+        route = connection.scope.get("route")
+        name = None
+        if connection.scope["type"] == "http" and route is not None:
+            name = priority_class(connection.scope["method"], route.path, self.default)
+
+        if name is None:
+            yield
+            return
+
+        pool = POOLS[name]
+        await pool.acquire()
+        held = connection.scope.get(HELD_SLOTS)
+        if held is not None:
+            held.append(pool)
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            pool.release()
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI que libera as vagas de admissão depois da resposta inteira, ou na desconexão."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        held: list[AdmissionPool] = []
+        try:
+            await self.app({**scope, HELD_SLOTS: held}, receive, send)
+        finally:
+            for pool in held:
+                pool.release()
+
+
+def limit(default: Optional[str] = None) -> Admission:
+    """Dependência de admissão para um router; `default` é a classe das rotas fora de `ROUTE_CLASSES`."""
+    return Admission(default)
+
+
+def stats() -> dict:
+    return {name: pool.stats() for name, pool in POOLS.items()}
+
+
+metrics.REGISTRY.extend([
+    metrics.Gauge(
+        "admission_active_requests", "Requisições em execução por classe de prioridade.",
+        ("class",), lambda: {(name,): pool.active for name, pool in POOLS.items()},
+    ),
+    metrics.Gauge(
+        "admission_waiting_requests", "Requisições na fila de espera por classe de prioridade.",
+        ("class",), lambda: {(name,): pool.waiting for name, pool in POOLS.items()},
+    ),
+    admission_rejected,
+])
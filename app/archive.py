@@ -0,0 +1,239 @@
+"""Arquivamento dos agendamentos antigos em coleções por ano.
+
+A coleção `schedule` fica só com os agendamentos recentes; os anteriores ao
+horizonte (`ARCHIVE_HORIZON_DAYS` dias antes da execução) são movidos em lotes
+para `schedule_archive_<ano>`, pelo ano de `date_schedule`. O documento
+`schedule` em `archive_state` guarda até que data já houve arquivamento e quais
+anos existem, e as leituras por período consultam só os arquivos que cobrem o
+intervalo. Os contadores de app.stats continuam incluindo os arquivados.
+
+    python -m app.archive                       # arquiva o que passou do horizonte
+    python -m app.archive --status
+    python -m app.archive --horizon-days 180 --batch-size 500 --pause 0.05
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from odmantic import AIOEngine
+from odmantic.engine import AIOCursor
+from pymongo import ReplaceOne
+
+from app.availability import naive_utc
+from app.database import get_engine, run_in_transaction
+from app.loops import PerLoop
+from app.models.Schedule import Schedule
+from app.models.indexes import INDEXES
+from app.versions import collection_versions
+
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "365"))
+ARCHIVE_PREFIX = "schedule_archive_"
+STATE_COLLECTION = "archive_state"
+# Versão em `collection_versions` incrementada a cada mudança do estado do arquivo
+STATE_VERSION = "schedule_archive"
+
+
+def archive_name(year: int) -> str:
+    return f"{ARCHIVE_PREFIX}{year}"
+
+
+class ArchiveState:
+    """Cópia local de `archive_state` de cada banco, relida quando a versão `schedule_archive` muda."""
+
+    def __init__(self):
+        # Nome do banco -> (versão, archived_before, anos); com STORE_DATABASES cada loja tem o seu
+        self._databases: dict[str, tuple[Optional[int], Optional[datetime], list[int]]] = {}
+        self._lock = PerLoop(asyncio.Lock)
+
+    def _current(self) -> tuple[Optional[int], Optional[datetime], list[int]]:
+        return self._databases.get(get_engine().database.name, (None, None, []))
+
+    @property
+    def archived_before(self) -> Optional[datetime]:
+        return self._current()[1]
+
+    @property
+    def years(self) -> list[int]:
+        return self._current()[2]
+
+    async def refresh(self) -> None:
+        version = (await collection_versions.get(STATE_VERSION))[0]
+        if version == self._current()[0]:
+            return
+
+        async with self._lock.get():
+            if version == self._current()[0]:
+                return
+            database = get_engine().database
+            doc = await database[STATE_COLLECTION].find_one({"_id": Schedule.__collection__}) or {}
+            self._databases[database.name] = (version, doc.get("archived_before"), sorted(doc.get("years", [])))
+
+    async def collections(self, start: Optional[datetime], end: Optional[datetime]) -> list[AsyncIOMotorCollection]:
+        """Coleções de arquivo, em ordem de ano, que podem ter agendamentos em [`start`, `end`)."""
+        await self.refresh()
+        if self.archived_before is None or (start is not None and naive_utc(start) >= self.archived_before):
+            return []
+
+        first = naive_utc(start).year if start is not None else None
+        last = None
+        if end is not None:
+            end = naive_utc(end)
+            last = end.year if end > datetime(end.year, 1, 1) else end.year - 1
+
+        database = get_engine().database
+        return [
+            database[archive_name(year)]
+            for year in self.years
+            if (first is None or year >= first) and (last is None or year <= last)
+        ]
+
+
+archive_state = ArchiveState()
+
+
+async def find_schedules(
+    engine: AIOEngine, start: Optional[datetime], end: Optional[datetime], *queries, sort=None
+) -> list[Schedule]:
+    """`engine.find(Schedule, *queries)` na coleção principal e nos arquivos do intervalo."""
+    archives = await archive_state.collections(start, end)
+    hot = engine.find(Schedule, *queries, sort=sort)
+    if not archives:
+        return await hot
+
+    # O ODMantic só busca na coleção do modelo; o pipeline dele resolve as referências
+    pipeline = engine._prepare_find_pipeline(Schedule, *queries, sort=sort)
+    results = await asyncio.gather(hot, *(AIOCursor(Schedule, archive.aggregate(pipeline)) for archive in archives))
+
+    schedules = {}
+    for schedule in (schedule for tier in reversed(results[1:]) for schedule in tier):
+        schedules[schedule.id] = schedule
+    for schedule in results[0]:
+        schedules[schedule.id] = schedule
+    return list(schedules.values())
+
+
+async def with_archives(pipeline: list[dict], start: Optional[datetime], end: Optional[datetime]) -> list[dict]:
+    """Acrescenta ao pipeline de agregação um `$unionWith` por arquivo do intervalo.
+
+    O `$match` inicial, se houver, é repetido dentro de cada `$unionWith`.
+    """
+    archives = await archive_state.collections(start, end)
+    if not archives:
+        return pipeline
+
+    match = pipeline[:1] if pipeline and "$match" in pipeline[0] else []
+    unions = [{"$unionWith": {"coll": archive.name, "pipeline": match}} for archive in archives]
+    return [*match, *unions, *pipeline[len(match):]]
+
+
+async def _publish(before: datetime, years: list[int]) -> None:
+    await get_engine().database[STATE_COLLECTION].update_one(
+        {"_id": Schedule.__collection__},
+        {"$max": {"archived_before": before}, "$addToSet": {"years": {"$each": years}}},
+        upsert=True,
+    )
+    await collection_versions.bump(STATE_VERSION, Schedule.__collection__)
+
+
+async def _move(hot: AsyncIOMotorCollection, filters: dict, batch_size: int, pause: float) -> int:
+    """Move em lotes para os arquivos os agendamentos de `filters`, na ordem do índice da data."""
+    database = get_engine().database
+    moved = 0
+    while True:
+        docs = await hot.find(filters).sort([("date_schedule", 1), ("_id", 1)]).limit(batch_size).to_list(length=None)
+        if not docs:
+            break
+
+        by_year: dict[int, list[dict]] = {}
+        for doc in docs:
+            by_year.setdefault(doc["date_schedule"].year, []).append(doc)
+
+        async def callback(session) -> None:
+            # `ReplaceOne` com upsert torna o lote repetível se a execução anterior parou no meio
+            for year, year_docs in by_year.items():
+                await database[archive_name(year)].bulk_write(
+                    [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in year_docs],
+                    ordered=False,
+                    session=session,
+                )
+            await hot.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}}, session=session)
+
+        await run_in_transaction(callback)
+        moved += len(docs)
+
+        if pause:
+            await asyncio.sleep(pause)
+
+    return moved
+
+
+async def run(before: datetime, batch_size: int = 1000, pause: float = 0.0) -> int:
+    """Move para os arquivos os agendamentos anteriores a `before` e retorna quantos foram movidos."""
+    before = naive_utc(before)
+    database = get_engine().database
+    hot = get_engine().get_collection(Schedule)
+
+    # Uma passada por loja, para as consultas usarem os índices que começam por `store_id`
+    filters = [
+        {"store_id": store, "date_schedule": {"$lt": before}} for store in sorted(await hot.distinct("store_id"))
+    ]
+    years = set()
+    for store_filters in filters:
+        oldest = await hot.find_one(store_filters, {"date_schedule": 1}, sort=[("date_schedule", 1)])
+        if oldest is not None:
+            newest = await hot.find_one(store_filters, {"date_schedule": 1}, sort=[("date_schedule", -1)])
+            years.update(range(oldest["date_schedule"].year, newest["date_schedule"].year + 1))
+    if not years:
+        return 0
+
+    years = sorted(years)
+    for year in years:
+        await database[archive_name(year)].create_indexes(INDEXES[Schedule])
+
+    # As leituras passam a consultar os arquivos antes de qualquer documento sair de `schedule`;
+    # a espera cobre a cópia local das versões nos outros workers
+    await _publish(before, years)
+    await asyncio.sleep(collection_versions.ttl)
+
+    moved = 0
+    for store_filters in filters:
+        moved += await _move(hot, store_filters, batch_size, pause)
+
+    await collection_versions.bump(Schedule.__collection__)
+    return moved
+
+
+async def status() -> dict:
+    await archive_state.refresh()
+    database = get_engine().database
+    return {
+        "archived_before": archive_state.archived_before,
+        "hot": await get_engine().get_collection(Schedule).estimated_document_count(),
+        "archives": {
+            archive_name(year): await database[archive_name(year)].estimated_document_count()
+            for year in archive_state.years
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arquiva os agendamentos anteriores ao horizonte")
+    parser.add_argument("--status", action="store_true", help="Só mostra o estado do arquivo")
+    parser.add_argument("--horizon-days", type=int, default=ARCHIVE_HORIZON_DAYS)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.0, help="Segundos de pausa entre lotes")
+    args = parser.parse_args()
+
+    if args.status:
+        report = asyncio.run(status())
+        print(f"arquivado antes de: {report['archived_before']}")
+        print(f"{Schedule.__collection__:<25} {report['hot']}")
+        for name, count in report["archives"].items():
+            print(f"{name:<25} {count}")
+    else:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=args.horizon_days)
+        moved = asyncio.run(run(cutoff, args.batch_size, args.pause))
+        print(f"{moved} agendamentos arquivados (anteriores a {naive_utc(cutoff):%Y-%m-%d})")
@@ -0,0 +1,221 @@
+import asyncio
+import time
+from bisect import bisect_left, insort
+from datetime import date, datetime, time as dtime, timedelta, timezone
+
+from odmantic import ObjectId
+
+from app.database import get_engine
+from app.loops import PerLoop
+from app.models.Schedule import Schedule
+from app.stores import get_store, store_filter
+
+
+# Maior duração esperada de um agendamento: limita, pelo índice da data, a busca dos que começam antes do dia
+MAX_SCHEDULE_SPAN = timedelta(days=1)
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Normaliza datas com fuso para UTC sem fuso, como o MongoDB devolve."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class _Day:
+    """Intervalos de um dia ordenados pelo início.
+
+    Para cada prefixo guarda o maior fim (e o id dono dele) e o segundo maior,
+    assim a checagem de conflito é uma busca binária, mesmo ignorando um id.
+    """
+
+    def __init__(self, intervals: list[tuple[datetime, datetime, ObjectId]]):
+        self.intervals = sorted(intervals)
+        self.loaded_at = time.monotonic()
+        self._index()
+
+    def _index(self) -> None:
+        self.starts = [start for start, _, _ in self.intervals]
+        self.best: list[tuple[datetime, ObjectId]] = []
+        self.second: list[datetime | None] = []
+
+        best, second = None, None
+        for _, end, schedule_id in self.intervals:
+            if best is None or end > best[0]:
+                second = best[0] if best else None
+                best = (end, schedule_id)
+            elif second is None or end > second:
+                second = end
+            self.best.append(best)
+            self.second.append(second)
+
+    def add(self, start: datetime, end: datetime, schedule_id: ObjectId) -> None:
+        insort(self.intervals, (start, end, schedule_id))
+        self._index()
+
+    def remove(self, schedule_id: ObjectId) -> None:
+        self.intervals = [interval for interval in self.intervals if interval[2] != schedule_id]
+        self._index()
+
+    def overlaps(self, start: datetime, end: datetime, exclude: ObjectId | None = None) -> bool:
+        # Só os intervalos que começam antes de `end` podem conflitar
+        position = bisect_left(self.starts, end)
+        if position == 0:
+            return False
+
+        best_end, best_id = self.best[position - 1]
+        if best_id != exclude:
+            return best_end > start
+
+        second = self.second[position - 1]
+        return second is not None and second > start
+
+
+class AvailabilityIndex:
+    """Índice em memória dos horários ocupados por loja e dia.
+
+    Cada dia tem os agendamentos que ocupam algum horário dele, inclusive os
+    que começam no dia anterior e passam da meia-noite, com o término gravado
+    em `end_time`. O dia expira após `ttl` segundos, para incorporar escritas
+    de outros workers. `durations` recebe ids de serviços e devolve
+    `{id: Services}`; só é usado nos agendamentos ainda sem `end_time`.
+
+    O cache e o `lock` só valem para este processo: depois de gravar, as rotas
+    chamam `confirm`, que relê os dias do banco e aponta as reservas que
+    conflitam com gravações de outros workers, para que sejam desfeitas.
+    """
+
+    def __init__(self, durations, ttl: float, opening: dtime, closing: dtime, step_minutes: int):
+        self._durations = durations
+        self.ttl = ttl
+        self.opening = opening
+        self.closing = closing
+        self.step = timedelta(minutes=step_minutes)
+        self._lock = PerLoop(asyncio.Lock)
+        self._days: dict[tuple[str, date], _Day] = {}
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """Serializa checagem e gravação de horários neste processo."""
+        return self._lock.get()
+
+    async def duration(self, service_ids) -> timedelta:
+        services = await self._durations(service_ids)
+        return timedelta(minutes=sum(services[service_id].duration_in_minutes for service_id in service_ids if service_id in services))
+
+    async def _load(self, days: list[date]) -> dict[date, _Day]:
+        """Carrega os dias informados numa única consulta, uma faixa de `date_schedule` por sequência de dias seguidos."""
+        bounds = {day: (datetime.combine(day, dtime.min), datetime.combine(day, dtime.min) + timedelta(days=1)) for day in days}
+        runs = []
+        for start, end in sorted(bounds.values()):
+            if runs and runs[-1][1] >= start:
+                runs[-1][1] = max(runs[-1][1], end)
+            else:
+                runs.append([start, end])
+        ranges = [
+            {**store_filter(), "date_schedule": {"$gte": start - MAX_SCHEDULE_SPAN, "$lt": end}}
+            for start, end in runs
+        ]
+        cursor = get_engine().get_collection(Schedule).find(
+            ranges[0] if len(ranges) == 1 else {"$or": ranges},
+            {"date_schedule": 1, "end_time": 1, "services": 1},
+        )
+
+        docs = await cursor.to_list(length=None)
+        legacy = [doc for doc in docs if doc.get("end_time") is None]
+        services = await self._durations({service_id for doc in legacy for service_id in doc["services"]}) if legacy else {}
+
+        intervals = []
+        for doc in docs:
+            finish = doc.get("end_time")
+            if finish is None:
+                minutes = sum(services[service_id].duration_in_minutes for service_id in doc["services"] if service_id in services)
+                finish = doc["date_schedule"] + timedelta(minutes=minutes)
+            intervals.append((doc["date_schedule"], finish, doc["_id"]))
+
+        return {
+            day: _Day([interval for interval in intervals if interval[0] < end and interval[1] > start])
+            for day, (start, end) in bounds.items()
+        }
+
+    @staticmethod
+    def _dates(start: datetime, end: datetime) -> list[date]:
+        """Dias com algum horário em [`start`, `end`)."""
+        last = max(start, end - timedelta(microseconds=1)).date()
+        return [start.date() + timedelta(days=offset) for offset in range((last - start.date()).days + 1)]
+
+    async def day(self, day: date) -> _Day:
+        key = (get_store(), day)
+        cached = self._days.get(key)
+        if cached is None or time.monotonic() - cached.loaded_at >= self.ttl:
+            cached = self._days[key] = (await self._load([day]))[day]
+        return cached
+
+    async def preload(self, spans: list[tuple[datetime, datetime]]) -> None:
+        """Carrega numa só consulta os dias dos intervalos que ainda não estão em cache."""
+        store, now = get_store(), time.monotonic()
+        missing = sorted({
+            day
+            for start, end in spans
+            for day in self._dates(naive_utc(start), naive_utc(end))
+            if (cached := self._days.get((store, day))) is None or now - cached.loaded_at >= self.ttl
+        })
+        if missing:
+            for day, index in (await self._load(missing)).items():
+                self._days[(store, day)] = index
+
+    async def is_free(self, start: datetime, end: datetime, exclude: ObjectId | None = None) -> bool:
+        start, end = naive_utc(start), naive_utc(end)
+        for day in self._dates(start, end):
+            if (await self.day(day)).overlaps(start, end, exclude):
+                return False
+        return True
+
+    async def confirm(self, bookings: list[tuple[datetime, datetime, ObjectId]]) -> set[ObjectId]:
+        """Ids das reservas já gravadas que conflitam com outro agendamento no banco.
+
+        Os dias são relidos do banco e substituem os do cache. Duas gravações
+        simultâneas no mesmo horário se enxergam ao menos de um lado: uma delas,
+        ou as duas, é desfeita, nunca as duas mantidas.
+        """
+        bookings = [(naive_utc(start), naive_utc(end), schedule_id) for start, end, schedule_id in bookings]
+        loaded = await self._load(sorted({day for start, end, _ in bookings for day in self._dates(start, end)}))
+
+        store = get_store()
+        for day, index in loaded.items():
+            self._days[(store, day)] = index
+
+        return {
+            schedule_id
+            for start, end, schedule_id in bookings
+            if any(loaded[day].overlaps(start, end, schedule_id) for day in self._dates(start, end))
+        }
+
+    async def add(self, start: datetime, end: datetime, schedule_id: ObjectId) -> None:
+        # Dias ainda não carregados leem o agendamento do banco quando forem usados
+        start, end = naive_utc(start), naive_utc(end)
+        for day in self._dates(start, end):
+            cached = self._days.get((get_store(), day))
+            if cached is not None:
+                cached.add(start, end, schedule_id)
+
+    def remove(self, start: datetime, schedule_id: ObjectId) -> None:
+        start = naive_utc(start)
+        for day in self._dates(start, start + MAX_SCHEDULE_SPAN):
+            cached = self._days.get((get_store(), day))
+            if cached is not None:
+                cached.remove(schedule_id)
+
+    async def free_slots(self, day: date, duration: timedelta) -> list[dict]:
+        """Lista os horários livres do dia para um atendimento com a duração informada."""
+        index = await self.day(day)
+
+        slots = []
+        start = datetime.combine(day, self.opening)
+        closing = datetime.combine(day, self.closing)
+        while start + duration <= closing:
+            if not index.overlaps(start, start + duration):
+                slots.append({"start": start, "end": start + duration})
+            start += self.step
+
+        return slots
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import time
+
+from app.stores import get_store
+from app.versions import collection_versions
+
+
+class ResultCache:
+    """Cache em memória de resultados por chave e loja, com expiração em `ttl` segundos.
+
+    Requisições simultâneas pela mesma chave ausente compartilham um único
+    cálculo. A chave inclui as versões de `collections`, então escritas de
+    qualquer worker descartam os resultados assim que a versão chega a este
+    processo; `invalidate()` descarta tudo na hora.
+    """
+
+    def __init__(self, ttl: float, collections: tuple[str, ...] = ()):
+        self.ttl = ttl
+        self.collections = collections
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[tuple, tuple[float, object]] = {}
+        self._pending: dict[tuple, asyncio.Future] = {}
+        self._generation = 0
+        self._versions: tuple[int, ...] | None = None
+
+    async def get_or_compute(self, key: tuple, compute):
+        versions = await collection_versions.get(*self.collections)
+        if versions != self._versions:
+            # Resultados de versões anteriores nunca mais serão lidos
+            self.invalidate()
+            self._versions = versions
+
+        key = (get_store(), versions, *key)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        generation = self._generation
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+
+        try:
+            value = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            # Resultados calculados antes de uma invalidação não são guardados
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+            return value
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+analytics_cache = ResultCache(
+    ttl=float(os.getenv("ANALYTICS_CACHE_TTL", "300")), collections=("schedule", "services", "client", "pet")
+)
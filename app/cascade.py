@@ -0,0 +1,70 @@
+from odmantic import ObjectId
+
+from app import stats
+from app.cache import analytics_cache
+from app.archive import archive_state
+from app.availability import AvailabilityIndex
+from app.database import get_engine, run_in_transaction
+from app.stores import store_filter
+from app.versions import collection_versions
+from app.models.Client import Client
+from app.models.Pet import Pet
+from app.models.Schedule import Schedule
+
+
+async def _delete_in_order(
+    steps: list[tuple[type, dict]], availability: AvailabilityIndex | None = None
+) -> dict[str, int]:
+    """Executa um `delete_many` por coleção, na ordem informada, numa única transação.
+
+    Os dependentes vêm primeiro, assim uma falha sem transação nunca deixa órfãos.
+    Os agendamentos também são removidos das coleções de arquivo e, se informado,
+    do índice de horários (`availability`), só nos dias que ocupavam.
+    """
+    engine = get_engine()
+    archives = await archive_state.collections(None, None)
+    removed: list[dict] = []
+
+    async def callback(session) -> dict[str, int]:
+        deleted = {}
+        removed.clear()
+        for model, filters in steps:
+            # Ids são únicos entre as lojas; a loja no filtro direciona a remoção ao shard dela
+            filters = {**filters, **store_filter()}
+            archived = 0
+            if model is Schedule:
+                for archive in archives:
+                    await stats.remove_matching(filters, session, archive)
+                    archived += (await archive.delete_many(filters, session=session)).deleted_count
+                await stats.remove_matching(filters, session)
+                if availability is not None:
+                    cursor = engine.get_collection(model).find(filters, {"date_schedule": 1}, session=session)
+                    removed.extend(await cursor.to_list(length=None))
+            result = await engine.get_collection(model).delete_many(filters, session=session)
+            deleted[model.__collection__] = result.deleted_count + archived
+        return deleted
+
+    deleted = await run_in_transaction(callback)
+    for doc in removed:
+        availability.remove(doc["date_schedule"], doc["_id"])
+    analytics_cache.invalidate()
+    await collection_versions.bump(*(model.__collection__ for model, _ in steps))
+
+    return deleted
+
+
+async def delete_client_cascade(client_id: ObjectId, availability: AvailabilityIndex | None = None) -> dict[str, int]:
+    """Remove o cliente com seus agendamentos e pets, retornando as contagens por coleção."""
+    return await _delete_in_order([
+        (Schedule, {"client": client_id}),
+        (Pet, {"client": client_id}),
+        (Client, {"_id": client_id}),
+    ], availability)
+
+
+async def delete_pet_cascade(pet_id: ObjectId, availability: AvailabilityIndex | None = None) -> dict[str, int]:
+    """Remove o pet com seus agendamentos, retornando as contagens por coleção."""
+    return await _delete_in_order([
+        (Schedule, {"pet": pet_id}),
+        (Pet, {"_id": pet_id}),
+    ], availability)
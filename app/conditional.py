@@ -0,0 +1,50 @@
+import hashlib
+import os
+
+from fastapi import HTTPException, Request, Response
+
+from app.formats import negotiate
+from app.stores import get_store
+from app.versions import collection_versions
+
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "0"))
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+class ConditionalGet:
+    """Dependência de GETs condicionais: ETag derivado da loja, da URL, do formato e das versões de `collections`.
+
+    Se o `If-None-Match` do cliente bate com o ETag atual, responde 304 antes do
+    handler rodar, sem consultar as coleções. Caso contrário aplica `ETag` e
+    `Cache-Control` à resposta e devolve os cabeçalhos, para handlers que montam
+    o próprio `Response`.
+    """
+
+    def __init__(self, *collections: str, max_age: int = HTTP_CACHE_MAX_AGE):
+        self.collections = collections
+        self.max_age = max_age
+
+    async def __call__(self, request: Request, response: Response) -> dict[str, str]:
+        versions = await collection_versions.get(*self.collections)
+
+        media_type = negotiate(request.headers.get("accept"))
+        key = f"{get_store()}|{request.url.path}?{sorted(request.query_params.multi_items())}|{media_type}|{versions}"
+        headers = {
+            "ETag": f'"{hashlib.sha1(key.encode()).hexdigest()[:20]}"',
+            "Cache-Control": f"private, max-age={self.max_age}, must-revalidate",
+            # A loja e o formato podem vir dos cabeçalhos, com a mesma URL
+            "Vary": "X-Store-Id, Accept",
+        }
+
+        if _matches(request.headers.get("if-none-match"), headers["ETag"]):
+            raise HTTPException(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+        return headers
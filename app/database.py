@@ -1,20 +1,136 @@
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from odmantic import AIOEngine
+from pymongo import ReadPreference
+import asyncio
+import logging
 import os
 
+from app.metrics import command_metrics, propagate_context_to_motor
+from app.stores import StoreEngine, database_name, get_store
+
+logger = logging.getLogger(__name__)
+
 # Carregar variáveis do arquivo .env
 load_dotenv()
-print(os.getenv("MONGO_URI")) 
 
 # MongoDB connection
 DATABASE_URL = os.getenv("url")
 
-client = AsyncIOMotorClient(DATABASE_URL)
+DATABASE_NAME = os.getenv("MONGO_DB", "petshop_db")
+
+# Conexões abertas na inicialização; padrão é o `minPoolSize`
+WARMUP_CONNECTIONS = int(os.getenv("MONGO_WARMUP_CONNECTIONS", os.getenv("MONGO_MIN_POOL_SIZE", "0")))
+
+
+def client_options() -> dict:
+    """Opções do `AsyncIOMotorClient` lidas do ambiente."""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "20000")),
+        "event_listeners": [command_metrics],
+    }
+
+    if os.getenv("MONGO_MAX_IDLE_TIME_MS"):
+        options["maxIdleTimeMS"] = int(os.getenv("MONGO_MAX_IDLE_TIME_MS"))
+    if os.getenv("MONGO_SOCKET_TIMEOUT_MS"):
+        options["socketTimeoutMS"] = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS"))
+    if os.getenv("MONGO_COMPRESSORS"):
+        # Ex.: "zstd,snappy"; exigem os pacotes zstandard e python-snappy
+        options["compressors"] = os.getenv("MONGO_COMPRESSORS")
+    if os.getenv("MONGO_READ_PREFERENCE"):
+        options["readPreference"] = os.getenv("MONGO_READ_PREFERENCE")
+
+    return options
+
+
+_client: AsyncIOMotorClient | None = None
+# Um engine por banco; com STORE_DATABASES cada loja tem o seu
+_engines: dict[str, AIOEngine] = {}
 
-db = client["petshop_db"]
 
-engine = AIOEngine(client=client, database="petshop_db")
+def get_client() -> AsyncIOMotorClient:
+    """Cliente do MongoDB, criado na primeira chamada (normalmente pelo `connect`)."""
+    global _client
+
+    if _client is None:
+        propagate_context_to_motor()
+        _client = AsyncIOMotorClient(DATABASE_URL, **client_options())
+
+    return _client
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    """Banco da loja corrente (app.stores)."""
+    return get_client()[database_name(DATABASE_NAME, get_store())]
+
+
+def get_shared_database() -> AsyncIOMotorDatabase:
+    """Banco principal, comum a todas as lojas mesmo com STORE_DATABASES."""
+    return get_client()[DATABASE_NAME]
+
 
 def get_engine() -> AIOEngine:
+    """Engine do banco da loja corrente, que filtra as buscas por `store_id`."""
+    name = database_name(DATABASE_NAME, get_store())
+
+    engine = _engines.get(name)
+    if engine is None:
+        engine = _engines[name] = StoreEngine(client=get_client(), database=name)
+
     return engine
+
+
+async def warm_up(connections: int = WARMUP_CONNECTIONS) -> None:
+    """Abre `connections` conexões do pool com pings simultâneos."""
+    admin = get_client().admin
+    await asyncio.gather(*(admin.command("ping") for _ in range(max(connections, 1))))
+
+
+async def connect() -> AIOEngine:
+    """Cria o cliente e aquece o pool; chamado no lifespan do app."""
+    engine = get_engine()
+    try:
+        await warm_up()
+    except Exception as e:
+        logger.warning("Falha ao aquecer as conexões com o MongoDB: %s", e)
+    return engine
+
+
+def close() -> None:
+    """Fecha o cliente; o próximo `get_engine` cria outro no loop corrente."""
+    global _client, _transactions_supported
+
+    if _client is not None:
+        _client.close()
+
+    _client = None
+    _engines.clear()
+    _transactions_supported = None
+
+
+_transactions_supported: bool | None = None
+
+async def supports_transactions() -> bool:
+    """Indica se o servidor aceita transações (replica set ou cluster shardeado)."""
+    global _transactions_supported
+
+    if _transactions_supported is None:
+        hello = await get_client().admin.command("hello")
+        _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    return _transactions_supported
+
+async def run_in_transaction(callback):
+    """Executa `callback(session)` dentro de uma transação quando o servidor suporta.
+
+    Em servidores standalone o callback recebe `None` e roda sem transação.
+    """
+    if not await supports_transactions():
+        return await callback(None)
+
+    async with await get_client().start_session() as session:
+        # Transações só leem do primário, mesmo com MONGO_READ_PREFERENCE configurado
+        return await session.with_transaction(callback, read_preference=ReadPreference.PRIMARY)
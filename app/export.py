@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app import formats
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+    msgpack = "msgpack"
+    bson = "bson"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+    ExportFormat.msgpack: formats.MSGPACK,
+    ExportFormat.bson: formats.BSON,
+}
+
+# Formatos binários: um documento por vez, concatenados, sem converter ids e datas
+BINARY_ENCODERS = {
+    ExportFormat.msgpack: formats.pack,
+    ExportFormat.bson: formats.bson_dumps,
+}
+
+
+def negotiated_format(
+    requested: Optional[ExportFormat] = Query(None, alias="format"),
+    media_type: str = Depends(formats.response_format),
+) -> ExportFormat:
+    """Dependência com o formato da exportação: `format` ou, sem ele, o `Accept` (padrão NDJSON)."""
+    if requested is None:
+        by_media_type = {value: key for key, value in MEDIA_TYPES.items()}
+        return by_media_type.get(media_type, ExportFormat.ndjson)
+
+    if requested is ExportFormat.msgpack and formats.msgpack is None:
+        raise HTTPException(status_code=406, detail="Formato msgpack indisponível: instale o pacote msgpack")
+    return requested
+
+
+def _plain(value):
+    """Converte valores BSON para tipos serializáveis em JSON."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _csv_value(value):
+    value = _plain(value)
+    if isinstance(value, list):
+        return ";".join(str(item) for item in value)
+    return value
+
+
+def _chunk(docs: list[dict], fields: list[str], export_format: ExportFormat) -> str | bytes:
+    if export_format in BINARY_ENCODERS:
+        encode = BINARY_ENCODERS[export_format]
+        return b"".join(encode({field: doc.get(field) for field in fields}) for doc in docs)
+
+    if export_format is ExportFormat.ndjson:
+        return "".join(
+            json.dumps({field: _plain(doc.get(field)) for field in fields}, ensure_ascii=False) + "\n"
+            for doc in docs
+        )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_csv_value(doc.get(field)) for field in fields] for doc in docs)
+    return buffer.getvalue()
+
+
+async def _stream(cursors: list, fields: list[str], export_format: ExportFormat, batch_size: int):
+    if export_format is ExportFormat.csv:
+        yield ",".join(fields) + "\r\n"
+
+    docs = []
+    for cursor in cursors:
+        async for doc in cursor:
+            docs.append(doc)
+            if len(docs) >= batch_size:
+                yield _chunk(docs, fields, export_format)
+                docs = []
+
+    if docs:
+        yield _chunk(docs, fields, export_format)
+
+
+def export_response(
+    collection: AsyncIOMotorCollection | list[AsyncIOMotorCollection],
+    filters: dict,
+    fields: list[str],
+    export_format: ExportFormat,
+    batch_size: int,
+    filename: str,
+    sort: list[tuple[str, int]] | None = None,
+) -> StreamingResponse:
+    """Exporta os documentos em streaming direto do cursor, lote a lote.
+
+    Só os campos em `fields` são lidos do banco, e no máximo `batch_size`
+    documentos ficam em memória por vez. Com uma lista de coleções, elas são
+    lidas uma após a outra.
+    """
+    collections = collection if isinstance(collection, list) else [collection]
+    cursors = []
+    for item in collections:
+        cursor = item.find(filters, {field: 1 for field in fields}, batch_size=batch_size)
+        cursors.append(cursor.sort(sort) if sort else cursor)
+
+    return StreamingResponse(
+        _stream(cursors, fields, export_format, batch_size),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"',
+            "Vary": "Accept",
+        },
+    )
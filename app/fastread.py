@@ -0,0 +1,91 @@
+"""Leitura rápida das listagens: documentos crus do Motor, com projeção, serializados pelo orjson.
+
+Evita montar os modelos do ODMantic e revalidá-los no `response_model`. As
+referências (`client`, `pet`) saem como ids, sem buscar o documento referenciado.
+Também serve os formatos binários negociados pelo `Accept` (app.formats).
+"""
+import orjson
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.responses import Response
+from odmantic import Model
+
+from app.database import get_engine
+from app.formats import ENCODERS, JSON
+from app.pagination import after_filter, decode_cursor, encode_cursor
+from app.search import SEARCH_FIELDS
+from app.stores import store_filter
+
+FIELDS_DESCRIPTION = (
+    "Campos separados por vírgula (ex.: `id,name`); envie vazio para todos. "
+    "Usa a leitura rápida, com referências devolvidas como ids"
+)
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    """JSON pelo orjson, aceitando `ObjectId` e `datetime` do BSON."""
+    return orjson.dumps(content, default=_default)
+
+
+class RawResponse(Response):
+    """Resposta gerada direto dos documentos do Motor: JSON por `dumps` ou o formato binário negociado."""
+
+    media_type = JSON
+
+    def render(self, content) -> bytes:
+        return ENCODERS.get(self.media_type, dumps)(content)
+
+
+def field_keys(model: type[Model], fields: str) -> dict[str, str]:
+    """Mapeia os campos pedidos para as chaves no banco, com erro 400 para campos desconhecidos."""
+    available = {
+        name: field.key_name for name, field in model.__odm_fields__.items() if name not in SEARCH_FIELDS
+    }
+    names = [name.strip() for name in fields.split(",") if name.strip()] or list(available)
+
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(unknown)}")
+
+    return {name: available[name] for name in names}
+
+
+def _output(doc: dict, keys: dict[str, str]) -> dict:
+    return {name: doc.get(key) for name, key in keys.items()}
+
+
+async def find_raw(model: type[Model], fields: str, *, skip: int, limit: int) -> list[dict]:
+    """Equivalente cru de `engine.find(model, skip=skip, limit=limit)`, lendo só os campos pedidos."""
+    keys = field_keys(model, fields)
+    cursor = get_engine().get_collection(model).find(store_filter(), {key: 1 for key in keys.values()}, skip=skip, limit=limit)
+    return [_output(doc, keys) async for doc in cursor]
+
+
+async def find_raw_page(
+    model: type[Model], fields: str, *, cursor: str, limit: int, keys: tuple[str, ...] = ("_id",)
+) -> dict:
+    """Equivalente cru de `find_page`, com o mesmo formato de cursor."""
+    output_keys = field_keys(model, fields)
+    projection = {key: 1 for key in (*output_keys.values(), *keys)}
+
+    filters = store_filter()
+    if cursor:
+        filters.update(after_filter(decode_cursor(cursor, keys), keys))
+    docs = await (
+        get_engine().get_collection(model)
+        .find(filters, projection, sort=[(key, 1) for key in keys], limit=limit + 1)
+        .to_list(length=None)
+    )
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor({key: docs[-1][key] for key in keys})
+
+    return {"items": [_output(doc, output_keys) for doc in docs], "next_cursor": next_cursor}
@@ -0,0 +1,286 @@
+"""Feed ao vivo dos agendamentos a partir de um change stream do MongoDB.
+
+Cada processo abre um único change stream por loja na coleção `schedule` e
+repassa os eventos às assinaturas (SSE ou WebSocket), cada uma com fila limitada
+e filtros próprios. Change streams exigem replica set; um nó único serve:
+
+    mongod --replSet rs0  # e depois rs.initiate() no mongosh
+"""
+import asyncio
+import contextvars
+import logging
+import os
+from collections import deque
+from datetime import date
+
+from fastapi import WebSocket
+from odmantic import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+from starlette.websockets import WebSocketDisconnect
+
+from app.availability import naive_utc
+from app.database import get_engine
+from app.fastread import dumps
+from app.models.Schedule import Schedule
+from app.stores import STORE_DATABASES, current_store, get_store
+
+logger = logging.getLogger(__name__)
+
+# Eventos guardados para reenviar a quem reconecta com `Last-Event-ID`
+FEED_REPLAY_SIZE = int(os.getenv("SCHEDULE_FEED_REPLAY_SIZE", "1000"))
+# Eventos pendentes por assinante antes de ele ser considerado lento
+FEED_QUEUE_SIZE = int(os.getenv("SCHEDULE_FEED_QUEUE_SIZE", "100"))
+# Com pre-images habilitadas na coleção (MongoDB 6+), remoções e mudanças de
+# data também são filtradas pelo estado anterior do documento
+FEED_PRE_IMAGES = os.getenv("SCHEDULE_FEED_PRE_IMAGES", "").lower() in ("1", "true", "yes")
+
+# Intervalo dos pings que mantêm a conexão aberta em proxies
+FEED_HEARTBEAT = float(os.getenv("SCHEDULE_FEED_HEARTBEAT", "15"))
+
+# Erros de resume token que não existe mais no oplog
+HISTORY_LOST_CODES = {136, 280, 286}
+
+RESET = {"id": None, "operation": "reset", "schedule_id": None, "schedule": None}
+
+
+def _plain(doc: dict | None) -> dict | None:
+    if doc is None:
+        return None
+    doc = dict(doc)
+    return {"id": doc.pop("_id"), **doc}
+
+
+class Subscription:
+    """Assinatura de um cliente do feed, filtrada por dia e/ou cliente."""
+
+    def __init__(self, day: date | None, client_id: ObjectId | None, queue_size: int):
+        self.day = day
+        self.client_id = client_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def _matches_doc(self, doc: dict) -> bool:
+        if self.client_id is not None and doc.get("client") != self.client_id:
+            return False
+        if self.day is not None and naive_utc(doc["date_schedule"]).date() != self.day:
+            return False
+        return True
+
+    def matches(self, docs: list[dict]) -> bool:
+        # Remoções sem pre-image não têm documento: vão para todos os assinantes
+        return not docs or any(self._matches_doc(doc) for doc in docs)
+
+    def push(self, event: dict) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # O cliente recebe `reset` e deve recarregar e reconectar
+            self.overflowed = True
+
+    async def next(self, timeout: float) -> dict | None:
+        """Próximo evento, `RESET` se a fila transbordou ou `None` após `timeout` segundos."""
+        if self.overflowed:
+            return RESET
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return RESET if self.overflowed else None
+
+
+class ScheduleFeed:
+    """Change stream compartilhado, com buffer de reenvio e reconexão pelo resume token."""
+
+    def __init__(self, store: str, replay_size: int, queue_size: int, pre_images: bool = False):
+        self.store = store
+        self.queue_size = queue_size
+        self.pre_images = pre_images
+        self.events = 0
+        self.overflows = 0
+        self._subscriptions: set[Subscription] = set()
+        self._replay: deque[tuple[dict, list[dict]]] = deque(maxlen=replay_size)
+        self._resume_token: dict | None = None
+        self._task: asyncio.Task | None = None
+
+    def subscribe(
+        self, day: date | None = None, client_id: ObjectId | None = None, last_event_id: str | None = None
+    ) -> Subscription:
+        """Registra uma assinatura; com `last_event_id` reenvia o que foi perdido desde ele."""
+        self._start()
+        subscription = Subscription(day, client_id, self.queue_size)
+
+        if last_event_id:
+            ids = [event["id"] for event, _ in self._replay]
+            if last_event_id in ids:
+                for event, docs in list(self._replay)[ids.index(last_event_id) + 1:]:
+                    if subscription.matches(docs):
+                        subscription.push(event)
+            else:
+                subscription.push(RESET)
+
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription.overflowed:
+            self.overflows += 1
+        self._subscriptions.discard(subscription)
+
+    def _start(self) -> None:
+        if self._task is None or self._task.done():
+            # Contexto só com a loja: o stream vive além da requisição que o iniciou
+            context = contextvars.Context()
+            context.run(current_store.set, self.store)
+            self._task = asyncio.create_task(self._run(), context=context)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _publish(self, change: dict) -> None:
+        self._resume_token = change["_id"]
+        self.events += 1
+
+        document = change.get("fullDocument")
+        before = change.get("fullDocumentBeforeChange")
+        event = {
+            "id": change["_id"]["_data"],
+            "operation": change["operationType"],
+            "schedule_id": change["documentKey"]["_id"],
+            "schedule": _plain(document),
+        }
+        docs = [doc for doc in (document, before) if doc is not None]
+
+        self._replay.append((event, docs))
+        for subscription in list(self._subscriptions):
+            if subscription.matches(docs):
+                subscription.push(event)
+
+    def _reset_all(self) -> None:
+        self._replay.clear()
+        for subscription in list(self._subscriptions):
+            subscription.push(RESET)
+
+    async def _run(self) -> None:
+        options = {"full_document": "updateLookup"}
+        if self.pre_images:
+            options["full_document_before_change"] = "whenAvailable"
+
+        pipeline = []
+        if not STORE_DATABASES:
+            # Coleção compartilhada: só os eventos da loja; remoções sem pre-image não dizem a loja
+            pipeline = [{"$match": {"$or": [
+                {"fullDocument.store_id": self.store},
+                {"fullDocumentBeforeChange.store_id": self.store},
+                {"operationType": "delete", "fullDocumentBeforeChange": {"$exists": False}},
+            ]}}]
+
+        while True:
+            collection = get_engine().get_collection(Schedule)
+            try:
+                async with collection.watch(pipeline, resume_after=self._resume_token, **options) as stream:
+                    async for change in stream:
+                        self._publish(change)
+            except OperationFailure as e:
+                if e.code in HISTORY_LOST_CODES:
+                    logger.warning("Resume token do feed expirou; recomeçando do momento atual")
+                    self._resume_token = None
+                    self._reset_all()
+                else:
+                    logger.warning("Falha no change stream dos agendamentos: %s", e)
+                    await asyncio.sleep(1)
+            except PyMongoError as e:
+                logger.warning("Falha no change stream dos agendamentos: %s", e)
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "subscribers": len(self._subscriptions),
+            "events": self.events,
+            "overflows": self.overflows,
+            "replay_size": len(self._replay),
+        }
+
+
+def _sse_message(event: dict) -> str:
+    lines = [f"event: {event['operation']}", f"data: {dumps(event).decode()}"]
+    if event["id"]:
+        lines.insert(0, f"id: {event['id']}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_stream(feed: ScheduleFeed, subscription: Subscription, heartbeat: float = FEED_HEARTBEAT):
+    """Corpo de uma resposta `text/event-stream`; após transbordar envia `reset` e encerra."""
+    try:
+        while True:
+            event = await subscription.next(heartbeat)
+            if event is None:
+                yield ": ping\n\n"
+                continue
+
+            yield _sse_message(event)
+            if subscription.overflowed:
+                return
+    finally:
+        feed.unsubscribe(subscription)
+
+
+async def _until_disconnect(websocket: WebSocket) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def serve_websocket(
+    feed: ScheduleFeed, subscription: Subscription, websocket: WebSocket, heartbeat: float = FEED_HEARTBEAT
+) -> None:
+    """Envia os eventos da assinatura como JSON até o cliente desconectar ou transbordar."""
+    disconnected = asyncio.create_task(_until_disconnect(websocket))
+    try:
+        while not disconnected.done():
+            receiving = asyncio.create_task(subscription.next(heartbeat))
+            await asyncio.wait({receiving, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not receiving.done():
+                receiving.cancel()
+                break
+
+            event = receiving.result() or {"operation": "ping"}
+            await websocket.send_text(dumps(event).decode())
+            if subscription.overflowed:
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        feed.unsubscribe(subscription)
+
+
+class ScheduleFeeds:
+    """Um `ScheduleFeed` por loja, criado na primeira assinatura."""
+
+    def __init__(self):
+        self._feeds: dict[str, ScheduleFeed] = {}
+
+    def get(self) -> ScheduleFeed:
+        """Feed da loja corrente."""
+        store = get_store()
+        feed = self._feeds.get(store)
+        if feed is None:
+            feed = self._feeds[store] = ScheduleFeed(
+                store, replay_size=FEED_REPLAY_SIZE, queue_size=FEED_QUEUE_SIZE, pre_images=FEED_PRE_IMAGES
+            )
+        return feed
+
+    async def stop(self) -> None:
+        for feed in self._feeds.values():
+            await feed.stop()
+
+
+schedule_feeds = ScheduleFeeds()
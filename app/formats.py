@@ -0,0 +1,97 @@
+"""Formatos binários das listagens e exportações, escolhidos pelo cabeçalho `Accept`.
+
+`application/msgpack` e `application/bson` serializam os documentos crus do
+Motor, sem passar pelos modelos do ODMantic nem pelo pydantic, e mantêm ids e
+datas como tipos nativos em vez de strings:
+
+- MessagePack: datas como a extensão padrão de timestamp (-1) e `ObjectId` como
+  a extensão 7 com os 12 bytes do id. Listas são um array; exportações, um
+  objeto por documento, em sequência.
+- BSON: um documento BSON por item, concatenados (como `bson.decode_all` lê);
+  respostas paginadas são um único documento com `items` e `next_cursor`.
+
+O MessagePack depende do pacote opcional `msgpack` (`pip install msgpack`);
+sem ele o `Accept` cai para JSON.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+import bson
+from bson import ObjectId
+from fastapi import Header
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+BSON = "application/bson"
+
+# Código da extensão do MessagePack para `ObjectId`, o mesmo do tipo no BSON
+OBJECT_ID_EXT = 7
+
+ALIASES = {
+    JSON: JSON,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    BSON: BSON,
+}
+
+
+def available() -> set[str]:
+    return {JSON, BSON} | ({MSGPACK} if msgpack is not None else set())
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Formato de maior `q` no `Accept` entre os disponíveis; JSON quando nenhum casa."""
+    candidates = []
+    for position, item in enumerate((accept or "").split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        media_type = ALIASES.get(media_type.lower())
+        if media_type in available() and quality > 0:
+            candidates.append((-quality, position, media_type))
+
+    return min(candidates)[2] if candidates else JSON
+
+
+def response_format(accept: Optional[str] = Header(None)) -> str:
+    """Dependência com o formato negociado da resposta."""
+    return negotiate(accept)
+
+
+def _msgpack_default(value):
+    if isinstance(value, ObjectId):
+        return msgpack.ExtType(OBJECT_ID_EXT, value.binary)
+    if isinstance(value, datetime):
+        # O MongoDB devolve datas em UTC sem fuso
+        return msgpack.Timestamp.from_datetime(value if value.tzinfo else value.replace(tzinfo=timezone.utc))
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def pack(content) -> bytes:
+    """MessagePack de documentos do Motor, com `ObjectId` e datas como extensões."""
+    return msgpack.packb(content, default=_msgpack_default)
+
+
+def bson_dumps(content) -> bytes:
+    """Um documento BSON, ou vários concatenados quando `content` é uma lista."""
+    if isinstance(content, list):
+        return b"".join(bson.encode(doc) for doc in content)
+    return bson.encode(content)
+
+
+ENCODERS = {
+    MSGPACK: pack,
+    BSON: bson_dumps,
+}
@@ -0,0 +1,142 @@
+"""Busca de documentos por id em lote, no estilo do DataLoader.
+
+Os ids pedidos na mesma volta do event loop, por qualquer requisição da mesma
+loja, viram uma única consulta `$in` por coleção, sem ids repetidos. Cada requisição guarda o
+que já carregou e recebe cópias próprias dos modelos. Com `LOADER_TTL` maior
+que zero os documentos também ficam em memória entre requisições, até a versão
+da coleção em `collection_versions` mudar.
+"""
+import asyncio
+import os
+import time
+from typing import Iterable, Optional
+
+from odmantic import Model, ObjectId
+
+from app.database import get_engine
+from app.models.Client import Client
+from app.models.Pet import Pet
+from app.models.Schedule import Schedule
+from app.stores import get_store
+from app.versions import collection_versions
+
+LOADER_TTL = float(os.getenv("LOADER_TTL", "0"))
+
+
+def _copy(instance: Model) -> Model:
+    """Cópia independente de um modelo carregado, inclusive das referências, sem campos marcados como alterados."""
+    copied = instance.model_copy(deep=True)
+    for name in instance.__references__:
+        # A cópia do pydantic perde o estado interno do ODMantic nas referências
+        copied.__dict__[name] = _copy(getattr(instance, name))
+    object.__setattr__(copied, "__fields_modified__", set())
+    return copied
+
+
+class BatchLoader:
+    """Agrupa as buscas por id de `model` feitas na mesma volta do event loop, por loja."""
+
+    def __init__(self, model: type[Model], ttl: float):
+        self.model = model
+        self.ttl = ttl
+        self._batches: dict[str, dict[ObjectId, asyncio.Future]] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        # (loja, id) -> (expira em, versão da coleção, modelo ou None se não existe)
+        self._cache: dict[tuple[str, ObjectId], tuple[float, int, Optional[Model]]] = {}
+
+    def _enqueue(self, store: str, id: ObjectId) -> asyncio.Future:
+        batch = self._batches.get(store)
+        if batch is None:
+            batch = self._batches[store] = {}
+            # A tarefa só roda na próxima volta, depois de todos os pedidos desta, e
+            # herda o contexto desta requisição, com a loja que o `StoreEngine` filtra
+            self._tasks[store] = asyncio.create_task(self._dispatch(store))
+
+        future = batch.get(id)
+        if future is None:
+            future = batch[id] = asyncio.get_running_loop().create_future()
+        return future
+
+    async def _dispatch(self, store: str) -> None:
+        batch = self._batches.pop(store)
+        del self._tasks[store]
+        try:
+            version = (await collection_versions.get(self.model.__collection__))[0]
+            found = await get_engine().find(self.model, self.model.id.in_(list(batch)))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()
+            return
+
+        found = {instance.id: instance for instance in found}
+        expires = time.monotonic() + self.ttl
+        for id, future in batch.items():
+            if self.ttl:
+                self._cache[(store, id)] = (expires, version, found.get(id))
+            if not future.done():
+                future.set_result(found.get(id))
+
+    async def load_many(self, ids: Iterable[ObjectId], fresh: bool = False) -> dict[ObjectId, Model]:
+        """Modelos encontrados por id; `fresh` ignora o cache entre requisições."""
+        ids = set(ids)
+        loaded = {}
+        store = get_store()
+
+        if self.ttl and not fresh:
+            version = (await collection_versions.get(self.model.__collection__))[0]
+            now = time.monotonic()
+            for id in list(ids):
+                entry = self._cache.get((store, id))
+                if entry is not None and entry[0] > now and entry[1] == version:
+                    ids.discard(id)
+                    loaded[id] = entry[2]
+
+        futures = {id: self._enqueue(store, id) for id in ids}
+        for id, future in futures.items():
+            # O mesmo futuro atende outras requisições: o cancelamento desta não o afeta
+            loaded[id] = await asyncio.shield(future)
+
+        return {id: instance for id, instance in loaded.items() if instance is not None}
+
+
+class RequestLoader:
+    """Memória de uma requisição sobre um `BatchLoader`, com cópias próprias dos modelos."""
+
+    def __init__(self, loader: BatchLoader):
+        self.loader = loader
+        self._loaded: dict[ObjectId, Optional[Model]] = {}
+
+    async def load_many(self, ids: Iterable[ObjectId], fresh: bool = False) -> dict[ObjectId, Model]:
+        ids = set(ids)
+        missing = ids if fresh else ids - self._loaded.keys()
+        if missing:
+            found = await self.loader.load_many(missing, fresh=fresh)
+            for id in missing:
+                # Os modelos do lote são compartilhados; alterações ficam na cópia
+                self._loaded[id] = _copy(found[id]) if id in found else None
+
+        return {id: self._loaded[id] for id in ids if self._loaded[id] is not None}
+
+    async def load(self, id: ObjectId, fresh: bool = False) -> Optional[Model]:
+        """O modelo com o `id` ou `None`; use `fresh=True` antes de alterá-lo."""
+        return (await self.load_many([id], fresh=fresh)).get(id)
+
+
+client_loader = BatchLoader(Client, ttl=LOADER_TTL)
+pet_loader = BatchLoader(Pet, ttl=LOADER_TTL)
+schedule_loader = BatchLoader(Schedule, ttl=LOADER_TTL)
+
+
+class Loaders:
+    """Loaders de uma requisição, obtidos pela dependência `get_loaders`."""
+
+    def __init__(self):
+        self.client = RequestLoader(client_loader)
+        self.pet = RequestLoader(pet_loader)
+        self.schedule = RequestLoader(schedule_loader)
+
+
+def get_loaders() -> Loaders:
+    return Loaders()
@@ -0,0 +1,26 @@
+"""Primitivas do asyncio criadas sob demanda, uma por event loop.
+
+Locks e semáforos ficam presos ao loop em que esperam pela primeira vez. Criados
+na importação, seriam compartilhados entre instâncias do app e loops de teste;
+com `PerLoop` cada loop, e portanto cada execução do app, tem os seus.
+"""
+import asyncio
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class PerLoop(Generic[T]):
+    """Valor criado por `factory` na primeira chamada de `get` em cada event loop."""
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._value: T | None = None
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._value = self._factory()
+            self._loop = loop
+        return self._value
@@ -1,12 +1,57 @@
-from fastapi import FastAPI
-from app.routes import ServicesRoutes, PetRoutes, ClientRoutes, ScheduleRoutes
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
+from app import admission, metrics, stores
+from app import database
+from app.feed import schedule_feeds
+from app.models.indexes import ensure_indexes
+from app.routes import ServicesRoutes, PetRoutes, ClientRoutes, ScheduleRoutes, ImportRoutes, AnalyticsRoutes
 
-app = FastAPI()
 
-# Rotas para Endpoints
-app.include_router(ClientRoutes.router)
-app.include_router(PetRoutes.router)
-app.include_router(ScheduleRoutes.router)
-app.include_router(ServicesRoutes.router)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cria o cliente do MongoDB no loop do app e aquece o pool de conexões
+    engine = await database.connect()
+    # Garante os índices declarados em app/models/indexes.py
+    await ensure_indexes(engine)
+    if stores.STORE_DATABASES:
+        # Cada loja conhecida tem o próprio banco; as outras criam os índices pela linha de comando
+        for store in stores.KNOWN_STORES - {stores.DEFAULT_STORE}:
+            token = stores.current_store.set(store)
+            try:
+                await ensure_indexes(database.get_engine())
+            finally:
+                stores.current_store.reset(token)
+    yield
+    await schedule_feeds.stop()
+    database.close()
 
 
+app = FastAPI(lifespan=lifespan)
+
+# Libera as vagas de admissão só depois do corpo da resposta, inclusive em streaming
+app.add_middleware(admission.AdmissionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+# Loja da requisição pelo prefixo `/stores/{store_id}` ou pelo cabeçalho `X-Store-Id`
+app.add_middleware(stores.StoreMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    """Métricas no formato de texto do Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admission/stats", include_in_schema=False)
+async def get_admission_stats() -> dict:
+    """Vagas em uso, fila e recusas de cada classe de prioridade"""
+    return admission.stats()
+
+# Rotas para Endpoints, com controle de admissão (classes em app/admission.py)
+app.include_router(ClientRoutes.router, dependencies=[Depends(admission.limit())])
+app.include_router(PetRoutes.router, dependencies=[Depends(admission.limit())])
+app.include_router(ScheduleRoutes.router, dependencies=[Depends(admission.limit())])
+app.include_router(ServicesRoutes.router, dependencies=[Depends(admission.limit())])
+app.include_router(ImportRoutes.router, dependencies=[Depends(admission.limit())])
+app.include_router(AnalyticsRoutes.router, dependencies=[Depends(admission.limit(admission.HEAVY))])
+
@@ -0,0 +1,246 @@
+"""Métricas de requisições e de comandos do MongoDB, no formato de texto do Prometheus.
+
+O `CommandListener` registrado no `AsyncIOMotorClient` (app.database) mede cada
+comando e o atribui à requisição corrente por uma `ContextVar`, preenchida pelo
+`MetricsMiddleware`. O resultado fica em `/metrics`.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Requisições com mais comandos que isso geram um aviso de possível N+1
+QUERY_WARN_THRESHOLD = int(os.getenv("MONGO_QUERY_WARN_THRESHOLD", "10"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, labels: tuple[str, ...], buckets: tuple):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            series = self._series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            position = bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Valores lidos de `collect` no momento da coleta, como `{labels: valor}`."""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...], collect):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Duração das requisições HTTP por rota.",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+)
+http_request_mongo_commands = Histogram(
+    "http_request_mongo_commands", "Comandos do MongoDB emitidos por requisição.",
+    ("method", "route"), COUNT_BUCKETS,
+)
+http_request_n_plus_one = Counter(
+    "http_request_n_plus_one_total", f"Requisições com mais de {QUERY_WARN_THRESHOLD} comandos do MongoDB.",
+    ("method", "route"),
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "Duração dos comandos do MongoDB por coleção e comando.",
+    ("collection", "command", "outcome"), LATENCY_BUCKETS,
+)
+
+REGISTRY = [http_request_duration, http_request_mongo_commands, http_request_n_plus_one, mongo_command_duration]
+
+
+class _RequestStats:
+    def __init__(self):
+        self.commands = 0
+        self._lock = threading.Lock()
+
+    def add_command(self) -> None:
+        with self._lock:
+            self.commands += 1
+
+
+_current_request: contextvars.ContextVar[_RequestStats | None] = contextvars.ContextVar("current_request", default=None)
+
+
+def _collection_name(event: monitoring.CommandStartedEvent) -> str:
+    if event.command_name == "getMore":
+        return event.command.get("collection", "")
+    target = event.command.get(event.command_name)
+    return target if isinstance(target, str) else ""
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Mede os comandos do MongoDB e os conta na requisição corrente."""
+
+    IGNORED = {"hello", "ismaster", "isMaster", "endSessions"}
+
+    def __init__(self):
+        self._collections: dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in self.IGNORED:
+            return
+
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = _collection_name(event)
+
+        stats = _current_request.get()
+        if stats is not None:
+            stats.add_command()
+
+    def _finish(self, event, outcome: str) -> None:
+        if event.command_name in self.IGNORED:
+            return
+
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongo_command_duration.observe((collection, event.command_name, outcome), event.duration_micros / 1_000_000)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, "success")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, "failure")
+
+
+command_metrics = CommandMetrics()
+
+
+def propagate_context_to_motor() -> None:
+    """Faz o Motor executar o pymongo com o contexto da tarefa que o chamou.
+
+    O Motor roda o driver síncrono num `ThreadPoolExecutor` sem copiar as
+    `ContextVar`s, e o listener de comandos é chamado nessas threads.
+    """
+    from motor.frameworks import asyncio as motor_asyncio
+
+    run_on_executor = motor_asyncio.run_on_executor
+    if getattr(run_on_executor, "propagates_context", False):
+        return
+
+    def run_with_context(loop, fn, *args, **kwargs):
+        return run_on_executor(loop, contextvars.copy_context().run, fn, *args, **kwargs)
+
+    run_with_context.propagates_context = True
+    motor_asyncio.run_on_executor = run_with_context
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mede cada requisição HTTP e conta seus comandos do MongoDB."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = _RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+
+            http_request_duration.observe((method, path, str(status)), elapsed)
+            http_request_mongo_commands.observe((method, path), stats.commands)
+
+            if stats.commands > QUERY_WARN_THRESHOLD:
+                http_request_n_plus_one.inc((method, path))
+                logger.warning(
+                    "%s %s emitiu %d comandos do MongoDB (limite %d): possível N+1",
+                    method, path, stats.commands, QUERY_WARN_THRESHOLD,
+                )
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
@@ -0,0 +1,196 @@
+"""Migrações de esquema versionadas, aplicadas em lotes sem bloquear a coleção.
+
+Cada migração leva os documentos de uma coleção até `version`, gravada no campo
+`schema_version`, ou atualiza os que casam com o próprio filtro `pending`. Os
+documentos pendentes são lidos em lotes por `_id` e atualizados com `bulk_write`
+não ordenado, com uma pausa opcional entre lotes; a execução pode ser
+interrompida e retomada, já que só os pendentes são lidos.
+
+    python -m app.migrations                      # aplica as pendentes
+    python -m app.migrations --status
+    python -m app.migrations --batch-size 500 --pause 0.05
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from app.database import get_engine
+from app.models.Schedule import ServiceSnapshot, snapshot_fields
+from app.stores import DEFAULT_STORE
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+
+class Migration:
+    def __init__(self, version: int, collection: str, description: str, migrate_batch, pending: dict | None = None):
+        self.version = version
+        self.collection = collection
+        self.description = description
+        # Recebe os documentos do lote e devolve o `$set` de cada um, na mesma ordem
+        self.migrate_batch = migrate_batch
+        # Para coleções sem `schema_version` nos modelos: o filtro dos documentos pendentes
+        self.filters = pending
+
+    def pending(self) -> dict:
+        return dict(self.filters) if self.filters is not None else _pending(self.version)
+
+    def update(self, fields: dict) -> dict:
+        if self.filters is not None:
+            return {"$set": fields}
+        return {"$set": {**fields, "schema_version": self.version}}
+
+    @property
+    def key(self) -> str:
+        return f"{self.collection}:{self.version}"
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, collection: str, description: str, pending: dict | None = None):
+    """Registra a função decorada como a migração `version` de `collection`."""
+    def register(migrate_batch):
+        MIGRATIONS.append(Migration(version, collection, description, migrate_batch, pending))
+        return migrate_batch
+    return register
+
+
+def _pending(version: int) -> dict:
+    # `$not` também casa com documentos sem `schema_version`
+    return {"schema_version": {"$not": {"$gte": version}}}
+
+
+@migration(1, "schedule", "Snapshot de cliente, pet e serviços, total_price e end_time")
+async def schedule_snapshots(docs: list[dict]) -> list[dict]:
+    database = get_engine().database
+
+    client_ids = list({doc["client"] for doc in docs})
+    pet_ids = list({doc["pet"] for doc in docs})
+    service_ids = list({service_id for doc in docs for service_id in doc["services"]})
+
+    clients, pets, services = await asyncio.gather(
+        database["client"].find({"_id": {"$in": client_ids}}, {"name": 1}).to_list(length=None),
+        database["pet"].find({"_id": {"$in": pet_ids}}, {"name": 1, "breed": 1}).to_list(length=None),
+        database["services"].find({"_id": {"$in": service_ids}}).to_list(length=None),
+    )
+    clients = {client["_id"]: client for client in clients}
+    pets = {pet["_id"]: pet for pet in pets}
+    services = {service["_id"]: service for service in services}
+
+    updates = []
+    for doc in docs:
+        client, pet = clients.get(doc["client"]), pets.get(doc["pet"])
+        if not client or not pet or any(service_id not in services for service_id in doc["services"]):
+            # Referências removidas: não há de onde tirar o snapshot
+            updates.append({})
+            continue
+
+        service_snapshots = [
+            ServiceSnapshot(
+                service_id=service_id,
+                type_service=services[service_id]["type_service"],
+                price=services[service_id]["price"],
+                duration_in_minutes=services[service_id]["duration_in_minutes"],
+            )
+            for service_id in doc["services"]
+        ]
+        fields = snapshot_fields(client["name"], pet["name"], pet["breed"], service_snapshots, doc["date_schedule"])
+        fields["services_snapshot"] = [service.model_dump_doc() for service in service_snapshots]
+        updates.append(fields)
+
+    return updates
+
+
+async def _default_store(docs: list[dict]) -> list[dict]:
+    # Os documentos anteriores às lojas (app.stores) são da loja padrão
+    return [{"store_id": DEFAULT_STORE} for _ in docs]
+
+
+for _collection in ("client", "pet", "services"):
+    migration(1, _collection, "Loja padrão (store_id)", pending={"store_id": {"$exists": False}})(_default_store)
+
+migration(2, "schedule", "Loja padrão (store_id)")(_default_store)
+
+
+async def run(migration: Migration, batch_size: int = 1000, pause: float = 0.0) -> int:
+    """Aplica a migração aos documentos pendentes, lote a lote, e retorna quantos foram alterados."""
+    database = get_engine().database
+    collection = database[migration.collection]
+    log = database[MIGRATIONS_COLLECTION]
+
+    await log.update_one(
+        {"_id": migration.key},
+        {
+            "$set": {"description": migration.description, "started_at": datetime.now(timezone.utc)},
+            "$unset": {"finished_at": ""},
+        },
+        upsert=True,
+    )
+
+    migrated = 0
+    last_id = None
+    while True:
+        filters = migration.pending()
+        if last_id is not None:
+            filters["_id"] = {"$gt": last_id}
+
+        docs = await collection.find(filters).sort("_id", 1).limit(batch_size).to_list(length=None)
+        if not docs:
+            break
+
+        updates = await migration.migrate_batch(docs)
+        operations = [
+            UpdateOne(
+                # A condição evita sobrescrever um documento gravado já na versão nova
+                {"_id": doc["_id"], **migration.pending()},
+                migration.update(update),
+            )
+            for doc, update in zip(docs, updates)
+        ]
+        result = await collection.bulk_write(operations, ordered=False)
+
+        migrated += result.modified_count
+        last_id = docs[-1]["_id"]
+        await log.update_one({"_id": migration.key}, {"$set": {"migrated": migrated, "last_id": last_id}})
+
+        if pause:
+            await asyncio.sleep(pause)
+
+    await log.update_one({"_id": migration.key}, {"$set": {"finished_at": datetime.now(timezone.utc)}})
+    return migrated
+
+
+async def status() -> list[dict]:
+    database = get_engine().database
+    report = []
+    for migration in MIGRATIONS:
+        log = await database[MIGRATIONS_COLLECTION].find_one({"_id": migration.key}) or {}
+        report.append({
+            "migration": migration.key,
+            "description": migration.description,
+            "pending": await database[migration.collection].count_documents(migration.pending()),
+            "finished_at": log.get("finished_at"),
+        })
+    return report
+
+
+async def migrate(batch_size: int, pause: float) -> None:
+    for migration in sorted(MIGRATIONS, key=lambda migration: (migration.collection, migration.version)):
+        migrated = await run(migration, batch_size, pause)
+        print(f"{migration.key}: {migrated} documentos migrados")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplica as migrações de esquema pendentes")
+    parser.add_argument("--status", action="store_true", help="Só mostra as migrações e os documentos pendentes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.0, help="Segundos de pausa entre lotes")
+    args = parser.parse_args()
+
+    if args.status:
+        for item in asyncio.run(status()):
+            print(f"{item['migration']:<15} pendentes: {item['pending']:<8} concluída em: {item['finished_at']}  {item['description']}")
+    else:
+        asyncio.run(migrate(args.batch_size, args.pause))
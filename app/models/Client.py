@@ -1,11 +1,14 @@
-from odmantic import Model, Field
+from odmantic import Model
 from pydantic import BaseModel
+from app.stores import DEFAULT_STORE
 
 class Client(Model):
     name: str
-    cpf: str = Field(unique=True)
+    # Único por loja (app/models/indexes.py)
+    cpf: str
     age: int
     is_admin: bool
+    store_id: str = DEFAULT_STORE
 
 class UpdateClient(BaseModel):
     name: str | None
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+class ImportResult(BaseModel):
+    inserted: dict[str, int] = {"client": 0, "service": 0, "pet": 0}
+    total_errors: int = 0
+    errors: list[ImportLineError] = []
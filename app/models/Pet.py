@@ -1,15 +1,31 @@
-from odmantic import Model, Field, Reference
+from odmantic import Model, Reference
 from app.models.Client import Client
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, model_serializer
+from typing import List, Optional
+from app.stores import DEFAULT_STORE
+from app.search import SEARCH_FIELDS
 
 
 class Pet(Model):
     client: Client = Reference()
-    name: str = Field(unique=True)
+    # Único por loja (app/models/indexes.py)
+    name: str
     breed: str
     age: int
     size_in_centimeters: int
+    # Mantidos por app.search a cada gravação, para a busca por nome
+    name_search: str = ""
+    name_tokens: List[str] = []
+    store_id: str = DEFAULT_STORE
+
+    @model_serializer(mode="wrap")
+    def _hide_search_fields(self, handler, info):
+        # Só as respostas em JSON escondem os campos; a gravação no banco usa o modo python
+        data = handler(self)
+        if info.mode_is_json():
+            for name in SEARCH_FIELDS:
+                data.pop(name, None)
+        return data
 
 class PetUpdate(BaseModel):
     name: Optional[str] = None
@@ -17,3 +33,11 @@ class PetUpdate(BaseModel):
     age: Optional[int] = None
     size_in_centimeters: Optional[int] = None
 
+
+class PetImport(BaseModel):
+    client_id: Optional[str] = None
+    client_cpf: Optional[str] = None
+    name: str
+    breed: str
+    age: int
+    size_in_centimeters: int
@@ -1,15 +1,51 @@
-from odmantic import Model, Reference, ObjectId
-from datetime import datetime
+from odmantic import EmbeddedModel, Model, Reference, ObjectId
+from datetime import datetime, timedelta
 from app.models.Client import Client
 from app.models.Pet import Pet
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
+from app.stores import DEFAULT_STORE
+
+# Versão atual do documento de agendamento; as anteriores são migradas por app.migrations
+SCHEMA_VERSION = 2
+
+
+class ServiceSnapshot(EmbeddedModel):
+    service_id: ObjectId
+    type_service: str
+    price: float
+    duration_in_minutes: int
+
 
 class Schedule(Model):
     client: Client = Reference()
     pet: Pet = Reference()
     services: List[ObjectId]
     date_schedule: datetime
+    # Cliente, pet e serviços como estavam no momento do agendamento
+    client_name: Optional[str] = None
+    pet_name: Optional[str] = None
+    pet_breed: Optional[str] = None
+    services_snapshot: List[ServiceSnapshot] = []
+    total_price: Optional[float] = None
+    end_time: Optional[datetime] = None
+    schema_version: int = 0
+    store_id: str = DEFAULT_STORE
+
+
+def snapshot_fields(
+    client_name: str, pet_name: str, pet_breed: str, services: List[ServiceSnapshot], date_schedule: datetime
+) -> dict:
+    """Campos desnormalizados de um agendamento: o snapshot, o preço total e o horário de término."""
+    return {
+        "client_name": client_name,
+        "pet_name": pet_name,
+        "pet_breed": pet_breed,
+        "services_snapshot": services,
+        "total_price": sum(service.price for service in services),
+        "end_time": date_schedule + timedelta(minutes=sum(service.duration_in_minutes for service in services)),
+        "schema_version": SCHEMA_VERSION,
+    }
 
 class ScheduleCreateRequest(BaseModel):
     client_id: str
@@ -19,3 +55,9 @@ class ScheduleCreateRequest(BaseModel):
 
 class ScheduleUpdate(BaseModel):
     date_schedule: datetime | None
+
+
+class ScheduleBatchResult(BaseModel):
+    index: int
+    id: str | None = None
+    error: str | None = None
@@ -1,10 +1,12 @@
 from odmantic import Model
 from pydantic import BaseModel
+from app.stores import DEFAULT_STORE
 
 class Services(Model):
     duration_in_minutes: int
     type_service: str
     price: float
+    store_id: str = DEFAULT_STORE
 
 class ServiceUpdate(BaseModel):
     duration_in_minutes: int | None = None
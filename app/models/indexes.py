@@ -0,0 +1,154 @@
+"""Registro declarativo dos índices de cada coleção.
+
+Aplicado no startup da aplicação (`app.main`) e também pela linha de comando:
+
+    python -m app.models.indexes            # cria os índices e mostra a diferença
+    python -m app.models.indexes --dry-run  # só compara o declarado com o existente
+"""
+import asyncio
+import logging
+import sys
+
+from odmantic import AIOEngine
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.models.Client import Client
+from app.models.Pet import Pet
+from app.models.Schedule import Schedule
+from app.models.Services import Services
+
+logger = logging.getLogger(__name__)
+
+
+# `store_id` abre as chaves das coleções particionadas por loja (app.stores): as
+# consultas são sempre da loja corrente, a unicidade vale dentro de cada loja e o
+# mesmo prefixo serve de chave de shard
+INDEXES = {
+    Client: [
+        IndexModel([("store_id", ASCENDING), ("cpf", ASCENDING)], unique=True),
+    ],
+    Pet: [
+        IndexModel([("store_id", ASCENDING), ("name", ASCENDING)], unique=True),
+        IndexModel([("store_id", ASCENDING), ("client", ASCENDING)]),
+        # Busca por prefixo e por trigramas (app.search)
+        IndexModel([("store_id", ASCENDING), ("name_search", ASCENDING)]),
+        IndexModel([("store_id", ASCENDING), ("name_tokens", ASCENDING)]),
+    ],
+    Services: [
+        IndexModel([("store_id", ASCENDING), ("type_service", ASCENDING)], unique=True),
+        IndexModel([("store_id", ASCENDING), ("price", ASCENDING)]),
+    ],
+    Schedule: [
+        # Consultas por mês e paginação ordenada por data
+        IndexModel([("store_id", ASCENDING), ("date_schedule", ASCENDING), ("_id", ASCENDING)]),
+        # Histórico do cliente e remoção em cascata por cliente
+        IndexModel([("store_id", ASCENDING), ("client", ASCENDING), ("date_schedule", ASCENDING), ("_id", ASCENDING)]),
+        # Remoção em cascata por pet
+        IndexModel([("store_id", ASCENDING), ("pet", ASCENDING)]),
+    ],
+    # Contadores mantidos por app.stats, lidos por recorte em ordem decrescente
+    "schedule_stats": [
+        IndexModel([("store_id", ASCENDING), ("kind", ASCENDING), ("count", DESCENDING)]),
+    ],
+}
+
+# Índices substituídos pelos de cima, removidos por `ensure_indexes`; os únicos
+# antigos impediriam o mesmo cpf ou nome de pet em lojas diferentes
+OBSOLETE_INDEXES = {
+    Client: ["cpf_1"],
+    Pet: ["name_1", "client_1", "name_search_1", "name_tokens_1"],
+    Services: ["type_service_1", "price_1"],
+    Schedule: ["date_schedule_1__id_1", "client_1_date_schedule_1__id_1", "pet_1"],
+    "schedule_stats": ["kind_1_count_-1"],
+}
+
+
+def _collection(engine: AIOEngine, target):
+    """Coleção de um modelo ODMantic ou de um nome de coleção sem modelo."""
+    if isinstance(target, str):
+        return engine.database[target]
+    return engine.get_collection(target)
+
+
+def _name(target) -> str:
+    return target if isinstance(target, str) else target.__collection__
+
+
+def _normalize(spec: dict) -> dict:
+    """Reduz a especificação de um índice às opções comparáveis."""
+    key = spec["key"]
+    fields = key.items() if isinstance(key, dict) else key
+
+    return {
+        "key": [(field, direction if isinstance(direction, str) else int(direction)) for field, direction in fields],
+        "unique": bool(spec.get("unique", False)),
+    }
+
+
+async def diff_indexes(engine: AIOEngine) -> dict[str, dict[str, list[str]]]:
+    """Compara os índices declarados com os existentes, por coleção.
+
+    Retorna, para cada coleção, os nomes `missing` (declarados e ausentes),
+    `mismatched` (mesmo nome com chave ou unicidade diferentes) e `extra`
+    (existentes mas não declarados).
+    """
+    report = {}
+
+    for target, indexes in INDEXES.items():
+        live = await _collection(engine, target).index_information()
+        live.pop("_id_", None)
+
+        declared = {index.document["name"]: index.document for index in indexes}
+
+        report[_name(target)] = {
+            "missing": [name for name in declared if name not in live],
+            "mismatched": [
+                name for name, spec in declared.items()
+                if name in live and _normalize(spec) != _normalize(live[name])
+            ],
+            "extra": [name for name in live if name not in declared],
+        }
+
+    return report
+
+
+async def ensure_indexes(engine: AIOEngine) -> None:
+    """Cria os índices declarados que ainda não existem e remove os obsoletos."""
+    for target, indexes in INDEXES.items():
+        collection = _collection(engine, target)
+        try:
+            await collection.create_indexes(indexes)
+            live = await collection.index_information()
+            for name in OBSOLETE_INDEXES.get(target, []):
+                if name in live:
+                    await collection.drop_index(name)
+        except OperationFailure as e:
+            logger.warning("Não foi possível criar os índices de %s: %s", _name(target), e)
+
+
+async def _main(dry_run: bool) -> int:
+    from app.database import get_engine
+
+    engine = get_engine()
+
+    if not dry_run:
+        await ensure_indexes(engine)
+
+    report = await diff_indexes(engine)
+    pending = False
+
+    for collection, diff in report.items():
+        for kind, names in diff.items():
+            for name in names:
+                print(f"{collection}: {kind} {name}")
+                pending = pending or kind != "extra"
+
+    if not pending:
+        print("Todos os índices declarados existem")
+
+    return 1 if pending else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(dry_run="--dry-run" in sys.argv[1:])))
@@ -0,0 +1,75 @@
+import base64
+from typing import Generic, TypeVar
+
+from bson import json_util
+from fastapi import HTTPException
+from odmantic import Model
+from pydantic import BaseModel
+
+from app.database import get_engine
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: str | None = None
+
+
+def encode_cursor(values: dict) -> str:
+    """Gera um cursor opaco a partir dos valores de ordenação do último item."""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, keys: tuple[str, ...]) -> dict:
+    """Lê um cursor gerado por `encode_cursor`, com erro 400 se for inválido."""
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    if not isinstance(values, dict) or set(values) != set(keys):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    return values
+
+
+def after_filter(values: dict, keys: tuple[str, ...]) -> dict:
+    """Filtro que seleciona os documentos depois de `values` na ordenação ascendente por `keys`."""
+    branches = []
+    for position, key in enumerate(keys):
+        branch = {previous: values[previous] for previous in keys[:position]}
+        branch[key] = {"$gt": values[key]}
+        branches.append(branch)
+
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+
+def _attribute(key: str) -> str:
+    return "id" if key == "_id" else key
+
+
+async def find_page(
+    model: type[Model], *queries, cursor: str, limit: int, keys: tuple[str, ...] = ("_id",)
+) -> Page:
+    """Busca uma página por keyset, continuando a partir de `cursor`.
+
+    O custo é o mesmo em qualquer profundidade, desde que exista um índice em `keys`.
+    Um cursor vazio começa do início.
+    """
+    engine = get_engine()
+
+    filters = list(queries)
+    if cursor:
+        filters.append(after_filter(decode_cursor(cursor, keys), keys))
+
+    sort = tuple(getattr(model, _attribute(key)) for key in keys)
+    items = await engine.find(model, *filters, sort=sort, limit=limit + 1)
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor({key: getattr(last, _attribute(key)) for key in keys})
+
+    return Page(items=items, next_cursor=next_cursor)
@@ -0,0 +1,287 @@
+from datetime import datetime
+from enum import Enum
+from fastapi import APIRouter, Depends, Query
+from odmantic import AIOEngine
+from typing import Optional
+
+from app.archive import with_archives
+from app.cache import analytics_cache
+from app.database import get_engine
+from app.models.Schedule import Schedule
+from app.stores import store_filter
+
+
+class Period(str, Enum):
+    day = "day"
+    month = "month"
+    year = "year"
+
+
+PERIOD_FORMATS = {
+    Period.day: "%Y-%m-%d",
+    Period.month: "%Y-%m",
+    Period.year: "%Y",
+}
+
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"],
+)
+
+def _date_match(start: Optional[datetime], end: Optional[datetime]) -> list[dict]:
+    """Estágio `$match` da loja corrente no intervalo de `date_schedule`, usando o índice da data."""
+    match = store_filter()
+
+    date_filter = {}
+    if start:
+        date_filter["$gte"] = start
+    if end:
+        date_filter["$lt"] = end
+    if date_filter:
+        match["date_schedule"] = date_filter
+
+    return [{"$match": match}]
+
+
+def _revenue_groups(group_id) -> list[dict]:
+    """Estágios que somam faturamento e agendamentos por `group_id`.
+
+    Os agendamentos com `total_price` somam o preço gravado; só os ainda não
+    migrados passam pelo `$lookup` do preço atual dos serviços, no outro ramo do `$facet`.
+    """
+    return [
+        {
+            "$facet": {
+                "stored": [
+                    {"$match": {"total_price": {"$ne": None}}},
+                    {"$group": {"_id": group_id, "revenue": {"$sum": "$total_price"}, "total_schedules": {"$sum": 1}}},
+                ],
+                "legacy": [
+                    {"$match": {"total_price": None}},
+                    {
+                        "$lookup": {
+                            "from": "services",
+                            "localField": "services",
+                            "foreignField": "_id",
+                            "as": "services_info"
+                        }
+                    },
+                    {
+                        "$group": {
+                            "_id": group_id,
+                            "revenue": {"$sum": {"$sum": "$services_info.price"}},
+                            "total_schedules": {"$sum": 1}
+                        }
+                    },
+                ],
+            }
+        },
+        {"$project": {"groups": {"$concatArrays": ["$stored", "$legacy"]}}},
+        {"$unwind": "$groups"},
+        {"$replaceRoot": {"newRoot": "$groups"}},
+        {"$group": {"_id": "$_id", "revenue": {"$sum": "$revenue"}, "total_schedules": {"$sum": "$total_schedules"}}},
+    ]
+
+
+async def _aggregate(
+    engine: AIOEngine, pipeline: list[dict], start: Optional[datetime], end: Optional[datetime]
+) -> list[dict]:
+    """Executa o pipeline em `schedule` e nos arquivos (app.archive) do intervalo."""
+    collection = engine.get_collection(Schedule)
+    return await collection.aggregate(await with_archives(pipeline, start, end)).to_list(length=None)
+
+
+@router.get("/revenue", response_model=list[dict])
+async def revenue_by_period(
+    period: Period = Period.month,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    engine: AIOEngine = Depends(get_engine),
+) -> list[dict]:
+    """Endpoint que retorna o faturamento e a quantidade de agendamentos por período"""
+    pipeline = [
+        *_date_match(start, end),
+        *_revenue_groups({"$dateToString": {"format": PERIOD_FORMATS[period], "date": "$date_schedule"}}),
+        {
+            "$project": {
+                "_id": 0,
+                "period": "$_id",
+                "revenue": 1,
+                "total_schedules": 1
+            }
+        },
+        {
+            "$sort": {"period": 1}
+        }
+    ]
+
+    return await analytics_cache.get_or_compute(
+        ("revenue", period.value, start, end), lambda: _aggregate(engine, pipeline, start, end)
+    )
+
+
+@router.get("/revenue/by/service", response_model=list[dict])
+async def revenue_by_service(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    engine: AIOEngine = Depends(get_engine),
+) -> list[dict]:
+    """Endpoint que retorna o faturamento e os minutos agendados por tipo de serviço"""
+    pipeline = [
+        *_date_match(start, end),
+        {
+            # Serviços como gravados no agendamento; os ainda não migrados só têm os ids
+            "$project": {
+                "services": {
+                    "$cond": [
+                        {"$gt": [{"$size": {"$ifNull": ["$services_snapshot", []]}}, 0]},
+                        "$services_snapshot",
+                        {"$map": {"input": "$services", "as": "service_id", "in": {"service_id": "$$service_id", "legacy": 1}}}
+                    ]
+                }
+            }
+        },
+        {
+            "$unwind": "$services"
+        },
+        {
+            "$group": {
+                "_id": "$services.service_id",
+                "type_service": {"$last": "$services.type_service"},
+                "total_schedules": {"$sum": 1},
+                "revenue": {"$sum": "$services.price"},
+                "minutes_booked": {"$sum": "$services.duration_in_minutes"},
+                "legacy": {"$sum": {"$ifNull": ["$services.legacy", 0]}}
+            }
+        },
+        {
+            "$lookup": {
+                "from": "services",
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "service_info"
+            }
+        },
+        {
+            "$unwind": {"path": "$service_info", "preserveNullAndEmptyArrays": True}
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "service_id": {"$toString": "$_id"},
+                "type_service": {"$ifNull": ["$service_info.type_service", "$type_service"]},
+                "total_schedules": 1,
+                # Os não migrados usam o preço e a duração atuais, como em `_revenue_groups`
+                "revenue": {"$add": ["$revenue", {"$multiply": ["$legacy", {"$ifNull": ["$service_info.price", 0]}]}]},
+                "minutes_booked": {
+                    "$add": ["$minutes_booked", {"$multiply": ["$legacy", {"$ifNull": ["$service_info.duration_in_minutes", 0]}]}]
+                }
+            }
+        },
+        {
+            "$sort": {"revenue": -1}
+        }
+    ]
+
+    return await analytics_cache.get_or_compute(
+        ("revenue_by_service", start, end), lambda: _aggregate(engine, pipeline, start, end)
+    )
+
+
+@router.get("/revenue/by/client", response_model=list[dict])
+async def revenue_by_client(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(10, gt=0, le=100),
+    engine: AIOEngine = Depends(get_engine),
+) -> list[dict]:
+    """Endpoint que retorna os clientes com maior faturamento"""
+    pipeline = [
+        *_date_match(start, end),
+        *_revenue_groups("$client"),
+        {
+            "$sort": {"revenue": -1}
+        },
+        {
+            "$limit": limit
+        },
+        {
+            "$lookup": {
+                "from": "client",
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "client_info"
+            }
+        },
+        {
+            "$unwind": "$client_info"
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "client_id": {"$toString": "$_id"},
+                "client_name": "$client_info.name",
+                "revenue": 1,
+                "total_schedules": 1
+            }
+        }
+    ]
+
+    return await analytics_cache.get_or_compute(
+        ("revenue_by_client", start, end, limit), lambda: _aggregate(engine, pipeline, start, end)
+    )
+
+
+@router.get("/top/pets", response_model=list[dict])
+async def top_pets_by_visits(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(10, gt=0, le=100),
+    engine: AIOEngine = Depends(get_engine),
+) -> list[dict]:
+    """Endpoint que retorna os pets com mais agendamentos"""
+    pipeline = [
+        *_date_match(start, end),
+        {
+            "$group": {
+                "_id": "$pet",
+                "total_visits": {"$sum": 1}
+            }
+        },
+        {
+            "$sort": {"total_visits": -1}
+        },
+        {
+            "$limit": limit
+        },
+        {
+            "$lookup": {
+                "from": "pet",
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "pet_info"
+            }
+        },
+        {
+            "$unwind": "$pet_info"
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "pet_id": {"$toString": "$_id"},
+                "pet_name": "$pet_info.name",
+                "total_visits": 1
+            }
+        }
+    ]
+
+    return await analytics_cache.get_or_compute(
+        ("top_pets", start, end, limit), lambda: _aggregate(engine, pipeline, start, end)
+    )
+
+
+@router.get("/cache/stats", response_model=dict)
+async def get_analytics_cache_stats() -> dict:
+    """Endpoint que retorna os contadores de acerto e falha do cache de análises"""
+    return analytics_cache.stats()
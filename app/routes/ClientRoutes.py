@@ -1,20 +1,32 @@
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
+from app.cascade import delete_client_cascade
+from app.archive import archive_state
+from app.routes.ScheduleRoutes import availability
 from app.database import get_engine
+from app.loader import Loaders, get_loaders
+from app.pagination import Page, after_filter, find_page
+from app.conditional import ConditionalGet
+from app.versions import collection_versions
+from app.fastread import FIELDS_DESCRIPTION, RawResponse, find_raw, find_raw_page
+from app.formats import JSON, response_format
+from app.export import ExportFormat, export_response, negotiated_format
+from app import stats
 from app.models.Client import Client, UpdateClient
-from app.models.Pet import Pet
 from app.models.Schedule import Schedule
-from app.models.Services import Services
-from odmantic import ObjectId
+from app.stores import store_filter
+from odmantic import AIOEngine, ObjectId
+from odmantic.exceptions import DuplicateKeyError
+from datetime import datetime
+from typing import Optional
 
 router = APIRouter(
 prefix="/clients",
 tags=["Clients"], 
 )
 
-engine = get_engine()
-
 @router.post("/", response_model=Client)
-async def create_client(client: Client) -> Client:
+async def create_client(client: Client, engine: AIOEngine = Depends(get_engine)) -> Client:
 
     client_exists = await engine.find_one(Client, Client.cpf == client.cpf)
 
@@ -22,156 +34,255 @@ async def create_client(client: Client) -> Client:
         raise HTTPException(status_code=400, detail=f"O Cliente com o cpf {client.cpf} já foi cadastrado")
 
     await engine.save(client)
+    await collection_versions.bump("client")
     return client
 
-@router.get("/")
-async def get_all_clients(skip: int = Query(0, ge=0), limit: int = Query(10, gt=0, le=100)):
+@router.get("/", response_model=list[Client] | Page[Client])
+async def get_all_clients(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, gt=0, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor da página anterior; envie vazio para começar a paginação por cursor"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    cache_headers: dict = Depends(ConditionalGet("client")),
+    media_type: str = Depends(response_format),
+    engine: AIOEngine = Depends(get_engine),
+):
+    """Lista os clientes. Com `cursor` a resposta traz `items` e `next_cursor`.
+
+    Com `fields` os documentos são lidos sem passar pelos modelos, só com os campos pedidos.
+    """
+    if fields is not None or media_type != JSON:
+        # MessagePack e BSON sempre saem da leitura rápida, sem `fields` com todos os campos
+        fields = fields or ""
+        if cursor is not None:
+            return RawResponse(await find_raw_page(Client, fields, cursor=cursor, limit=limit), media_type=media_type, headers=cache_headers)
+        return RawResponse(await find_raw(Client, fields, skip=skip, limit=limit), media_type=media_type, headers=cache_headers)
+
+    if cursor is not None:
+        return await find_page(Client, cursor=cursor, limit=limit)
 
     clients = await engine.find(Client, skip=skip, limit=limit)
     
     return clients
 
 
+@router.get("/export")
+async def export_clients(
+    export_format: ExportFormat = Depends(negotiated_format),
+    batch_size: int = Query(1000, gt=0, le=10000),
+    engine: AIOEngine = Depends(get_engine),
+):
+    """Exporta todos os clientes em NDJSON, CSV, MessagePack ou BSON, em streaming (`format` ou `Accept`)."""
+    return export_response(
+        engine.get_collection(Client),
+        store_filter(),
+        ["_id", "name", "cpf", "age", "is_admin"],
+        export_format,
+        batch_size,
+        filename="clients",
+    )
+
+
 @router.get("/{client_id}")
-async def get_client_by_id(client_id: str):
+async def get_client_by_id(client_id: str, loaders: Loaders = Depends(get_loaders)):
 
-    client = await engine.find_one(Client, Client.id == ObjectId(client_id))
+    client = await loaders.client.load(ObjectId(client_id))
 
     if not client:
         raise HTTPException(status_code=404, detail=f"Cliente com o id{client_id} não encontrado")
     
     return client
 
-@router.get("/{client_id}")
-async def get_clients_schedules_by_id(client_id: str):
-
-    client = await engine.find_one(Client, Client.id == ObjectId(client_id))
+@router.get("/{client_id}/schedules")
+async def get_clients_schedules_by_id(
+    client_id: str,
+    after: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+    limit: int = Query(10, gt=0, le=100),
+    engine: AIOEngine = Depends(get_engine),
+    loaders: Loaders = Depends(get_loaders),
+):
+    """Retorna o histórico de agendamentos do cliente, paginado por `date_schedule` e id.
+
+    A próxima página começa depois de `after` e `after_id`, a data e o id do
+    último agendamento recebido; só com `after`, depois daquele horário.
+
+    Pet e serviços são resolvidos no servidor com `$lookup`, então a quantidade de
+    consultas é constante independente do número de agendamentos. Agendamentos
+    arquivados entram com uma consulta a mais por ano de arquivo a partir de `after`.
+    """
+    if not ObjectId.is_valid(client_id):
+        raise HTTPException(status_code=400, detail="ID de cliente inválido")
+    if after_id is not None and (after is None or not ObjectId.is_valid(after_id)):
+        raise HTTPException(status_code=400, detail="after_id exige after e um id de agendamento válido")
+
+    client = await loaders.client.load(ObjectId(client_id))
 
     if not client:
         raise HTTPException(status_code=404, detail=f"Cliente com o id{client_id} não encontrado")
 
-    schedules = await engine.find(Schedule, Schedule.client == client.id)
-
-    response = []
-
-    for schedule in schedules:
-        pet = await engine.find_one(Pet, Pet.id == schedule.pet.id)
-
-        service_ids = [service.id for service in schedule.services]
-        services = await engine.find(Services, Services.id.in_(service_ids))
-
-        response.append({
-            "date_schedule": schedule.date_schedule.isoformat(),
-            "client": {
-                "id": str(client.id),
-                "name": client.name,
-                "cpf": client.cpf,
-                "age": client.age,
-                "is_admin": client.is_admin
-            },
-            "pet": {
-                "id": str(pet.id),
-                "name": pet.name,
-                "breed": pet.breed,
-                "age": pet.age,
-                "size_in_centimeters": pet.size_in_centimeters
-            },
-            "services": [
-                {
-                    "id": str(service.id),
-                    "type_service": service.type_service,
-                    "duration_in_minutes": service.duration_in_minutes,
-                    "price": service.price
+    match: dict = {**store_filter(), "client": client.id}
+    if after_id:
+        # Mesma ordem do `$sort`: agendamentos no mesmo horário do último seguem pelo id
+        match.update(after_filter({"date_schedule": after, "_id": ObjectId(after_id)}, ("date_schedule", "_id")))
+    elif after:
+        match["date_schedule"] = {"$gt": after}
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"date_schedule": 1, "_id": 1}},
+        {"$limit": limit},
+        {
+            "$lookup": {
+                "from": "pet",
+                "localField": "pet",
+                "foreignField": "_id",
+                "as": "pet"
+            }
+        },
+        {
+            "$unwind": "$pet"
+        },
+        {
+            "$lookup": {
+                "from": "services",
+                "localField": "services",
+                "foreignField": "_id",
+                "as": "services"
+            }
+        },
+        {
+            "$project": {
+                "date_schedule": 1,
+                "pet": {
+                    "id": {"$toString": "$pet._id"},
+                    "name": "$pet.name",
+                    "breed": "$pet.breed",
+                    "age": "$pet.age",
+                    "size_in_centimeters": "$pet.size_in_centimeters"
+                },
+                "services": {
+                    "$map": {
+                        "input": "$services",
+                        "as": "service",
+                        "in": {
+                            "id": {"$toString": "$$service._id"},
+                            "type_service": "$$service.type_service",
+                            "duration_in_minutes": "$$service.duration_in_minutes",
+                            "price": "$$service.price"
+                        }
+                    }
                 }
-                for service in services
-            ]
-        })
+            }
+        }
+    ]
 
-    return response
+    collections = [*await archive_state.collections(after, None), engine.get_collection(Schedule)]
+    tiers = await asyncio.gather(*(collection.aggregate(pipeline).to_list(length=None) for collection in collections))
+    schedules = sorted(
+        (schedule for tier in tiers for schedule in tier),
+        key=lambda schedule: (schedule["date_schedule"], schedule["_id"]),
+    )[:limit]
+
+    client_data = {
+        "id": str(client.id),
+        "name": client.name,
+        "cpf": client.cpf,
+        "age": client.age,
+        "is_admin": client.is_admin
+    }
+
+    return [
+        {
+            "id": str(schedule["_id"]),
+            "date_schedule": schedule["date_schedule"].isoformat(),
+            "client": client_data,
+            "pet": schedule["pet"],
+            "services": schedule["services"]
+        }
+        for schedule in schedules
+    ]
 
 @router.put("/{client_id}", response_model=Client)
-async def update_client_for_id(client_id: str, update_cliente: UpdateClient) -> Client:
+async def update_client_for_id(
+    client_id: str,
+    update_cliente: UpdateClient,
+    engine: AIOEngine = Depends(get_engine),
+    loaders: Loaders = Depends(get_loaders),
+) -> Client:
 
-    client = await engine.find_one(Client, Client.id == ObjectId(client_id))
+    client = await loaders.client.load(ObjectId(client_id), fresh=True)
 
     if not client:
         raise HTTPException(status_code=404, detail=f"Cliente com o id {client_id} não encontrado")
     
+    previous_cpf = client.cpf
+
     for key, value in update_cliente.model_dump(exclude_unset=True).items():
             setattr(client, key, value)
 
-    await engine.save(client)
+    duplicate = HTTPException(status_code=400, detail=f"O Cliente com o cpf {client.cpf} já foi cadastrado")
+    if client.cpf != previous_cpf and await engine.find_one(Client, Client.cpf == client.cpf, Client.id != client.id):
+        raise duplicate
+
+    try:
+        await engine.save(client)
+    except DuplicateKeyError:
+        # Outra requisição gravou o mesmo cpf depois da checagem
+        raise duplicate
+    await collection_versions.bump("client")
 
     return client
 
 
 @router.delete("/{client_id}")
-async def delete_client_for_id(client_id: str) -> dict:
-    client = await engine.find_one(Client, Client.id == ObjectId(client_id))
+async def delete_client_for_id(
+    client_id: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    background: bool = False,
+    loaders: Loaders = Depends(get_loaders),
+) -> dict:
+    """Remove o cliente e seus pets e agendamentos.
+
+    Com `background=true` a remoção é agendada e a resposta 202 volta imediatamente.
+    """
+    client = await loaders.client.load(ObjectId(client_id), fresh=True)
 
     if not client:
         raise HTTPException(status_code=404, detail=f"Cliente com o {client_id} não encontrado")
-    
-    try: 
-        pets_delete = await engine.find(Pet, Pet.client == client.id)
-        for pets in pets_delete:
-            await engine.delete(pets)
-        
-        schedule_delete = await engine.find(Schedule, Schedule.client == client.id)
-        for schedules in schedule_delete:
-            await engine.delete(schedules)
 
-        await engine.delete(client)
+    if background:
+        background_tasks.add_task(delete_client_cascade, client.id, availability)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "Remoção do cliente agendada"}
 
-        return {"message": "Cliente deletado com sucesso"}
+    try: 
+        deleted = await delete_client_cascade(client.id, availability)
+
+        return {"message": "Cliente deletado com sucesso", "deleted": deleted}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao deletar cliente e seus dados associados: {str(e)}")
     
 
 @router.get("/total/schedules/by/client", response_model=list[dict])
-async def total_schedules_by_client() -> list[dict]:
+async def total_schedules_by_client(engine: AIOEngine = Depends(get_engine)) -> list[dict]:
     
     """Endpoint que retorna o total de agendamentos por cliente"""
-    collection = engine.get_collection(Schedule)
+    counts = await stats.read("client")
 
-    pipeline = [
-        {
-            "$lookup": {
-                "from": "client",
-                "localField": "client",
-                "foreignField": "_id",
-                "as": "client_info"
-            }
-        },
-        {
-            "$unwind": "$client_info"
-        },
-        {
-            "$group": {
-                "_id": {
-                    "client_id": {"$toString": "$client_info._id"},
-                    "client_name": "$client_info.name"
-                },
-                "total_schedules": {"$sum": 1}
-            }
-        },
-        {
-            "$project": {
-                "_id": 0,
-                "client_id": "$_id.client_id",
-                "client_name": "$_id.client_name",
-                "total_schedules": 1
-            }
-        },
+    collection = engine.get_collection(Client)
+    names = {
+        client["_id"]: client["name"]
+        async for client in collection.find({"_id": {"$in": [count["key"] for count in counts]}}, {"name": 1})
+    }
+
+    return [
         {
-            "$sort": {"total_schedules": -1}
+            "client_id": str(count["key"]),
+            "client_name": names[count["key"]],
+            "total_schedules": count["count"]
         }
+        for count in counts
+        if count["key"] in names
     ]
-
-    results = await collection.aggregate(pipeline).to_list(length=None)
-
-    return results
-
-
-
-
@@ -0,0 +1,188 @@
+import json
+from fastapi import APIRouter, Depends, Query, Request
+from odmantic import AIOEngine, ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from app.database import get_engine
+from app.models.Client import Client
+from app.models.Import import ImportLineError, ImportResult
+from app.models.Pet import Pet, PetImport
+from app.models.Services import Services
+from app.routes.ServicesRoutes import services_catalog
+from app.search import search_fields
+from app.stores import get_store, store_filter
+from app.versions import collection_versions
+
+router = APIRouter(
+    prefix="/import",
+    tags=["Import"],
+)
+
+MAX_REPORTED_ERRORS = 1000
+
+
+def _add_error(result: ImportResult, line: int, error: str) -> None:
+    result.total_errors += 1
+    if len(result.errors) < MAX_REPORTED_ERRORS:
+        result.errors.append(ImportLineError(line=line, error=error))
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(loc) for loc in item['loc'])}: {item['msg']}" for item in error.errors())
+    return str(error)
+
+
+async def _read_lines(request: Request):
+    """Lê o corpo da requisição em streaming, devolvendo `(número da linha, linha)`."""
+    buffer = b""
+    line_number = 0
+
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+
+    if buffer.strip():
+        yield line_number + 1, buffer
+
+
+async def _insert_unique(engine: AIOEngine, model, key: str, entries: list[tuple[int, dict]], result: ImportResult, kind: str) -> None:
+    """Insere na loja corrente os documentos cujo `key` ainda não existe nela, checando o lote com um único `$in`."""
+    collection = engine.get_collection(model)
+
+    unique_entries = []
+    seen = set()
+    for line, doc in entries:
+        doc["store_id"] = get_store()
+        if doc[key] in seen:
+            _add_error(result, line, f"{key} {doc[key]} repetido no arquivo")
+        else:
+            seen.add(doc[key])
+            unique_entries.append((line, doc))
+
+    existing = {
+        doc[key] async for doc in collection.find({**store_filter(), key: {"$in": list(seen)}}, {key: 1})
+    }
+
+    to_insert = []
+    for line, doc in unique_entries:
+        if doc[key] in existing:
+            _add_error(result, line, f"{key} {doc[key]} já cadastrado")
+        else:
+            to_insert.append((line, doc))
+
+    if not to_insert:
+        return
+
+    failed = {}
+    try:
+        await collection.insert_many([doc for _, doc in to_insert], ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+
+    for position, (line, _) in enumerate(to_insert):
+        if position in failed:
+            _add_error(result, line, f"Erro ao salvar: {failed[position]}")
+
+    result.inserted[kind] += len(to_insert) - len(failed)
+
+
+async def _resolve_owners(engine: AIOEngine, pets: list[tuple[int, PetImport]], result: ImportResult) -> list[tuple[int, dict]]:
+    """Troca `client_cpf`/`client_id` pelo `_id` do dono, com uma consulta por tipo de referência."""
+    cpfs = {pet.client_cpf for _, pet in pets if pet.client_cpf}
+    ids = {ObjectId(pet.client_id) for _, pet in pets if pet.client_id and ObjectId.is_valid(pet.client_id)}
+
+    clients = engine.get_collection(Client)
+    by_cpf = {doc["cpf"]: doc["_id"] async for doc in clients.find({**store_filter(), "cpf": {"$in": list(cpfs)}}, {"cpf": 1})} if cpfs else {}
+    known_ids = {doc["_id"] async for doc in clients.find({**store_filter(), "_id": {"$in": list(ids)}}, {"_id": 1})} if ids else set()
+
+    docs = []
+    for line, pet in pets:
+        if pet.client_id:
+            owner = ObjectId(pet.client_id) if ObjectId.is_valid(pet.client_id) else None
+            owner = owner if owner in known_ids else None
+        else:
+            owner = by_cpf.get(pet.client_cpf)
+
+        if owner is None:
+            _add_error(result, line, "Cliente do pet não encontrado")
+            continue
+
+        doc = pet.model_dump(exclude={"client_id", "client_cpf"})
+        doc.update({"_id": ObjectId(), "client": owner, **search_fields(pet.name)})
+        docs.append((line, doc))
+
+    return docs
+
+
+async def _import_chunk(engine: AIOEngine, chunk: list[tuple[int, bytes]], result: ImportResult) -> None:
+    clients, services, pets = [], [], []
+
+    for line, raw in chunk:
+        try:
+            record = json.loads(raw)
+            if not isinstance(record, dict):
+                raise ValueError("Cada linha deve ser um objeto JSON")
+            kind = record.pop("type", None)
+
+            if kind == "client":
+                clients.append((line, Client.model_validate(record).model_dump_doc()))
+            elif kind == "service":
+                services.append((line, Services.model_validate(record).model_dump_doc()))
+            elif kind == "pet":
+                pet = PetImport.model_validate(record)
+                if not pet.client_id and not pet.client_cpf:
+                    raise ValueError("Informe client_id ou client_cpf")
+                pets.append((line, pet))
+            else:
+                raise ValueError("O campo type deve ser client, pet ou service")
+        except (ValueError, AttributeError, ValidationError) as e:
+            _add_error(result, line, _describe(e))
+
+    # Clientes antes dos pets, para que pets do mesmo lote encontrem o dono
+    if clients:
+        await _insert_unique(engine, Client, "cpf", clients, result, "client")
+    if services:
+        await _insert_unique(engine, Services, "type_service", services, result, "service")
+    if pets:
+        await _insert_unique(engine, Pet, "name", await _resolve_owners(engine, pets, result), result, "pet")
+
+
+@router.post("/", response_model=ImportResult)
+async def import_records(
+    request: Request,
+    chunk_size: int = Query(1000, gt=0, le=10000),
+    engine: AIOEngine = Depends(get_engine),
+) -> ImportResult:
+    """Importa clientes, pets e serviços de um upload NDJSON enviado em streaming.
+
+    Cada linha traz `type` (`client`, `pet` ou `service`) e os campos do registro.
+    Pets indicam o dono por `client_id` ou `client_cpf`, e o cliente deve vir antes
+    no arquivo. As linhas são gravadas em lotes de `chunk_size` e os erros são
+    reportados por número de linha.
+    """
+    result = ImportResult()
+
+    chunk = []
+    async for line in _read_lines(request):
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            await _import_chunk(engine, chunk, result)
+            chunk = []
+
+    if chunk:
+        await _import_chunk(engine, chunk, result)
+
+    if result.inserted["service"]:
+        await services_catalog.invalidate()
+
+    changed = [model.__collection__ for model, kind in ((Client, "client"), (Pet, "pet")) if result.inserted[kind]]
+    if changed:
+        await collection_versions.bump(*changed)
+
+    return result
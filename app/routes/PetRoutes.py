@@ -1,11 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from odmantic import ObjectId
+from enum import Enum
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Response, status
+from odmantic import AIOEngine, ObjectId
+from odmantic.exceptions import DuplicateKeyError
 from typing import Optional, List
 
 from app.database import get_engine
-from app.models.Pet import Pet, PetUpdate
+from app.loader import Loaders, get_loaders
+from app.pagination import Page, find_page
+from app.conditional import ConditionalGet
+from app.versions import collection_versions
+from app.fastread import FIELDS_DESCRIPTION, RawResponse, find_raw, find_raw_page
+from app.formats import JSON, response_format
+from app.cascade import delete_pet_cascade
+from app.routes.ScheduleRoutes import availability
 from app.models.Client import Client
-from app.models.Schedule import Schedule
+from app.models.Pet import Pet, PetUpdate
+from app.search import contains_filter, prefix_filter, rank_stages, search_fields
+from app.stores import store_filter
+
+
+class SearchMode(str, Enum):
+    prefix = "prefix"
+    contains = "contains"
 
 
 router = APIRouter(
@@ -15,11 +31,11 @@ router = APIRouter(
 
 
 @router.post("/{client_id}/pet/", response_model=Pet)
-async def create_pet_for_client(client_id: str, pet: Pet):
+async def create_pet_for_client(
+    client_id: str, pet: Pet, engine: AIOEngine = Depends(get_engine), loaders: Loaders = Depends(get_loaders)
+):
     """Cria um novo pet associado a um cliente a partir do `client_id`."""
-    engine = get_engine()
-
-    client = await engine.find_one(Client, Client.id == ObjectId(client_id))
+    client = await loaders.client.load(ObjectId(client_id))
     if not client:
         raise HTTPException(status_code=404, detail=f"Cliente {client_id} não encontrado")
 
@@ -31,14 +47,43 @@ async def create_pet_for_client(client_id: str, pet: Pet):
         )
 
     pet.client = client
+    for key, value in search_fields(pet.name).items():
+        setattr(pet, key, value)
+
     await engine.save(pet)
+    await collection_versions.bump("pet")
     return pet
 
 
-@router.get("/", response_model=List[Pet])
-async def read_pets(offset: int = 0, limit: int = Query(default=10, le=100)):
-    """Retorna todos os pets cadastrados, com paginação."""
-    engine = get_engine()
+@router.get("/", response_model=List[Pet] | Page[Pet])
+async def read_pets(
+    offset: int = 0,
+    limit: int = Query(default=10, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor da página anterior; envie vazio para começar a paginação por cursor"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    cache_headers: dict = Depends(ConditionalGet("pet", "client")),
+    media_type: str = Depends(response_format),
+    engine: AIOEngine = Depends(get_engine),
+):
+    """Retorna todos os pets cadastrados, com paginação.
+
+    Com `cursor` a paginação é por keyset e a resposta traz `items` e `next_cursor`.
+    Com `fields` os pets são lidos sem passar pelos modelos e `client` volta só como id.
+    """
+    if fields is not None or media_type != JSON:
+        # MessagePack e BSON sempre saem da leitura rápida, sem `fields` com todos os campos
+        fields = fields or ""
+        if cursor is not None:
+            return RawResponse(await find_raw_page(Pet, fields, cursor=cursor, limit=limit), media_type=media_type, headers=cache_headers)
+
+        pets = await find_raw(Pet, fields, skip=offset, limit=limit)
+        if not pets:
+            raise HTTPException(status_code=404, detail="Nenhum pet cadastrado")
+        return RawResponse(pets, media_type=media_type, headers=cache_headers)
+
+    if cursor is not None:
+        return await find_page(Pet, cursor=cursor, limit=limit)
+
     pets = await engine.find(Pet, skip=offset, limit=limit)
 
     if not pets:
@@ -47,11 +92,9 @@ async def read_pets(offset: int = 0, limit: int = Query(default=10, le=100)):
     return pets
 
 
-@router.get("/{client_id}", response_model=List[Pet])
-async def read_pet_for_client(client_id: str) -> List[Pet]:
+@router.get("/{client_id}", response_model=List[Pet], dependencies=[Depends(ConditionalGet("pet", "client"))])
+async def read_pet_for_client(client_id: str, engine: AIOEngine = Depends(get_engine)) -> List[Pet]:
     """Retorna todos os pets associados a um `client_id`."""
-    engine = get_engine()
-
     if not ObjectId.is_valid(client_id):
         raise HTTPException(status_code=400, detail="ID de cliente inválido")
 
@@ -63,71 +106,118 @@ async def read_pet_for_client(client_id: str) -> List[Pet]:
 
 
 @router.delete("/pets/{pet_id}")
-async def delete_pet(pet_id: str):
-    engine = get_engine()
-
+async def delete_pet(
+    pet_id: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    background: bool = False,
+    loaders: Loaders = Depends(get_loaders),
+):
+    """Remove o pet e seus agendamentos. Com `background=true` responde 202 imediatamente."""
     if not ObjectId.is_valid(pet_id):
         raise HTTPException(status_code=400, detail="ID do pet inválido")
 
-    pet = await engine.find_one(Pet, Pet.id == ObjectId(pet_id))
+    pet = await loaders.pet.load(ObjectId(pet_id), fresh=True)
     if not pet:
         raise HTTPException(status_code=404, detail="Pet não encontrado")
 
-    # Remover agendamentos associados ao pet
-    schedules = await engine.find(Schedule, Schedule.pet == pet.id)
-    for schedule in schedules:
-        await engine.delete(schedule)
+    if background:
+        background_tasks.add_task(delete_pet_cascade, pet.id, availability)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"ok": True}
 
-    # Remover o pet
-    await engine.delete(pet)
+    # Remover agendamentos associados e o pet
+    deleted = await delete_pet_cascade(pet.id, availability)
     
-    return {"ok": True}
+    return {"ok": True, "deleted": deleted}
 
 
 @router.put("/{pet_id}")
-async def update_pet(pet_id: str, update_data: PetUpdate):
-    engine = get_engine()
-
+async def update_pet(
+    pet_id: str,
+    update_data: PetUpdate,
+    engine: AIOEngine = Depends(get_engine),
+    loaders: Loaders = Depends(get_loaders),
+):
     # Validar o ID
     if not ObjectId.is_valid(pet_id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
     # Buscar o pet pelo ID
-    pet = await engine.find_one(Pet, Pet.id == ObjectId(pet_id))
+    pet = await loaders.pet.load(ObjectId(pet_id), fresh=True)
     if not pet:
         raise HTTPException(status_code=404, detail="Pet não encontrado")
 
+    previous_name = pet.name
+
     # Atualizar os dados do pet
     for key, value in update_data.dict(exclude_unset=True).items():
         setattr(pet, key, value)
 
-    await engine.save(pet)
+    duplicate = HTTPException(
+        status_code=400,
+        detail=f"O cliente {pet.client.id} já tem um pet com o nome {pet.name} cadastrado"
+    )
+    if pet.name != previous_name and await engine.find_one(Pet, Pet.name == pet.name, Pet.id != pet.id):
+        raise duplicate
+
+    for key, value in search_fields(pet.name).items():
+        setattr(pet, key, value)
+
+    try:
+        await engine.save(pet)
+    except DuplicateKeyError:
+        # Outra requisição gravou o mesmo nome depois da checagem
+        raise duplicate
+    await collection_versions.bump("pet")
     return pet
 
 @router.get("/{pet_name}/pet-name", response_model=List[Pet])
 async def get_pet_by_name(
     pet_name: str,
     client_id: Optional[str] = None,
+    mode: SearchMode = SearchMode.contains,
     offset: int = 0,
     limit: int = Query(default=10, le=100),
+    engine: AIOEngine = Depends(get_engine),
+    loaders: Loaders = Depends(get_loaders),
 ):
-    """Busca pets por nome parcial ou completo. Se `client_id` for informado, filtra pelos pets do cliente."""
-    engine = get_engine()
+    """Busca pets por nome, sem diferenciar maiúsculas nem acentos.
 
-    # Filtro base para buscar o nome parcialmente correspondente (case insensitive)
-    filters = {"name": {"$regex": pet_name, "$options": "i"}}
+    `mode=prefix` busca nomes que começam com o termo (autocomplete); `mode=contains`
+    busca o termo em qualquer parte do nome, com os resultados ordenados por relevância.
+    Se `client_id` for informado, filtra pelos pets do cliente.
+    """
+    if mode is SearchMode.prefix:
+        filters = prefix_filter(pet_name)
+    else:
+        filters = contains_filter(pet_name)
 
     if client_id:
         if not ObjectId.is_valid(client_id):
             raise HTTPException(status_code=400, detail="ID do cliente inválido")
         
-        client = await engine.find_one(Client, Client.id == ObjectId(client_id))
+        client = await loaders.client.load(ObjectId(client_id))
         if not client:
             raise HTTPException(status_code=404, detail="Cliente não encontrado")
         
         filters["client"] = client.id
 
-    pets = await engine.find(Pet, filters, skip=offset, limit=limit)
+    if mode is SearchMode.prefix:
+        pets = await engine.find(Pet, filters, sort=Pet.name_search, skip=offset, limit=limit)
+    else:
+        # A relevância é calculada no banco, então a paginação vale para todos os resultados
+        pipeline = [{"$match": {**filters, **store_filter()}}, *rank_stages(pet_name)]
+        if offset:
+            pipeline.append({"$skip": offset})
+        pipeline += [
+            {"$limit": limit},
+            {"$project": {"_position": 0, "_kind": 0, "_length": 0}},
+            {"$lookup": {"from": Client.__collection__, "localField": "client", "foreignField": "_id", "as": "client"}},
+            {"$unwind": "$client"},
+        ]
+        docs = await engine.get_collection(Pet).aggregate(pipeline).to_list(length=None)
+        pets = [Pet.model_validate_doc(doc) for doc in docs]
     
     if not pets:
         raise HTTPException(status_code=404, detail="Nenhum pet encontrado")
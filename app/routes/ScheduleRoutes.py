@@ -1,61 +1,367 @@
-from fastapi import APIRouter, HTTPException, Query
-from app.database import get_engine
-from odmantic import ObjectId
-from datetime import datetime
+import asyncio
+import os
+from collections import Counter
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, status
+from fastapi.responses import StreamingResponse
+from app.database import get_engine, supports_transactions
+from app.loader import Loaders, get_loaders
+from app.feed import schedule_feeds, serve_websocket, sse_stream
+from app.archive import archive_state, find_schedules
+from app.pagination import Page, find_page
+from app.conditional import ConditionalGet
+from app.versions import collection_versions
+from app.fastread import FIELDS_DESCRIPTION, RawResponse, find_raw, find_raw_page
+from app.formats import JSON, response_format
+from app.routes.ServicesRoutes import services_catalog
+from app.availability import AvailabilityIndex
+from app.export import ExportFormat, export_response, negotiated_format
+from app.stores import get_store, store_filter
+from app import stats
+from app.cache import analytics_cache
+from odmantic import AIOEngine, ObjectId
+from typing import Optional
+from datetime import date, datetime, time
 from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError
 
-from app.models.Client import Client
-from app.models.Pet import Pet
-from app.models.Services import Services
-from app.models.Schedule import Schedule, ScheduleCreateRequest, ScheduleUpdate
+from app.models.Schedule import (
+    Schedule, ScheduleCreateRequest, ScheduleUpdate, ScheduleBatchResult, ServiceSnapshot, snapshot_fields
+)
 
 router = APIRouter(
     prefix="/schedules",
     tags=["Schedules"], 
 )
 
-engine = get_engine()
+MAX_BATCH_SIZE = 500
+
+availability = AvailabilityIndex(
+    durations=services_catalog.get_many,
+    ttl=float(os.getenv("AVAILABILITY_TTL", "5")),
+    opening=time(int(os.getenv("OPENING_HOUR", "8"))),
+    closing=time(int(os.getenv("CLOSING_HOUR", "18"))),
+    step_minutes=int(os.getenv("SLOT_MINUTES", "30")),
+)
+
+SCHEDULE_CONFLICT = "Horário indisponível: conflita com outro agendamento"
+
+
+def _parse_schedule_ids(schedule_data: ScheduleCreateRequest) -> tuple[ObjectId, ObjectId, list[ObjectId]]:
+    """Converte os ids recebidos em `ObjectId`, com erro 400 para ids inválidos."""
+    try:
+        return (
+            ObjectId(schedule_data.client_id),
+            ObjectId(schedule_data.pet_id),
+            [ObjectId(service_id) for service_id in schedule_data.service_ids],
+        )
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="ID de cliente, pet ou serviço inválido")
+
+
+async def _load_schedule_references(
+    loaders: Loaders, client_ids: set[ObjectId], pet_ids: set[ObjectId], service_ids: set[ObjectId]
+) -> tuple[dict, dict, dict]:
+    """Busca clientes e pets pelos loaders, agrupados em consultas `$in`, e os serviços no catálogo em memória."""
+    return await asyncio.gather(
+        loaders.client.load_many(client_ids),
+        loaders.pet.load_many(pet_ids),
+        services_catalog.get_many(service_ids),
+    )
 
-@router.post("/", response_model=Schedule)
-async def create_schedule(schedule_data: ScheduleCreateRequest) -> Schedule:
-    client = await engine.find_one(Client, Client.id == ObjectId(schedule_data.client_id))
 
+def _build_schedule(
+    schedule_data: ScheduleCreateRequest,
+    ids: tuple[ObjectId, ObjectId, list[ObjectId]],
+    clients: dict,
+    pets: dict,
+    services: dict,
+) -> Schedule:
+    """Valida o pedido contra as referências carregadas e monta o agendamento."""
+    client_id, pet_id, service_ids = ids
+
+    client = clients.get(client_id)
     if not client:
         raise HTTPException(status_code=404, detail=f"Cliente com id {schedule_data.client_id} não encontrado")
 
-    pet = await engine.find_one(Pet, Pet.id == ObjectId(schedule_data.pet_id))
+    pet = pets.get(pet_id)
     if not pet or pet.client.id != client.id:
         raise HTTPException(status_code=400, detail="Pet não encontrado ou não pertence ao cliente")
 
-    service_ids = []
-    for service_id in schedule_data.service_ids:
-        service = await engine.find_one(Services, Services.id == ObjectId(service_id))
-        if not service:
-            raise HTTPException(status_code=404, detail=f"Serviço com id {service_id} não encontrado")
-        service_ids.append(service.id) 
+    missing = [str(service_id) for service_id in service_ids if service_id not in services]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Serviços com os ids {', '.join(missing)} não encontrados")
+
+    service_snapshots = [
+        ServiceSnapshot(
+            service_id=service_id,
+            type_service=services[service_id].type_service,
+            price=services[service_id].price,
+            duration_in_minutes=services[service_id].duration_in_minutes,
+        )
+        for service_id in service_ids
+    ]
 
-    new_schedule = Schedule(
+    return Schedule(
         client=client,
         pet=pet,
         services=service_ids,
-        date_schedule=schedule_data.date_schedule
+        date_schedule=schedule_data.date_schedule,
+        # O lote grava com `insert_many`, sem passar pelo `StoreEngine`
+        store_id=get_store(),
+        **snapshot_fields(client.name, pet.name, pet.breed, service_snapshots, schedule_data.date_schedule),
     )
 
-    await engine.save(new_schedule)
+
+@router.post("/", response_model=Schedule)
+async def create_schedule(
+    schedule_data: ScheduleCreateRequest,
+    engine: AIOEngine = Depends(get_engine),
+    loaders: Loaders = Depends(get_loaders),
+) -> Schedule:
+    ids = _parse_schedule_ids(schedule_data)
+    client_id, pet_id, service_ids = ids
+
+    clients, pets, services = await _load_schedule_references(loaders, {client_id}, {pet_id}, set(service_ids))
+
+    new_schedule = _build_schedule(schedule_data, ids, clients, pets, services)
+    end = new_schedule.end_time
+
+    async with availability.lock:
+        if not await availability.is_free(new_schedule.date_schedule, end):
+            raise HTTPException(status_code=409, detail=SCHEDULE_CONFLICT)
+
+        await engine.save(new_schedule)
+        # Outro worker pode ter gravado no mesmo horário desde a leitura do cache
+        if await availability.confirm([(new_schedule.date_schedule, end, new_schedule.id)]):
+            await engine.delete(new_schedule)
+            availability.remove(new_schedule.date_schedule, new_schedule.id)
+            raise HTTPException(status_code=409, detail=SCHEDULE_CONFLICT)
+
+    await stats.apply(stats.count_schedules([new_schedule.model_dump_doc()]))
+    analytics_cache.invalidate()
+    await collection_versions.bump("schedule")
 
     return new_schedule
 
-@router.get("/Get/All", response_model=list[Schedule])
-async def get_all_schedules(skip: int = Query(0, ge=0), limit: int = Query(10, gt=0, le=100)) -> list[Schedule]:
+@router.post("/batch", response_model=list[ScheduleBatchResult])
+async def create_schedules_batch(
+    schedules_data: list[ScheduleCreateRequest],
+    engine: AIOEngine = Depends(get_engine),
+    loaders: Loaders = Depends(get_loaders),
+) -> list[ScheduleBatchResult]:
+    """Valida e cria vários agendamentos de uma vez, retornando o resultado de cada item."""
+    if len(schedules_data) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"O lote deve ter no máximo {MAX_BATCH_SIZE} agendamentos")
+
+    results = [ScheduleBatchResult(index=index) for index in range(len(schedules_data))]
+    parsed = {}
+
+    for index, schedule_data in enumerate(schedules_data):
+        try:
+            parsed[index] = _parse_schedule_ids(schedule_data)
+        except HTTPException as e:
+            results[index].error = e.detail
+
+    clients, pets, services = await _load_schedule_references(
+        loaders,
+        {ids[0] for ids in parsed.values()},
+        {ids[1] for ids in parsed.values()},
+        {service_id for ids in parsed.values() for service_id in ids[2]},
+    )
+
+    new_schedules = []
+    for index, ids in parsed.items():
+        try:
+            new_schedules.append((index, _build_schedule(schedules_data[index], ids, clients, pets, services)))
+        except HTTPException as e:
+            results[index].error = e.detail
+
+    async with availability.lock:
+        # Reserva os horários em sequência, assim itens do mesmo lote também conflitam entre si
+        await availability.preload([(schedule.date_schedule, schedule.end_time) for _, schedule in new_schedules])
+        booked = []
+        for index, schedule in new_schedules:
+            end = schedule.end_time
+            if await availability.is_free(schedule.date_schedule, end):
+                await availability.add(schedule.date_schedule, end, schedule.id)
+                booked.append((index, schedule))
+            else:
+                results[index].error = SCHEDULE_CONFLICT
+
+        if not booked:
+            return results
+
+        failed = {}
+        try:
+            await engine.get_collection(Schedule).insert_many(
+                [schedule.model_dump_doc() for _, schedule in booked], ordered=False
+            )
+        except BulkWriteError as e:
+            failed = {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+
+        saved = [schedule for position, (_, schedule) in enumerate(booked) if position not in failed]
+        # Outro worker pode ter gravado nos mesmos horários desde a leitura do cache
+        conflicts = await availability.confirm([(schedule.date_schedule, schedule.end_time, schedule.id) for schedule in saved])
+        if conflicts:
+            await engine.get_collection(Schedule).delete_many({"_id": {"$in": list(conflicts)}})
+
+        inserted = []
+        for position, (index, schedule) in enumerate(booked):
+            if position in failed:
+                availability.remove(schedule.date_schedule, schedule.id)
+                results[index].error = f"Erro ao salvar agendamento: {failed[position]}"
+            elif schedule.id in conflicts:
+                availability.remove(schedule.date_schedule, schedule.id)
+                results[index].error = SCHEDULE_CONFLICT
+            else:
+                results[index].id = str(schedule.id)
+                inserted.append(schedule.model_dump_doc())
+
+    await stats.apply(stats.count_schedules(inserted))
+    analytics_cache.invalidate()
+    await collection_versions.bump("schedule")
+
+    return results
+
+@router.get("/availability", response_model=dict)
+async def get_availability(day: date = Query(alias="date"), service_ids: list[str] = Query([])) -> dict:
+    """Lista os horários livres do dia para o conjunto de serviços informado."""
+    try:
+        ids = [ObjectId(service_id) for service_id in service_ids]
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="ID de serviço inválido")
+
+    services = await services_catalog.get_many(ids)
+    missing = [str(service_id) for service_id in ids if service_id not in services]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Serviços com os ids {', '.join(missing)} não encontrados")
+
+    duration = await availability.duration(ids)
+
+    return {
+        "date": day,
+        "duration_in_minutes": int(duration.total_seconds() // 60),
+        "slots": await availability.free_slots(day, duration),
+    }
+
+@router.get("/Get/All", response_model=list[Schedule] | Page[Schedule])
+async def get_all_schedules(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, gt=0, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor da página anterior; envie vazio para começar a paginação por cursor"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    cache_headers: dict = Depends(ConditionalGet("schedule", "client", "pet")),
+    media_type: str = Depends(response_format),
+    engine: AIOEngine = Depends(get_engine),
+) -> list[Schedule] | Page[Schedule]:
+    """Lista os agendamentos. Com `cursor` a ordem é por `date_schedule` e a resposta traz `next_cursor`.
+
+    Com `fields` os agendamentos são lidos sem passar pelos modelos e `client`/`pet` voltam só como ids.
+    """
+    if fields is not None or media_type != JSON:
+        # MessagePack e BSON sempre saem da leitura rápida, sem `fields` com todos os campos
+        fields = fields or ""
+        if cursor is not None:
+            return RawResponse(
+                await find_raw_page(Schedule, fields, cursor=cursor, limit=limit, keys=("date_schedule", "_id")),
+                media_type=media_type,
+                headers=cache_headers,
+            )
+        return RawResponse(await find_raw(Schedule, fields, skip=skip, limit=limit), media_type=media_type, headers=cache_headers)
+
+    if cursor is not None:
+        return await find_page(Schedule, cursor=cursor, limit=limit, keys=("date_schedule", "_id"))
 
     schedules = await engine.find(Schedule, skip=skip, limit=limit)
 
     return schedules
 
+@router.get("/export")
+async def export_schedules(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    export_format: ExportFormat = Depends(negotiated_format),
+    batch_size: int = Query(1000, gt=0, le=10000),
+    engine: AIOEngine = Depends(get_engine),
+):
+    """Exporta os agendamentos em NDJSON, CSV, MessagePack ou BSON, em streaming, ordenados por data.
+
+    Os arquivados no intervalo vêm antes, lidos das coleções de arquivo de cada ano.
+    """
+    filters = store_filter()
+    if start or end:
+        filters["date_schedule"] = {}
+        if start:
+            filters["date_schedule"]["$gte"] = start
+        if end:
+            filters["date_schedule"]["$lt"] = end
+
+    return export_response(
+        [*await archive_state.collections(start, end), engine.get_collection(Schedule)],
+        filters,
+        ["_id", "client", "pet", "services", "date_schedule"],
+        export_format,
+        batch_size,
+        filename="schedules",
+        sort=[("date_schedule", 1), ("_id", 1)],
+    )
+
+async def _subscribe_feed(day: Optional[date], client_id: Optional[str], last_event_id: Optional[str]):
+    """Valida os filtros e assina o feed; change streams só existem em replica set."""
+    if client_id is not None and not ObjectId.is_valid(client_id):
+        raise HTTPException(status_code=400, detail="ID de cliente inválido")
+
+    if not await supports_transactions():
+        raise HTTPException(status_code=503, detail="O feed ao vivo exige o MongoDB em replica set")
+
+    return schedule_feeds.get().subscribe(day, ObjectId(client_id) if client_id else None, last_event_id)
+
+@router.get("/feed")
+async def get_schedule_feed(
+    day: Optional[date] = Query(None, alias="date"),
+    client_id: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """Feed ao vivo (Server-Sent Events) de agendamentos criados, alterados e removidos.
+
+    Filtra por `date` e/ou `client_id`. Ao reconectar, o `Last-Event-ID` reenvia os
+    eventos perdidos; o evento `reset` indica que o cliente deve recarregar a lista.
+    """
+    subscription = await _subscribe_feed(day, client_id, last_event_id)
+
+    return StreamingResponse(
+        sse_stream(schedule_feeds.get(), subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/feed/ws")
+async def schedule_feed_websocket(
+    websocket: WebSocket,
+    day: Optional[date] = Query(None, alias="date"),
+    client_id: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+):
+    """O mesmo feed de `/feed` por WebSocket, com cada evento como uma mensagem JSON."""
+    try:
+        subscription = await _subscribe_feed(day, client_id, last_event_id)
+    except HTTPException as e:
+        code = status.WS_1008_POLICY_VIOLATION if e.status_code == 400 else status.WS_1011_INTERNAL_ERROR
+        await websocket.close(code=code, reason=e.detail)
+        return
+
+    await websocket.accept()
+    await serve_websocket(schedule_feeds.get(), subscription, websocket)
+
+@router.get("/feed/stats", response_model=dict)
+async def get_schedule_feed_stats() -> dict:
+    """Endpoint que retorna assinantes, eventos e transbordos do feed ao vivo da loja"""
+    return schedule_feeds.get().stats()
+
 @router.get("/{schedule_id}", response_model=Schedule)
-async def get_schedule_by_id(schedule_id: str) -> Schedule:
+async def get_schedule_by_id(schedule_id: str, loaders: Loaders = Depends(get_loaders)) -> Schedule:
 
-    schedule = await engine.find_one(Schedule, Schedule.id == ObjectId(schedule_id))
+    schedule = await loaders.schedule.load(ObjectId(schedule_id))
 
     if not schedule:
         raise HTTPException(status_code=404, detail=f"Agendamento com o id {schedule_id} não encontrado")
@@ -63,34 +369,82 @@ async def get_schedule_by_id(schedule_id: str) -> Schedule:
     return schedule
 
 @router.delete("/{schedule_id}", response_model=dict)
-async def delete_schedule_by_id(schedule_id: str) -> dict:
+async def delete_schedule_by_id(
+    schedule_id: str, engine: AIOEngine = Depends(get_engine), loaders: Loaders = Depends(get_loaders)
+) -> dict:
 
-    schedule = await engine.find_one(Schedule, Schedule.id == ObjectId(schedule_id))
+    schedule = await loaders.schedule.load(ObjectId(schedule_id), fresh=True)
 
     if not schedule:
         raise HTTPException(status_code=404, detail=f"Agendamento com o id {schedule_id} não encontrado")
     
     await engine.delete(schedule)
+    availability.remove(schedule.date_schedule, schedule.id)
+    await stats.apply(stats.count_schedules([schedule.model_dump_doc()]), sign=-1)
+    analytics_cache.invalidate()
+    await collection_versions.bump("schedule")
 
     return {"message": "Agendamento excluido com sucesso"}
 
 @router.put("/{schedule_id}", response_model=Schedule)
-async def update_schedule_by_id(schedule_id: str, update_schedule: ScheduleUpdate) -> Schedule:
+async def update_schedule_by_id(
+    schedule_id: str,
+    update_schedule: ScheduleUpdate,
+    engine: AIOEngine = Depends(get_engine),
+    loaders: Loaders = Depends(get_loaders),
+) -> Schedule:
 
-    schedule = await engine.find_one(Schedule, Schedule.id == ObjectId(schedule_id))
+    schedule = await loaders.schedule.load(ObjectId(schedule_id), fresh=True)
 
     if not schedule:
         raise HTTPException(status_code=404, detail="Agendamento não encontrado")
     
+    previous_date = schedule.date_schedule
+    previous_end = schedule.end_time
+
     for key, value in update_schedule.model_dump(exclude_unset=True).items():
             setattr(schedule, key, value)
 
-    await engine.save(schedule)
+    if schedule.date_schedule == previous_date:
+        await engine.save(schedule)
+        await collection_versions.bump("schedule")
+        return schedule
+
+    # A duração é a gravada no agendamento; só os não migrados usam a duração atual dos serviços
+    if schedule.end_time is not None:
+        duration = schedule.end_time - previous_date
+    else:
+        duration = await availability.duration(schedule.services)
+    end = schedule.date_schedule + duration
+    schedule.end_time = end
+
+    async with availability.lock:
+        if not await availability.is_free(schedule.date_schedule, end, exclude=schedule.id):
+            raise HTTPException(status_code=409, detail=SCHEDULE_CONFLICT)
+
+        await engine.save(schedule)
+        availability.remove(previous_date, schedule.id)
+        # Outro worker pode ter gravado no novo horário desde a leitura do cache
+        if await availability.confirm([(schedule.date_schedule, end, schedule.id)]):
+            new_date = schedule.date_schedule
+            schedule.date_schedule, schedule.end_time = previous_date, previous_end
+            await engine.save(schedule)
+            availability.remove(new_date, schedule.id)
+            await availability.add(previous_date, previous_end or previous_date + duration, schedule.id)
+            raise HTTPException(status_code=409, detail=SCHEDULE_CONFLICT)
+
+    # Só o recorte por mês depende da data; no mesmo mês as duas parcelas se anulam
+    counts = Counter()
+    counts[("month", stats.month_key(previous_date))] -= 1
+    counts[("month", stats.month_key(schedule.date_schedule))] += 1
+    await stats.apply(counts)
+    analytics_cache.invalidate()
+    await collection_versions.bump("schedule")
 
     return schedule
 
-@router.get("/", response_model=Schedule)
-async def get_schedules_by_month(month: int, year: int) -> Schedule:
+@router.get("/", response_model=list[Schedule], dependencies=[Depends(ConditionalGet("schedule", "client", "pet"))])
+async def get_schedules_by_month(month: int, year: int, engine: AIOEngine = Depends(get_engine)) -> list[Schedule]:
 
     try:
         # Define o intervalo de datas (início e fim do mês)
@@ -104,9 +458,11 @@ async def get_schedules_by_month(month: int, year: int) -> Schedule:
             status_code=400, detail="Data inválida. Verifique o ano e o mês informados."
         )
 
-    # Busca os agendamentos no intervalo de datas
-    schedules = await engine.find(
-        Schedule,
+    # Busca os agendamentos no intervalo de datas, também nos arquivos se o mês já foi arquivado
+    schedules = await find_schedules(
+        engine,
+        start_date,
+        end_date,
         Schedule.date_schedule >= start_date,
         Schedule.date_schedule < end_date
     )
@@ -121,10 +477,35 @@ async def get_schedules_by_month(month: int, year: int) -> Schedule:
 @router.get("/total/schedules", response_model=dict)
 async def total_schedules() -> dict:
     """Endpoint que retorna o total de agendamentos cadastrados"""
-    total_schedules = await engine.count(Schedule)
+    total_schedules = await stats.total()
 
     return {"total_schedules": total_schedules}
 
+@router.get("/total/schedules/by/month", response_model=list[dict])
+async def total_schedules_by_month() -> list[dict]:
+    """Endpoint que retorna o total de agendamentos por mês (`AAAA-MM`)"""
+    months = await stats.read("month")
+
+    return sorted(
+        ({"month": month["key"], "total_schedules": month["count"]} for month in months),
+        key=lambda month: month["month"],
+    )
+
+@router.get("/total/schedules/by/service", response_model=list[dict])
+async def total_schedules_by_service() -> list[dict]:
+    """Endpoint que retorna o total de agendamentos por serviço"""
+    counts = await stats.read("service")
+    services = await services_catalog.get_many([count["key"] for count in counts])
+
+    return [
+        {
+            "service_id": str(count["key"]),
+            "type_service": services[count["key"]].type_service if count["key"] in services else None,
+            "total_schedules": count["count"],
+        }
+        for count in counts
+    ]
+
 
 
 
@@ -1,8 +1,21 @@
+import asyncio
+import os
+import time
+from bisect import bisect_right
 from enum import Enum
 from fastapi import APIRouter, HTTPException, Depends, Query
-from odmantic import ObjectId
-from app.database import engine
+from odmantic import AIOEngine, ObjectId
+from typing import Optional
+from app.database import get_engine
+from app.loops import PerLoop
+from app.cache import analytics_cache
+from app.conditional import ConditionalGet
+from app.versions import collection_versions
+from app.pagination import Page, find_page
+from app.fastread import FIELDS_DESCRIPTION, RawResponse, find_raw, find_raw_page
+from app.formats import JSON, response_format
 from app.models.Services import Services, ServiceUpdate
+from app.stores import get_store
 
 
 class CategoryPrice(str, Enum):
@@ -11,6 +24,111 @@ class CategoryPrice(str, Enum):
     expensive = "expensive services"
 
 
+# Faixas de preço (exclusivo, inclusivo] de cada categoria
+CATEGORY_PRICE_RANGES = {
+    CategoryPrice.cheap: (float("-inf"), 50.0),
+    CategoryPrice.medium: (50.0, 100.0),
+    CategoryPrice.expensive: (100.0, 500.0),
+}
+
+
+class _CatalogState:
+    """Catálogo carregado de uma loja."""
+
+    def __init__(self):
+        self.version: int | None = None
+        self.checked_at = 0.0
+        self.lock = PerLoop(asyncio.Lock)
+        self.by_id: dict[ObjectId, Services] = {}
+        self.by_category: dict[CategoryPrice, list[Services]] = {}
+
+
+class ServicesCatalog:
+    """Cache em memória do catálogo de serviços, um por loja.
+
+    A cada `ttl` segundos o cache compara sua versão com o contador salvo em
+    `collection_versions`, que toda escrita incrementa; assim os workers
+    convergem sem recarregar o catálogo quando nada mudou.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._stores: dict[str, _CatalogState] = {}
+
+    def _state(self) -> _CatalogState:
+        state = self._stores.get(get_store())
+        if state is None:
+            state = self._stores[get_store()] = _CatalogState()
+        return state
+
+    async def _read_version(self) -> int:
+        return await collection_versions.fetch("services")
+
+    async def _reload(self, state: _CatalogState, version: int) -> None:
+        # O `StoreEngine` só traz os serviços da loja corrente
+        services = sorted(await get_engine().find(Services), key=lambda service: service.price)
+        prices = [service.price for service in services]
+
+        state.by_id = {service.id: service for service in services}
+        state.by_category = {
+            category: services[bisect_right(prices, low):bisect_right(prices, high)]
+            for category, (low, high) in CATEGORY_PRICE_RANGES.items()
+        }
+        state.version = version
+
+    async def _refresh(self, force: bool = False) -> _CatalogState:
+        """Catálogo da loja, conferindo a versão a cada `ttl` segundos ou na hora com `force`."""
+        state = self._state()
+        if not force and state.version is not None and time.monotonic() - state.checked_at < self.ttl:
+            self.hits += 1
+            return state
+
+        async with state.lock.get():
+            if not force and state.version is not None and time.monotonic() - state.checked_at < self.ttl:
+                self.hits += 1
+                return state
+
+            version = await self._read_version()
+            if version != state.version:
+                self.misses += 1
+                await self._reload(state, version)
+            else:
+                self.hits += 1
+            state.checked_at = time.monotonic()
+
+        return state
+
+    async def get(self, service_id: ObjectId) -> Services | None:
+        return (await self.get_many([service_id])).get(service_id)
+
+    async def get_many(self, service_ids) -> dict[ObjectId, Services]:
+        by_id = (await self._refresh()).by_id
+        if any(service_id not in by_id for service_id in service_ids):
+            # Serviço criado em outro worker ainda fora da cópia local: confere a versão antes de dar 404
+            by_id = (await self._refresh(force=True)).by_id
+        return {service_id: by_id[service_id] for service_id in service_ids if service_id in by_id}
+
+    async def by_category(self, category: CategoryPrice) -> list[Services]:
+        return (await self._refresh()).by_category[category]
+
+    async def count(self) -> int:
+        return len((await self._refresh()).by_id)
+
+    async def invalidate(self) -> None:
+        """Incrementa a versão do catálogo e força a recarga local na próxima leitura."""
+        await collection_versions.bump("services")
+        self._state().version = None
+
+    def stats(self) -> dict:
+        state = self._state()
+        return {"hits": self.hits, "misses": self.misses, "size": len(state.by_id), "version": state.version}
+
+
+services_catalog = ServicesCatalog(ttl=float(os.getenv("SERVICES_CACHE_TTL", "30")))
+
+
 router = APIRouter(
     prefix="/services",
     tags=["Services"],
@@ -18,7 +136,7 @@ router = APIRouter(
 
 
 @router.post("/", response_model=Services)
-async def create_service(service: Services):
+async def create_service(service: Services, engine: AIOEngine = Depends(get_engine)):
     """Endpoint para criar um novo serviço"""
     existing_service = await engine.find_one(Services, Services.type_service == service.type_service)
     
@@ -28,12 +146,35 @@ async def create_service(service: Services):
         )
     
     await engine.save(service)
+    await services_catalog.invalidate()
     return service
 
 
-@router.get("/", response_model=list[Services])
-async def read_services(offset: int = 0, limit: int = Query(default=10, le=100)):
-    """Endpoint para listar todos os Serviços"""
+@router.get("/", response_model=list[Services] | Page[Services])
+async def read_services(
+    offset: int = 0,
+    limit: int = Query(default=10, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor da página anterior; envie vazio para começar a paginação por cursor"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    cache_headers: dict = Depends(ConditionalGet("services")),
+    media_type: str = Depends(response_format),
+    engine: AIOEngine = Depends(get_engine),
+):
+    """Endpoint para listar todos os Serviços. Com `fields` usa a leitura rápida, sem os modelos"""
+    if fields is not None or media_type != JSON:
+        # MessagePack e BSON sempre saem da leitura rápida, sem `fields` com todos os campos
+        fields = fields or ""
+        if cursor is not None:
+            return RawResponse(await find_raw_page(Services, fields, cursor=cursor, limit=limit), media_type=media_type, headers=cache_headers)
+
+        services = await find_raw(Services, fields, skip=offset, limit=limit)
+        if not services:
+            raise HTTPException(status_code=404, detail="Nenhum serviço cadastrado")
+        return RawResponse(services, media_type=media_type, headers=cache_headers)
+
+    if cursor is not None:
+        return await find_page(Services, cursor=cursor, limit=limit)
+
     services = await engine.find(Services, skip=offset, limit=limit)
     
     if not services:
@@ -42,10 +183,10 @@ async def read_services(offset: int = 0, limit: int = Query(default=10, le=100))
     return services
 
 
-@router.get("/{service_id}", response_model=Services)
+@router.get("/{service_id}", response_model=Services, dependencies=[Depends(ConditionalGet("services"))])
 async def read_service_for_id(service_id: str):
     """Endpoint que retorna um serviço a partir de um `service_id` do serviço"""
-    service = await engine.find_one(Services, Services.id == ObjectId(service_id))
+    service = await services_catalog.get(ObjectId(service_id))
     
     if not service:
         raise HTTPException(status_code=404, detail=f"Serviço com o ID {service_id} não foi encontrado")
@@ -54,7 +195,7 @@ async def read_service_for_id(service_id: str):
 
 
 @router.delete("/{service_id}")
-async def delete_service(service_id: str):
+async def delete_service(service_id: str, engine: AIOEngine = Depends(get_engine)):
     """Endpoint que deleta um serviço a partir do `service_id` fornecido"""
     service = await engine.find_one(Services, Services.id == ObjectId(service_id))
     
@@ -62,11 +203,13 @@ async def delete_service(service_id: str):
         raise HTTPException(status_code=404, detail="Serviço não foi encontrado")
     
     await engine.delete(service)
+    await services_catalog.invalidate()
+    analytics_cache.invalidate()
     return {"ok": True}
 
 
 @router.put("/{service_id}", response_model=Services)
-async def update_service(service_id: str, service_update: ServiceUpdate):
+async def update_service(service_id: str, service_update: ServiceUpdate, engine: AIOEngine = Depends(get_engine)):
     """Atualiza os dados do serviço pelo `service_id`"""
     
     service = await engine.find_one(Services, Services.id == ObjectId(service_id))
@@ -79,6 +222,8 @@ async def update_service(service_id: str, service_update: ServiceUpdate):
         setattr(service, key, value)
     
     await engine.save(service)
+    await services_catalog.invalidate()
+    analytics_cache.invalidate()
     return service
 
 
@@ -87,14 +232,10 @@ async def get_services_by_category_price(category_price: CategoryPrice):
     """
     Endpoint que retorna os serviços por uma categoria de preço.
     """
-    if category_price is CategoryPrice.cheap:
-        services = await engine.find(Services, Services.price <= 50)
-    elif category_price is CategoryPrice.medium:
-        services = await engine.find(Services, (Services.price > 50.0) & (Services.price <= 100.0))
-    elif category_price is CategoryPrice.expensive:
-        services = await engine.find(Services, (Services.price > 100.0) & (Services.price <= 500.0))
-    else:
+    if category_price not in CATEGORY_PRICE_RANGES:
         raise HTTPException(status_code=400, detail="Categoria de preço inválida")
+
+    services = await services_catalog.by_category(category_price)
     
     if not services:
         raise HTTPException(
@@ -108,5 +249,11 @@ async def get_services_by_category_price(category_price: CategoryPrice):
 @router.get("/total-services/", response_model=int)
 async def get_total_services():
     """Endpoint que retorna a quantidade total de serviços cadastrados no sistema"""
-    total_services = await engine.count(Services)
+    total_services = await services_catalog.count()
     return total_services
+
+
+@router.get("/cache/stats", response_model=dict)
+async def get_services_cache_stats() -> dict:
+    """Endpoint que retorna os contadores de acerto e falha do cache do catálogo"""
+    return services_catalog.stats()
@@ -0,0 +1,112 @@
+"""Busca de pets por nome.
+
+O nome é normalizado (minúsculas, sem acentos) em `name_search` e quebrado em
+trigramas em `name_tokens`, ambos indexados. A busca por prefixo usa uma regex
+ancorada sobre `name_search`; a busca por trecho usa `$all` sobre os trigramas e
+ordena os resultados no próprio banco (`rank_stages`).
+Pets salvos antes desses campos existirem são preenchidos com:
+
+    python -m app.search --backfill
+"""
+import asyncio
+import re
+import sys
+import unicodedata
+
+from pymongo import UpdateOne
+
+NGRAM_SIZE = 3
+# Campos internos da busca, fora das respostas da API
+SEARCH_FIELDS = ("name_search", "name_tokens")
+
+
+def normalize(text: str) -> str:
+    """Converte para minúsculas e remove acentos, para comparar nomes."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return " ".join("".join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+def ngrams(text: str) -> list[str]:
+    if len(text) <= NGRAM_SIZE:
+        return [text] if text else []
+    return sorted({text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)})
+
+
+def search_fields(name: str) -> dict:
+    """Campos de busca derivados do nome do pet."""
+    name_search = normalize(name)
+    return {"name_search": name_search, "name_tokens": ngrams(name_search)}
+
+
+def prefix_filter(term: str) -> dict:
+    """Filtro por prefixo, com a entrada escapada e ancorada para usar o índice."""
+    return {"name_search": {"$regex": f"^{re.escape(normalize(term))}"}}
+
+
+def contains_filter(term: str) -> dict:
+    """Filtro por trecho do nome usando os trigramas; termos curtos caem no prefixo."""
+    term = normalize(term)
+    if len(term) < NGRAM_SIZE:
+        return prefix_filter(term)
+    return {"name_tokens": {"$all": ngrams(term)}}
+
+
+def rank_stages(term: str) -> list[dict]:
+    """Estágios de agregação que confirmam o trecho e ordenam por nome igual, prefixo,
+    início de palavra e trecho, depois pela posição e pelo tamanho do nome."""
+    term = normalize(term)
+    return [
+        # Os trigramas podem casar fora de ordem, então a posição confirma o trecho
+        {"$addFields": {"_position": {"$indexOfCP": ["$name_search", term]}}},
+        {"$match": {"_position": {"$gte": 0}}},
+        {
+            "$addFields": {
+                "_kind": {
+                    "$switch": {
+                        "branches": [
+                            {"case": {"$eq": ["$name_search", term]}, "then": 0},
+                            {"case": {"$eq": ["$_position", 0]}, "then": 1},
+                            {
+                                "case": {"$eq": [{"$substrCP": ["$name_search", {"$subtract": ["$_position", 1]}, 1]}, " "]},
+                                "then": 2,
+                            },
+                        ],
+                        "default": 3,
+                    }
+                },
+                "_length": {"$strLenCP": "$name_search"},
+            }
+        },
+        {"$sort": {"_kind": 1, "_position": 1, "_length": 1, "name_search": 1, "_id": 1}},
+    ]
+
+
+async def backfill(batch_size: int = 1000) -> int:
+    """Preenche os campos de busca dos pets que ainda não os têm."""
+    from app.database import get_engine
+    from app.models.Pet import Pet
+
+    collection = get_engine().get_collection(Pet)
+    cursor = collection.find({"name_search": {"$exists": False}}, {"name": 1})
+
+    updated = 0
+    operations = []
+    async for doc in cursor:
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": search_fields(doc["name"])}))
+        if len(operations) >= batch_size:
+            await collection.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+        updated += len(operations)
+
+    return updated
+
+
+if __name__ == "__main__":
+    if "--backfill" not in sys.argv[1:]:
+        sys.exit("Uso: python -m app.search --backfill")
+
+    print(f"{asyncio.run(backfill())} pets atualizados")
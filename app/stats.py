@@ -0,0 +1,146 @@
+"""Contadores de agendamentos mantidos incrementalmente em `schedule_stats`.
+
+Cada documento guarda o total de um recorte (`total`, `client`, `month` ou
+`service`) de uma loja e é atualizado com `$inc` nas escritas de agendamentos
+da loja corrente. Para recalcular tudo do zero, depois de `python -m app.migrations`:
+
+    python -m app.stats --rebuild
+"""
+import asyncio
+import sys
+from collections import Counter
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from app.availability import naive_utc
+from app.database import get_engine
+from app.models.Schedule import Schedule
+from app.stores import current_store, get_store, store_filter
+
+STATS_COLLECTION = "schedule_stats"
+
+
+def _collection():
+    return get_engine().database[STATS_COLLECTION]
+
+
+def month_key(value: datetime) -> str:
+    value = naive_utc(value)
+    return f"{value.year:04d}-{value.month:02d}"
+
+
+def count_schedules(docs: list[dict]) -> Counter:
+    """Conta os recortes de cada documento de agendamento."""
+    counts = Counter()
+    for doc in docs:
+        counts[("total", "all")] += 1
+        counts[("client", doc["client"])] += 1
+        counts[("month", month_key(doc["date_schedule"]))] += 1
+        for service_id in doc["services"]:
+            counts[("service", service_id)] += 1
+    return counts
+
+
+async def apply(counts: Counter, sign: int = 1, session=None) -> None:
+    """Aplica os contadores à loja corrente com `$inc`, numa única chamada `bulk_write`."""
+    store = get_store()
+    operations = [
+        UpdateOne(
+            {"_id": f"{store}:{kind}:{key}"},
+            {"$inc": {"count": sign * amount}, "$setOnInsert": {"store_id": store, "kind": kind, "key": key}},
+            upsert=True,
+        )
+        for (kind, key), amount in counts.items()
+        if amount
+    ]
+
+    if operations:
+        await _collection().bulk_write(operations, ordered=False, session=session)
+
+
+async def _aggregate_counts(filters: dict, session=None, collection=None) -> Counter:
+    """Calcula os contadores dos agendamentos que casam com `filters` no servidor.
+
+    `collection` permite contar numa coleção de arquivo (app.archive) em vez de `schedule`.
+    """
+    if collection is None:
+        collection = get_engine().get_collection(Schedule)
+
+    pipeline = [
+        {"$match": filters},
+        {
+            "$facet": {
+                "client": [{"$group": {"_id": "$client", "count": {"$sum": 1}}}],
+                "month": [
+                    {
+                        "$group": {
+                            "_id": {"$dateToString": {"format": "%Y-%m", "date": "$date_schedule"}},
+                            "count": {"$sum": 1}
+                        }
+                    }
+                ],
+                "service": [
+                    {"$unwind": "$services"},
+                    {"$group": {"_id": "$services", "count": {"$sum": 1}}}
+                ],
+            }
+        }
+    ]
+
+    results = await collection.aggregate(pipeline, session=session).to_list(length=None)
+
+    counts = Counter()
+    for kind, groups in results[0].items():
+        for group in groups:
+            counts[(kind, group["_id"])] += group["count"]
+    counts[("total", "all")] = sum(group["count"] for group in results[0]["client"])
+
+    return counts
+
+
+async def remove_matching(filters: dict, session=None, collection=None) -> None:
+    """Desconta os agendamentos que serão removidos por `filters`."""
+    await apply(await _aggregate_counts(filters, session, collection), sign=-1, session=session)
+
+
+async def read(kind: str) -> list[dict]:
+    """Lista os contadores positivos de um recorte da loja corrente, do maior para o menor."""
+    cursor = _collection().find(
+        {**store_filter(), "kind": kind, "count": {"$gt": 0}}, {"_id": 0, "key": 1, "count": 1}
+    )
+    return await cursor.sort("count", -1).to_list(length=None)
+
+
+async def total() -> int:
+    doc = await _collection().find_one({"_id": f"{get_store()}:total:all"})
+    return doc["count"] if doc else 0
+
+
+async def rebuild() -> None:
+    """Recalcula os contadores de todas as lojas do banco a partir da coleção `schedule` e dos arquivos."""
+    from app.archive import archive_state
+
+    collections = [get_engine().get_collection(Schedule), *await archive_state.collections(None, None)]
+    stores = set()
+    for collection in collections:
+        stores.update(await collection.distinct("store_id"))
+
+    await _collection().delete_many({})
+    for store in sorted(stores):
+        token = current_store.set(store)
+        try:
+            counts = Counter()
+            for collection in collections:
+                counts.update(await _aggregate_counts(store_filter(), collection=collection))
+            await apply(counts)
+        finally:
+            current_store.reset(token)
+
+
+if __name__ == "__main__":
+    if "--rebuild" not in sys.argv[1:]:
+        sys.exit("Uso: python -m app.stats --rebuild")
+
+    asyncio.run(rebuild())
+    print("Contadores de agendamentos recalculados")
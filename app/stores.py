@@ -0,0 +1,146 @@
+"""Lojas (filiais) que compartilham a aplicação, identificadas por `store_id`.
+
+A loja de cada requisição vem do prefixo `/stores/{store_id}` ou do cabeçalho
+`X-Store-Id`; sem nenhum dos dois vale `DEFAULT_STORE_ID`. Ela fica numa
+`ContextVar` lida pelo `StoreEngine`, que filtra por loja toda busca do ODMantic
+e grava a loja corrente nos documentos salvos; consultas diretas no Motor usam
+`store_filter()`.
+
+Com `STORE_DATABASES=1` cada loja de `STORE_IDS`, obrigatório nesse modo, usa
+o próprio banco (`<MONGO_DB>_<store_id>`, a padrão continua em `MONGO_DB`), no
+mesmo cliente. Fora do servidor, como nos comandos de manutenção, a loja vem de
+`STORE_ID`.
+"""
+import contextvars
+import json
+import os
+import re
+from typing import Optional
+
+from odmantic import AIOEngine, Model
+
+DEFAULT_STORE = os.getenv("DEFAULT_STORE_ID", "main")
+STORE_HEADER = "x-store-id"
+STORE_DATABASES = os.getenv("STORE_DATABASES", "").lower() in ("1", "true", "yes")
+# Lojas aceitas, separadas por vírgula; vazio aceita qualquer id válido
+KNOWN_STORES = {store.strip() for store in os.getenv("STORE_IDS", "").split(",") if store.strip()}
+
+if STORE_DATABASES and not KNOWN_STORES:
+    # Sem a lista, qualquer `X-Store-Id` criaria um banco novo, sem índices nem restrições de unicidade
+    raise RuntimeError("STORE_DATABASES=1 exige STORE_IDS com as lojas aceitas")
+
+# O id entra no nome do banco, então só letras minúsculas, dígitos, `-` e `_`
+STORE_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,31}$")
+PATH_PREFIX = re.compile(r"^/stores/([^/]+)(?=/|$)")
+
+current_store: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_store", default=os.getenv("STORE_ID", DEFAULT_STORE)
+)
+
+
+def get_store() -> str:
+    return current_store.get()
+
+
+def store_filter() -> dict:
+    """Filtro do Motor pela loja corrente."""
+    return {"store_id": current_store.get()}
+
+
+def database_name(base: str, store: str) -> str:
+    if not STORE_DATABASES or store == DEFAULT_STORE:
+        return base
+    return f"{base}_{store}"
+
+
+def _is_partitioned(model: type[Model]) -> bool:
+    return "store_id" in model.__odm_fields__
+
+
+class StoreEngine(AIOEngine):
+    """`AIOEngine` que restringe as buscas à loja corrente e a grava nos documentos salvos."""
+
+    def _prepare_find_pipeline(self, model, *queries, **kwargs):
+        if _is_partitioned(model):
+            queries = (*queries, store_filter())
+        return super()._prepare_find_pipeline(model, *queries, **kwargs)
+
+    async def count(self, model, *queries, session=None) -> int:
+        if _is_partitioned(model):
+            queries = (*queries, store_filter())
+        return await super().count(model, *queries, session=session)
+
+    async def remove(self, model, *queries, just_one: bool = False, session=None) -> int:
+        if _is_partitioned(model):
+            queries = (*queries, store_filter())
+        return await super().remove(model, *queries, just_one=just_one, session=session)
+
+    @staticmethod
+    def _assign_store(instance: Model) -> None:
+        store = current_store.get()
+        if _is_partitioned(type(instance)) and instance.store_id != store:
+            instance.store_id = store
+
+    async def save(self, instance, *, session=None):
+        self._assign_store(instance)
+        return await super().save(instance, session=session)
+
+    async def save_all(self, instances, *, session=None):
+        for instance in instances:
+            self._assign_store(instance)
+        return await super().save_all(instances, session=session)
+
+
+def _resolve(scope) -> tuple[Optional[str], Optional[str]]:
+    """Loja da requisição e o prefixo de caminho que a indicou, se houver."""
+    match = PATH_PREFIX.match(scope["path"])
+    if match:
+        return match.group(1), match.group(0)
+
+    for name, value in scope.get("headers", []):
+        if name == STORE_HEADER.encode():
+            return value.decode("latin-1").strip(), None
+
+    return None, None
+
+
+class StoreMiddleware:
+    """Middleware ASGI que define a loja da requisição e remove o prefixo `/stores/{store_id}`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def _reject(self, scope, send, status: int, detail: str) -> None:
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1008, "reason": detail})
+            return
+
+        body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        store, prefix = _resolve(scope)
+        if store is None:
+            store = DEFAULT_STORE
+        elif not STORE_ID_PATTERN.match(store):
+            return await self._reject(scope, send, 400, f"Loja inválida: {store}")
+        elif KNOWN_STORES and store not in KNOWN_STORES:
+            return await self._reject(scope, send, 404, f"Loja {store} não encontrada")
+
+        if prefix:
+            # Como num `Mount`: o prefixo passa para o `root_path` e as rotas casam sem ele
+            scope = {**scope, "root_path": scope.get("root_path", "") + prefix}
+
+        token = current_store.set(store)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_store.reset(token)
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import time
+
+from pymongo import ReturnDocument
+
+from app.database import get_shared_database
+from app.loops import PerLoop
+
+VERSIONS_COLLECTION = "collection_versions"
+
+
+class CollectionVersions:
+    """Contadores de versão por coleção, guardados em `collection_versions`.
+
+    Toda escrita chama `bump` com as coleções alteradas. As leituras usam uma
+    cópia local, renovada do banco a cada `ttl` segundos; as escritas deste
+    processo a atualizam na hora, as de outros workers aparecem em até `ttl`.
+    Os contadores são comuns a todas as lojas e ficam no banco principal.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._versions: dict[str, int] = {}
+        self._checked_at: float | None = None
+        self._lock = PerLoop(asyncio.Lock)
+
+    def _collection(self):
+        return get_shared_database()[VERSIONS_COLLECTION]
+
+    async def fetch(self, name: str) -> int:
+        """Lê a versão direto do banco, sem a cópia local."""
+        doc = await self._collection().find_one({"_id": name})
+        return doc["version"] if doc else 0
+
+    async def _reload(self) -> None:
+        versions = {doc["_id"]: doc["version"] async for doc in self._collection().find({})}
+        for name, version in versions.items():
+            self._versions[name] = max(self._versions.get(name, 0), version)
+        self._checked_at = time.monotonic()
+
+    def _expired(self) -> bool:
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.ttl
+
+    async def get(self, *names: str) -> tuple[int, ...]:
+        if self._expired():
+            async with self._lock.get():
+                if self._expired():
+                    await self._reload()
+
+        return tuple(self._versions.get(name, 0) for name in names)
+
+    async def bump(self, *names: str) -> None:
+        """Incrementa a versão das coleções informadas."""
+        docs = await asyncio.gather(*(
+            self._collection().find_one_and_update(
+                {"_id": name}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+            )
+            for name in names
+        ))
+
+        for doc in docs:
+            self._versions[doc["_id"]] = max(self._versions.get(doc["_id"], 0), doc["version"])
+
+
+collection_versions = CollectionVersions(ttl=float(os.getenv("COLLECTION_VERSIONS_TTL", "1")))
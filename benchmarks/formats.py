@@ -0,0 +1,199 @@
+"""Compara JSON, MessagePack e BSON nas listagens e exportações.
+
+    python -m benchmarks.formats --backend mongod --url mongodb://localhost:27017 --output formats.json
+    python -m benchmarks.formats --backend memory --clients 200
+
+Para cada rota e formato (escolhido pelo `Accept`) mede o tamanho da resposta,
+com e sem gzip, e a latência das requisições ao app ASGI no mesmo processo.
+Depois codifica e decodifica os mesmos documentos crus do Motor fora do app,
+para separar o custo de serialização do custo da consulta; `json (modelos)` é o
+caminho padrão das listagens, com os modelos do ODMantic e o pydantic.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.run import percentile
+
+FORMATS = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "bson": "application/bson",
+}
+
+# Rotas medidas; as listagens pedem a página máxima
+ROUTES = [
+    "/clients/?limit=100",
+    "/clients/?limit=100&fields=",
+    "/schedules/Get/All?limit=100",
+    "/schedules/Get/All?limit=100&fields=",
+    "/clients/export",
+    "/schedules/export",
+]
+
+
+async def measure_route(client, path: str, media_type: str, requests: int) -> dict:
+    latencies = []
+    body = b""
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(path, headers={"Accept": media_type})
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        body = response.content
+
+    latencies.sort()
+    return {
+        "content_type": response.headers["content-type"],
+        "bytes": len(body),
+        "gzip_bytes": len(gzip.compress(body)),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+        },
+    }
+
+
+def _timed(function, argument, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(argument)
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return round(best, 3), result
+
+
+def measure_codecs(docs: list[dict], model, repeat: int) -> dict:
+    """Melhor tempo de `repeat` rodadas para codificar e decodificar `docs` em cada formato."""
+    import bson
+    import orjson
+    from fastapi.encoders import jsonable_encoder
+
+    from app import formats
+    from app.fastread import dumps
+
+    codecs = {
+        "json": (dumps, orjson.loads),
+        "bson": (formats.bson_dumps, bson.decode_all),
+    }
+    if formats.msgpack is not None:
+        def unpack(payload):
+            return formats.msgpack.unpackb(payload, timestamp=3, ext_hook=lambda code, data: bson.ObjectId(data))
+
+        codecs["msgpack"] = (formats.pack, unpack)
+
+    def through_models(raw):
+        # Como a listagem padrão: modelos do ODMantic, `response_model` e JSON do FastAPI
+        return json.dumps(jsonable_encoder([model.model_validate_doc(doc) for doc in raw])).encode()
+
+    report = {}
+    encode_ms, payload = _timed(through_models, docs, repeat)
+    report["json (modelos)"] = {"bytes": len(payload), "encode_ms": encode_ms, "decode_ms": _timed(json.loads, payload, repeat)[0]}
+    for name, (encode, decode) in codecs.items():
+        encode_ms, payload = _timed(encode, docs, repeat)
+        report[name] = {"bytes": len(payload), "encode_ms": encode_ms, "decode_ms": _timed(decode, payload, repeat)[0]}
+    return report
+
+
+async def main(args) -> dict:
+    import httpx
+
+    # O app lê a conexão do ambiente na importação
+    os.environ["MONGO_DB"] = args.database
+    if args.url:
+        os.environ["url"] = args.url
+
+    if args.backend == "memory":
+        from benchmarks import memory
+
+        memory.install()
+
+    from app import database, formats, stats
+    from app.main import app
+    from app.models.Client import Client
+    from app.models.indexes import ensure_indexes
+    from benchmarks.seed import seed
+
+    if args.backend == "memory":
+        database._transactions_supported = False
+
+    engine = await database.connect()
+    await database.get_client().drop_database(args.database)
+    await seed(database.get_database(), args.clients, args.pets_per_client, args.schedules_per_pet, args.services)
+    await ensure_indexes(engine)
+    await stats.rebuild()
+
+    routes = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for path in ROUTES:
+            for name, media_type in FORMATS.items():
+                if media_type not in formats.available():
+                    continue
+                result = await measure_route(client, path, media_type, args.requests)
+                routes.append({"route": path, "format": name, **result})
+                print(f"{path:<40} {name:<8} {result['bytes']:>10} B  gzip {result['gzip_bytes']:>9} B  p50 {result['latency_ms']['p50']:>8} ms", file=sys.stderr)
+
+    clients = await engine.get_collection(Client).find({}).to_list(length=args.codec_docs)
+    codecs = measure_codecs(clients, Client, args.repeat)
+    for name, result in codecs.items():
+        print(f"codec {name:<16} {result['bytes']:>10} B  encode {result['encode_ms']:>8} ms  decode {result['decode_ms']:>8} ms", file=sys.stderr)
+
+    if args.backend == "memory" or args.drop:
+        await database.get_client().drop_database(args.database)
+    database.close()
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {
+            "backend": args.backend,
+            "clients": args.clients,
+            "pets_per_client": args.pets_per_client,
+            "schedules_per_pet": args.schedules_per_pet,
+            "requests_per_route": args.requests,
+            "codec_docs": len(clients),
+        },
+        "routes": routes,
+        "codecs": codecs,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compara JSON, MessagePack e BSON nas listagens e exportações")
+    parser.add_argument("--backend", choices=["mongod", "memory"], default="mongod")
+    parser.add_argument("--url", help="URI do MongoDB; padrão é a variável `url` do .env")
+    parser.add_argument("--database", default="petshop_benchmark", help="Banco usado no benchmark; é apagado no início")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--pets-per-client", type=int, default=2)
+    parser.add_argument("--schedules-per-pet", type=int, default=5)
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=20, help="Requisições por rota e formato")
+    parser.add_argument("--codec-docs", type=int, default=10000, help="Clientes codificados fora do app")
+    parser.add_argument("--repeat", type=int, default=5, help="Rodadas de cada codificação; vale a melhor")
+    parser.add_argument("--drop", action="store_true", help="Apaga o banco do benchmark ao final")
+    parser.add_argument("--output", help="Arquivo JSON de saída; padrão é a saída padrão")
+    args = parser.parse_args(argv)
+
+    if args.database == "petshop_db":
+        parser.error("Use um banco dedicado ao benchmark; ele é apagado no início da execução")
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,167 @@
+"""Backend em memória para rodar o benchmark sem um `mongod`.
+
+Usa o `mongomock-motor` (`pip install mongomock-motor`) com pequenos ajustes de
+compatibilidade: sessões ignoradas, `$lookup` com `let`/`pipeline` no formato
+gerado pelo ODMantic, `bulk_write` executado operação a operação e os operadores
+de texto por code point (`$indexOfCP`, `$substrCP`, `$strLenCP`) da busca de pets. Serve para
+validar o fluxo do benchmark; os números só são comparáveis contra um `mongod`.
+
+Sem o monitoramento do pymongo, os comandos são contados nos métodos da
+coleção, pelo nome do comando que o driver enviaria (sem os `getMore`).
+"""
+import inspect
+from functools import wraps
+
+# Comando do MongoDB enviado por cada método da coleção do Motor
+COMMANDS = {
+    "find": "find",
+    "find_one": "find",
+    "aggregate": "aggregate",
+    "count_documents": "aggregate",
+    "estimated_document_count": "count",
+    "distinct": "distinct",
+    "insert_one": "insert",
+    "insert_many": "insert",
+    "update_one": "update",
+    "update_many": "update",
+    "replace_one": "update",
+    "delete_one": "delete",
+    "delete_many": "delete",
+    "find_one_and_update": "findAndModify",
+    "find_one_and_replace": "findAndModify",
+    "find_one_and_delete": "findAndModify",
+    "create_index": "createIndexes",
+    "create_indexes": "createIndexes",
+    "drop_index": "dropIndexes",
+    "list_indexes": "listIndexes",
+}
+
+
+def _bulk_command(operation) -> str:
+    from pymongo import DeleteMany, DeleteOne, InsertOne
+
+    if isinstance(operation, InsertOne):
+        return "insert"
+    if isinstance(operation, (DeleteOne, DeleteMany)):
+        return "delete"
+    return "update"
+
+
+def _count_commands(collection_class, counter) -> None:
+    """Soma em `counter.counts` um comando por chamada, como o `CommandCounter` de benchmarks.run."""
+
+    def counted(name: str, command: str):
+        method = getattr(collection_class, name)
+        if inspect.iscoroutinefunction(method):
+            @wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                counter.counts[command] += 1
+                return await method(self, *args, **kwargs)
+        else:
+            @wraps(method)
+            def wrapper(self, *args, **kwargs):
+                counter.counts[command] += 1
+                return method(self, *args, **kwargs)
+        return wrapper
+
+    for name, command in COMMANDS.items():
+        setattr(collection_class, name, counted(name, command))
+
+    bulk_write = collection_class.bulk_write
+
+    @wraps(bulk_write)
+    async def counted_bulk_write(self, requests, *args, **kwargs):
+        # O driver envia um comando por tipo de operação do lote
+        requests = list(requests)
+        for command in {_bulk_command(operation) for operation in requests}:
+            counter.counts[command] += 1
+        return await bulk_write(self, requests, *args, **kwargs)
+
+    collection_class.bulk_write = counted_bulk_write
+
+
+def install(counter=None) -> None:
+    """Substitui o `AsyncIOMotorClient` antes de `app.database` ser importado.
+
+    Com `counter`, conta em `counter.counts` os comandos enviados às coleções.
+    """
+    try:
+        import mongomock
+        import mongomock.aggregate
+        import mongomock.collection
+        import mongomock_motor
+    except ImportError:
+        raise SystemExit("O backend em memória precisa do pacote mongomock-motor: pip install mongomock-motor")
+
+    import motor.motor_asyncio
+    from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+
+    mongomock.ignore_feature("session")
+
+    class _Session:
+        in_transaction = False
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def end_session(self):
+            pass
+
+    async def start_session(self, *args, **kwargs):
+        return _Session()
+
+    lookup = mongomock.aggregate._handle_lookup_stage
+
+    def lookup_with_pipeline(in_collection, database, options):
+        # Formato do ODMantic: let {foreign_id: "$campo"} + $match por _id + estágios aninhados
+        if "let" not in options:
+            return lookup(in_collection, database, options)
+
+        local_field = next(iter(options["let"].values()))[1:]
+        nested = options["pipeline"][1:]
+        docs = lookup(in_collection, database, {
+            "from": options["from"], "localField": local_field, "foreignField": "_id", "as": options["as"],
+        })
+        if nested:
+            for doc in docs:
+                doc[options["as"]] = list(mongomock.aggregate.process_pipeline(doc[options["as"]], database, nested, None))
+        return docs
+
+    def bulk_write(self, requests, ordered=True, bypass_document_validation=False, session=None, **kwargs):
+        for operation in requests:
+            if isinstance(operation, UpdateOne):
+                self.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+            elif isinstance(operation, UpdateMany):
+                self.update_many(operation._filter, operation._doc, upsert=operation._upsert)
+            elif isinstance(operation, ReplaceOne):
+                self.replace_one(operation._filter, operation._doc, upsert=operation._upsert)
+            elif isinstance(operation, InsertOne):
+                self.insert_one(operation._doc)
+            elif isinstance(operation, DeleteOne):
+                self.delete_one(operation._filter)
+            elif isinstance(operation, DeleteMany):
+                self.delete_many(operation._filter)
+
+    string_operator = mongomock.aggregate._Parser._handle_string_operator
+
+    def code_point_operators(self, operator, values):
+        if operator == "$indexOfCP":
+            string, substring = self.parse(values[0]), self.parse(values[1])
+            return None if string is None else string.find(substring)
+        if operator == "$substrCP":
+            string, start, length = self.parse_many(values)
+            return (string or "")[start:start + length] if start >= 0 else ""
+        if operator == "$strLenCP":
+            return len(self.parse(values))
+        return string_operator(self, operator, values)
+
+    mongomock_motor.AsyncMongoMockClient.start_session = start_session
+    mongomock.aggregate._PIPELINE_HANDLERS["$lookup"] = lookup_with_pipeline
+    mongomock.collection.Collection.bulk_write = bulk_write
+    mongomock.aggregate._Parser._handle_string_operator = code_point_operators
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    if counter is not None:
+        _count_commands(mongomock_motor.AsyncMongoMockCollection, counter)
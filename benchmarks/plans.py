@@ -0,0 +1,357 @@
+"""Planos de execução das consultas de cada rota, comparados com um snapshot.
+
+    python -m benchmarks.plans --url mongodb://localhost:27017           # confere com o snapshot
+    python -m benchmarks.plans --url mongodb://localhost:27017 --update  # regrava o snapshot
+
+Popula um banco dedicado num `mongod`, faz uma requisição de cada cenário de
+benchmarks.scenarios e registra, pelo monitoramento do pymongo, as consultas e
+agregações enviadas pelos handlers (find, aggregate, count, distinct e os
+filtros de update, delete e findAndModify). Cada formato de consulta distinto
+passa por `explain` com `executionStats`, logo depois da requisição.
+
+O comando falha (código 1) quando algum plano tem COLLSCAN, inclusive no
+`$lookup`, SORT em memória sobre os documentos da coleção, ou examina mais de
+`--max-ratio` documentos por documento retornado, e quando o resumo dos planos
+difere do snapshot (`benchmarks/snapshots/plans.json`), inclusive quando uma
+rota executada não tem entrada nele. O snapshot é gerado com `--update` e
+incluído no commit, assim mudanças de plano aparecem na revisão.
+"""
+import argparse
+import asyncio
+import difflib
+import json
+import os
+import sys
+
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
+
+SNAPSHOT = os.path.join(os.path.dirname(__file__), "snapshots", "plans.json")
+
+# Comandos com plano de consulta; os demais (insert, getMore, transações) são ignorados
+EXPLAINED_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Campos do driver e da sessão que o `explain` não aceita
+DRIVER_FIELDS = {
+    "lsid", "$clusterTime", "$db", "$readPreference", "txnNumber", "autocommit", "startTransaction",
+    "readConcern", "writeConcern", "apiVersion", "apiStrict", "apiDeprecationErrors",
+}
+# Coleções de controle, com poucos documentos e lidas inteiras de propósito
+SMALL_COLLECTIONS = {"collection_versions", "archive_state", "schema_migrations"}
+# Valores de texto que nomeiam coleções ou campos no pipeline e ficam no formato da consulta
+NAME_KEYS = {"from", "as", "coll", "localField", "foreignField", "includeArrayIndex"}
+# Estágios que consomem os documentos da coleção; um SORT acima deles ordena só o resultado agregado
+AGGREGATING_STAGES = {"GROUP", "$group", "$bucket", "$bucketAuto", "$count", "$sortByCount", "$facet"}
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """Guarda os comandos com plano de consulta enviados enquanto `recording` está ligado."""
+
+    def __init__(self):
+        self.recording = False
+        self.commands: list[tuple[str, dict]] = []
+
+    def started(self, event):
+        if self.recording and event.command_name in EXPLAINED_COMMANDS:
+            self.commands.append((event.database_name, dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def shape(value, key: str | None = None):
+    """Formato da consulta: valores trocados pelo tipo, mantendo números, campos e nomes de coleção."""
+    if isinstance(value, dict):
+        return {name: shape(item, name) for name, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if any(isinstance(item, (dict, list, tuple)) or str(item).startswith("$") for item in value):
+            return [shape(item) for item in value]
+        # Listas só de valores, como no `$in`, variam de tamanho entre requisições
+        return sorted({shape(item) for item in value}, key=str)
+    if isinstance(value, bool) or isinstance(value, int) or value is None:
+        return value
+    if isinstance(value, str) and (value.startswith("$") or key in NAME_KEYS):
+        return value
+    return f"?{type(value).__name__}"
+
+
+def statements(command: dict) -> list[dict]:
+    """Comandos prontos para o `explain`, um por instrução nos updates e deletes."""
+    command = {name: value for name, value in command.items() if name not in DRIVER_FIELDS}
+    name = next(iter(command))
+    if name in ("update", "delete"):
+        field = "updates" if name == "update" else "deletes"
+        return [{**command, field: [statement]} for statement in command.get(field, [])]
+    if name == "aggregate" and any("$changeStream" in stage for stage in command.get("pipeline", [])):
+        return []
+    return [command]
+
+
+def query_shape(command: dict) -> dict:
+    """Partes do comando que definem o plano, já no formato da consulta."""
+    name = next(iter(command))
+    fields = {
+        "find": ("filter", "sort", "projection", "skip", "limit", "hint"),
+        "aggregate": ("pipeline", "hint"),
+        "count": ("query", "hint"),
+        "distinct": ("key", "query"),
+        "findAndModify": ("query", "sort"),
+    }
+    if name in ("update", "delete"):
+        statement = command["updates" if name == "update" else "deletes"][0]
+        return shape({key: statement[key] for key in ("q", "multi", "limit", "hint") if key in statement})
+    return shape({key: command[key] for key in fields[name] if key in command})
+
+
+def _children(node: dict) -> list[dict]:
+    children = [node[key] for key in ("inputStage", "outerStage", "innerStage") if key in node]
+    return children + node.get("inputStages", [])
+
+
+def _contains(node: dict, stages: set[str]) -> bool:
+    return node.get("stage") in stages or any(_contains(child, stages) for child in _children(node))
+
+
+def _describe(node: dict) -> str:
+    """Árvore do plano numa linha, da raiz para as folhas: `LIMIT > FETCH > IXSCAN nome`."""
+    label = node.get("stage", "?")
+    if "indexName" in node:
+        label += f" {node['indexName']}"
+    if label.startswith("EQ_LOOKUP"):
+        label += f" {node.get('foreignCollection')} {node.get('strategy')}"
+
+    children = _children(node)
+    if len(children) > 1:
+        return f"{label}({', '.join(_describe(child) for child in children)})"
+    if children:
+        return f"{label} > {_describe(children[0])}"
+    return label
+
+
+def _walk_issues(node: dict, issues: list[str]) -> None:
+    stage = node.get("stage")
+    if stage == "COLLSCAN":
+        issues.append("COLLSCAN")
+    elif stage == "SORT" and not _contains(node, AGGREGATING_STAGES):
+        issues.append("SORT em memória")
+    elif stage == "EQ_LOOKUP" and node.get("strategy") != "IndexedLoopJoin":
+        issues.append(f"COLLSCAN no $lookup de {node.get('foreignCollection')} ({node.get('strategy')})")
+    for child in _children(node):
+        _walk_issues(child, issues)
+
+
+def _returned(stats: dict) -> int:
+    """Documentos que saem da camada de consulta; em count, update e delete, os que chegam ao estágio."""
+    node = stats.get("executionStages", {})
+    while node.get("stage") in ("COUNT", "UPDATE", "DELETE", "SHARDING_FILTER") and "inputStage" in node:
+        node = node["inputStage"]
+    return node.get("nReturned", stats.get("nReturned", 0))
+
+
+def summarize(explain: dict, max_ratio: float) -> dict:
+    """Resumo estável do `explain`: plano, contagens e problemas encontrados."""
+    stages = explain.get("stages")
+    cursor = stages[0]["$cursor"] if stages and "$cursor" in stages[0] else explain
+    winning = cursor["queryPlanner"]["winningPlan"]
+    # No motor de execução SBE o plano clássico fica em `queryPlan`
+    winning = winning.get("queryPlan", winning)
+    stats = cursor.get("executionStats", {})
+
+    plan = [_describe(winning)]
+    issues: list[str] = []
+    _walk_issues(winning, issues)
+
+    aggregated = _contains(winning, AGGREGATING_STAGES)
+    for stage in (stages or [])[1:]:
+        name = next(key for key in stage if key.startswith("$"))
+        if name == "$lookup":
+            lookup = stage["$lookup"]
+            plan.append(f"$lookup {lookup.get('from')} ({', '.join(stage.get('indexesUsed', [])) or 'sem índice'})")
+            if stage.get("collectionScans"):
+                issues.append(f"COLLSCAN no $lookup de {lookup.get('from')}")
+        else:
+            plan.append(name)
+            if name == "$sort" and not aggregated:
+                issues.append("SORT em memória")
+        aggregated = aggregated or name in AGGREGATING_STAGES
+
+    examined = stats.get("totalDocsExamined", 0)
+    returned = _returned(stats)
+    ratio = round(examined / max(returned, 1), 2)
+    # Com o `$group` executado junto da consulta (SBE), `nReturned` já é o total de grupos
+    if cursor is explain and _contains(winning, {"GROUP"}):
+        ratio = None
+    if ratio is not None and ratio > max_ratio:
+        issues.append(f"{examined} documentos examinados para {returned} retornados")
+
+    return {
+        "plan": " | ".join(plan),
+        "keys_examined": stats.get("totalKeysExamined", 0),
+        "docs_examined": examined,
+        "returned": returned,
+        "ratio": ratio,
+        "issues": issues,
+    }
+
+
+async def explain_commands(client, commands: list[tuple[str, dict]], seen: set, max_ratio: float) -> list[dict]:
+    """Roda o `explain` de cada formato de consulta ainda não visto na rota."""
+    summaries = []
+    for database_name, recorded in commands:
+        for command in statements(recorded):
+            name = next(iter(command))
+            collection = command[name]
+            key = json.dumps([name, collection, query_shape(command)], sort_keys=True)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            entry = {"command": name, "collection": collection, "shape": query_shape(command)}
+            try:
+                explain = await client[database_name].command({"explain": command, "verbosity": "executionStats"})
+            except OperationFailure as error:
+                entry.update({"plan": None, "issues": [f"explain falhou: {error.details.get('errmsg', error)}"]})
+            else:
+                entry.update(summarize(explain, max_ratio))
+                if collection in SMALL_COLLECTIONS:
+                    entry["issues"] = []
+            summaries.append(entry)
+    return summaries
+
+
+async def main(args) -> dict:
+    import httpx
+
+    # O app lê a conexão do ambiente na importação
+    os.environ["MONGO_DB"] = args.database
+    if args.url:
+        os.environ["url"] = args.url
+
+    recorder = QueryRecorder()
+    monitoring.register(recorder)
+
+    from app import database, stats
+    from app.main import app
+    from app.models.indexes import ensure_indexes
+    from app.versions import collection_versions
+    from benchmarks.scenarios import build_scenarios
+    from benchmarks.seed import seed
+
+    # Versões sempre lidas do banco, para as consultas de cada rota não dependerem do tempo entre elas
+    collection_versions.ttl = 0
+
+    engine = await database.connect()
+    await database.get_client().drop_database(args.database)
+    data = await seed(database.get_database(), args.clients, args.pets_per_client, args.schedules_per_pet, args.services)
+    await ensure_indexes(engine)
+    await stats.rebuild()
+
+    transport = httpx.ASGITransport(app=app)
+    scenarios = build_scenarios(data, run="plans")
+    if args.routes:
+        scenarios = [scenario for scenario in scenarios if any(route in scenario.name for route in args.routes)]
+    scenarios.sort(key=lambda scenario: scenario.destructive)
+
+    routes = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://plans", timeout=None) as client:
+        for scenario in scenarios:
+            request = scenario.build(0)
+            if not request:
+                continue
+
+            recorder.commands = []
+            recorder.recording = True
+            response = await client.request(**request)
+            recorder.recording = False
+
+            seen = set()
+            summaries = await explain_commands(database.get_client(), recorder.commands, seen, args.max_ratio)
+            routes[scenario.name] = {"status": response.status_code, "queries": summaries}
+
+    if args.drop:
+        await database.get_client().drop_database(args.database)
+    database.close()
+
+    return {
+        "config": {
+            "clients": args.clients,
+            "pets_per_client": args.pets_per_client,
+            "schedules_per_pet": args.schedules_per_pet,
+            "services": args.services,
+            "max_ratio": args.max_ratio,
+        },
+        "routes": routes,
+    }
+
+
+def missing_routes(report: dict, snapshot: dict) -> list[str]:
+    """Rotas executadas sem entrada no snapshot, e entradas do snapshot sem rota executada."""
+    expected = snapshot.get("routes", {})
+    issues = [f"{route}: sem entrada no snapshot" for route in report["routes"] if route not in expected]
+    issues += [f"{route}: está no snapshot mas não foi executada" for route in expected if route not in report["routes"]]
+    return issues
+
+
+def dumps(report: dict) -> str:
+    return json.dumps(report, indent=2, ensure_ascii=False) + "\n"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Confere os planos de execução das consultas de cada rota")
+    parser.add_argument("--url", help="URI do MongoDB; padrão é a variável `url` do .env")
+    parser.add_argument("--database", default="petshop_plans", help="Banco usado na verificação; é apagado no início")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--pets-per-client", type=int, default=2)
+    parser.add_argument("--schedules-per-pet", type=int, default=5)
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--max-ratio", type=float, default=10.0, help="Máximo de documentos examinados por retornado")
+    parser.add_argument("--routes", nargs="*", help="Filtra as rotas pelo trecho do nome, ex.: /clients")
+    parser.add_argument("--snapshot", default=SNAPSHOT, help="Arquivo do snapshot dos planos")
+    parser.add_argument("--update", action="store_true", help="Regrava o snapshot em vez de comparar")
+    parser.add_argument("--drop", action="store_true", help="Apaga o banco da verificação ao final")
+    args = parser.parse_args(argv)
+
+    if args.database == "petshop_db":
+        parser.error("Use um banco dedicado à verificação; ele é apagado no início da execução")
+    if args.routes and args.update:
+        parser.error("--update regrava o snapshot inteiro; não combine com --routes")
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    output = dumps(report)
+
+    failed = False
+    for route, result in report["routes"].items():
+        for query in result["queries"]:
+            for issue in query["issues"]:
+                failed = True
+                print(f"{route:<50} {query['command']} {query['collection']}: {issue}", file=sys.stderr)
+
+    if args.update:
+        os.makedirs(os.path.dirname(args.snapshot), exist_ok=True)
+        with open(args.snapshot, "w", encoding="utf-8") as file:
+            file.write(output)
+    elif args.routes:
+        print(output)
+    elif not os.path.exists(args.snapshot):
+        print(f"Snapshot {args.snapshot} não encontrado; gere com --update", file=sys.stderr)
+        failed = True
+    else:
+        with open(args.snapshot, encoding="utf-8") as file:
+            expected = file.read()
+        for issue in missing_routes(report, json.loads(expected)):
+            failed = True
+            print(f"{issue}; regrave com --update", file=sys.stderr)
+        if expected != output:
+            failed = True
+            sys.stderr.writelines(difflib.unified_diff(
+                expected.splitlines(keepends=True), output.splitlines(keepends=True), "snapshot", "atual",
+            ))
+
+    sys.exit(1 if failed else 0)
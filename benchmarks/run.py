@@ -0,0 +1,207 @@
+"""Benchmark de carga de todas as rotas, executando o app ASGI no mesmo processo.
+
+    python -m benchmarks.run --backend mongod --url mongodb://localhost:27017 --output bench.json
+    python -m benchmarks.run --backend memory --clients 200 --requests 100
+
+Cada rota roda isolada, com `--concurrency` clientes httpx simultâneos, e o
+relatório JSON traz vazão, latências p50/p95/p99 e comandos do MongoDB por rota.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from pymongo import monitoring
+
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "endSessions", "ping"}
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Conta os comandos enviados ao MongoDB, por nome."""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def started(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            self.counts[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Percentil por posição mais próxima sobre uma lista ordenada."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+async def run_scenario(transport, scenario, requests: int, concurrency: int, counter: CommandCounter) -> dict:
+    import httpx
+
+    built = [request for request in (scenario.build(i) for i in range(requests)) if request]
+    queue = asyncio.Queue()
+    for request in built:
+        queue.put_nowait(request)
+
+    latencies = []
+    status_codes = Counter()
+    before = Counter(counter.counts)
+
+    async def worker():
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            while True:
+                try:
+                    request = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                response = await client.request(**request)
+                latencies.append((time.perf_counter() - started) * 1000)
+                status_codes[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(built)) or 1)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    report = {
+        "route": scenario.name,
+        "requests": len(built),
+        "errors": sum(count for status, count in status_codes.items() if status >= 500),
+        "status_codes": {str(status): count for status, count in sorted(status_codes.items())},
+        "throughput_rps": round(len(built) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+    }
+
+    delta = counter.counts - before
+    total = sum(delta.values())
+    report["mongo_ops"] = {
+        "total": total,
+        "per_request": round(total / len(built), 2) if built else 0.0,
+        "by_command": dict(sorted(delta.items())),
+    }
+
+    return report
+
+
+async def main(args) -> dict:
+    import httpx
+
+    # O app lê a conexão do ambiente na importação
+    os.environ["MONGO_DB"] = args.database
+    if args.url:
+        os.environ["url"] = args.url
+
+    counter = CommandCounter()
+    if args.backend == "memory":
+        from benchmarks import memory
+
+        # O mongomock não passa pelo monitoramento do pymongo; a contagem fica nos métodos da coleção
+        memory.install(counter)
+    else:
+        monitoring.register(counter)
+
+    from app import database, stats
+    from app.main import app
+    from app.models.indexes import ensure_indexes
+    from benchmarks.scenarios import build_scenarios
+    from benchmarks.seed import seed
+
+    if args.backend == "memory":
+        database._transactions_supported = False
+
+    # O transporte ASGI não roda o lifespan do app
+    engine = await database.connect()
+    await database.get_client().drop_database(args.database)
+
+    started = time.perf_counter()
+    data = await seed(database.get_database(), args.clients, args.pets_per_client, args.schedules_per_pet, args.services)
+    await ensure_indexes(engine)
+    await stats.rebuild()
+    seed_seconds = time.perf_counter() - started
+
+    transport = httpx.ASGITransport(app=app)
+    scenarios = build_scenarios(data, run=str(int(time.time())))
+    scenarios = [scenario for scenario in scenarios if args.include_writes or scenario.method == "GET"]
+    if args.routes:
+        scenarios = [scenario for scenario in scenarios if any(route in scenario.name for route in args.routes)]
+    scenarios.sort(key=lambda scenario: scenario.destructive)
+
+    results = []
+    for scenario in scenarios:
+        result = await run_scenario(transport, scenario, args.requests, args.concurrency, counter)
+        results.append(result)
+        print(f"{result['route']:<55} {result['throughput_rps']:>10} req/s  p95 {result['latency_ms']['p95']:>9} ms", file=sys.stderr)
+
+    if args.backend == "memory" or args.drop:
+        await database.get_client().drop_database(args.database)
+    database.close()
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {
+            "backend": args.backend,
+            "database": args.database,
+            "clients": args.clients,
+            "pets_per_client": args.pets_per_client,
+            "schedules_per_pet": args.schedules_per_pet,
+            "services": args.services,
+            "requests_per_route": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "seed_seconds": round(seed_seconds, 3),
+        "routes": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das rotas da API do pet shop")
+    parser.add_argument("--backend", choices=["mongod", "memory"], default="mongod")
+    parser.add_argument("--url", help="URI do MongoDB; padrão é a variável `url` do .env")
+    parser.add_argument("--database", default="petshop_benchmark", help="Banco usado no benchmark; é apagado no início")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--pets-per-client", type=int, default=2)
+    parser.add_argument("--schedules-per-pet", type=int, default=5)
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="Requisições por rota")
+    parser.add_argument("--concurrency", type=int, default=20, help="Clientes simultâneos por rota")
+    parser.add_argument("--routes", nargs="*", help="Filtra as rotas pelo trecho do nome, ex.: /clients")
+    parser.add_argument("--read-only", dest="include_writes", action="store_false", help="Roda só as rotas GET")
+    parser.add_argument("--drop", action="store_true", help="Apaga o banco do benchmark ao final")
+    parser.add_argument("--output", help="Arquivo JSON de saída; padrão é a saída padrão")
+    args = parser.parse_args(argv)
+
+    if args.database == "petshop_db":
+        parser.error("Use um banco dedicado ao benchmark; ele é apagado no início da execução")
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,132 @@
+"""Um cenário por rota da API, montando a i-ésima requisição a partir dos dados semeados.
+
+Cenários de escrita geram valores únicos por requisição (cpf, nome, data) e os
+de remoção consomem ids semeados; os destrutivos rodam por último.
+"""
+import json
+from datetime import datetime, timedelta
+
+from benchmarks.seed import SeedData
+
+
+class Scenario:
+    def __init__(self, method: str, path: str, build, destructive: bool = False):
+        self.method = method
+        self.path = path
+        self.build = build
+        self.destructive = destructive
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.path}"
+
+
+def _pick(items: list, i: int):
+    return items[i % len(items)]
+
+
+def _pop(items: list, i: int):
+    """Consome ids distintos; `None` quando acabam, para o cenário parar."""
+    return items[i] if i < len(items) else None
+
+
+def _client_body(run: str, i: int) -> dict:
+    return {"name": f"Bench {run} {i}", "cpf": f"b{run}{i:09d}", "age": 30, "is_admin": False}
+
+
+def _client_payload(doc: dict) -> dict:
+    return {"id": str(doc["_id"]), "name": doc["name"], "cpf": doc["cpf"], "age": doc["age"], "is_admin": doc["is_admin"]}
+
+
+def _schedule_body(data: SeedData, i: int, offset_days: int) -> dict:
+    pet = _pick(data.pets, i)
+    # Dias futuros distintos por requisição, sem conflito de horário
+    date_schedule = datetime(2100, 1, 1, 9) + timedelta(days=offset_days + i)
+    return {
+        "client_id": str(data.pet_owner[pet]),
+        "pet_id": str(pet),
+        "service_ids": [str(_pick(data.services, i))],
+        "date_schedule": date_schedule.isoformat(),
+    }
+
+
+def build_scenarios(data: SeedData, run: str) -> list[Scenario]:
+    """Monta os cenários; `run` diferencia valores únicos entre execuções."""
+    month = data.months[len(data.months) // 2] if data.months else (2024, 1)
+    ndjson = "\n".join(
+        json.dumps({"type": "client", "name": f"Import {run}", "cpf": f"i{run}{k:09d}", "age": 40, "is_admin": False})
+        for k in range(50)
+    )
+
+    # Pets removidos do fim e clientes do início, para as cascatas não se sobreporem
+    pets_from_end = data.pets[::-1]
+
+    def request(method, url, **kwargs):
+        return {"method": method, "url": url, **kwargs}
+
+    return [
+        # Clientes
+        Scenario("POST", "/clients/", lambda i: request("POST", "/clients/", json=_client_body(run, i))),
+        Scenario("GET", "/clients/", lambda i: request("GET", "/clients/", params={"limit": 50})),
+        Scenario("GET", "/clients/?cursor", lambda i: request("GET", "/clients/", params={"limit": 50, "cursor": ""})),
+        Scenario("GET", "/clients/?fields", lambda i: request("GET", "/clients/", params={"limit": 50, "fields": ""})),
+        Scenario("GET", "/clients/export", lambda i: request("GET", "/clients/export")),
+        Scenario("GET", "/clients/{client_id}", lambda i: request("GET", f"/clients/{_pick(data.clients, i)}")),
+        Scenario("GET", "/clients/{client_id}/schedules", lambda i: request("GET", f"/clients/{_pick(data.clients, i)}/schedules", params={"limit": 50})),
+        Scenario("PUT", "/clients/{client_id}", lambda i: request("PUT", f"/clients/{_pick(data.clients, i)}", json={**_client_payload(_pick(data.client_docs, i)), "name": f"Cliente {i}"})),
+        Scenario("GET", "/clients/total/schedules/by/client", lambda i: request("GET", "/clients/total/schedules/by/client")),
+        # Pets
+        Scenario("POST", "/pets/{client_id}/pet/", lambda i: request(
+            "POST",
+            f"/pets/{_pick(data.clients, i)}/pet/",
+            json={
+                "client": _client_payload(_pick(data.client_docs, i)),
+                "name": f"Bench Pet {run} {i}",
+                "breed": "poodle",
+                "age": 3,
+                "size_in_centimeters": 30,
+            },
+        )),
+        Scenario("GET", "/pets/", lambda i: request("GET", "/pets/", params={"limit": 50})),
+        Scenario("GET", "/pets/?fields", lambda i: request("GET", "/pets/", params={"limit": 50, "fields": ""})),
+        Scenario("GET", "/pets/?fields=id,name", lambda i: request("GET", "/pets/", params={"limit": 50, "fields": "id,name"})),
+        Scenario("GET", "/pets/{client_id}", lambda i: request("GET", f"/pets/{_pick(data.clients, i)}")),
+        Scenario("PUT", "/pets/{pet_id}", lambda i: request("PUT", f"/pets/{_pick(data.pets, i)}", json={"age": 5})),
+        Scenario("GET", "/pets/{pet_name}/pet-name", lambda i: request("GET", f"/pets/{_pick(data.pet_names, i)[:6]}/pet-name")),
+        Scenario("GET", "/pets/{pet_name}/pet-name?prefix", lambda i: request("GET", f"/pets/{_pick(data.pet_names, i)[:6]}/pet-name", params={"mode": "prefix"})),
+        # Serviços
+        Scenario("POST", "/services/", lambda i: request("POST", "/services/", json={"type_service": f"bench-{run}-{i}", "duration_in_minutes": 30, "price": 60.0})),
+        Scenario("GET", "/services/", lambda i: request("GET", "/services/", params={"limit": 50})),
+        Scenario("GET", "/services/?fields", lambda i: request("GET", "/services/", params={"limit": 50, "fields": ""})),
+        Scenario("GET", "/services/{service_id}", lambda i: request("GET", f"/services/{_pick(data.services, i)}")),
+        Scenario("PUT", "/services/{service_id}", lambda i: request("PUT", f"/services/{_pick(data.services, i)}", json={"duration_in_minutes": 30})),
+        Scenario("GET", "/services/category-price/", lambda i: request("GET", "/services/category-price/", params={"category_price": "medium services"})),
+        Scenario("GET", "/services/total-services/", lambda i: request("GET", "/services/total-services/")),
+        Scenario("GET", "/services/cache/stats", lambda i: request("GET", "/services/cache/stats")),
+        # Agendamentos
+        Scenario("POST", "/schedules/", lambda i: request("POST", "/schedules/", json=_schedule_body(data, i, 0))),
+        Scenario("POST", "/schedules/batch", lambda i: request("POST", "/schedules/batch", json=[_schedule_body(data, 10 * i + k, 100000) for k in range(10)])),
+        Scenario("GET", "/schedules/availability", lambda i: request("GET", "/schedules/availability", params={"date": f"{month[0]}-{month[1]:02d}-15", "service_ids": [str(_pick(data.services, i))]})),
+        Scenario("GET", "/schedules/Get/All", lambda i: request("GET", "/schedules/Get/All", params={"limit": 50})),
+        Scenario("GET", "/schedules/Get/All?cursor", lambda i: request("GET", "/schedules/Get/All", params={"limit": 50, "cursor": ""})),
+        Scenario("GET", "/schedules/Get/All?fields", lambda i: request("GET", "/schedules/Get/All", params={"limit": 50, "fields": ""})),
+        Scenario("GET", "/schedules/export", lambda i: request("GET", "/schedules/export", params={"start": f"{month[0]}-{month[1]:02d}-01T00:00:00"})),
+        Scenario("GET", "/schedules/{schedule_id}", lambda i: request("GET", f"/schedules/{_pick(data.schedules, i)}")),
+        Scenario("PUT", "/schedules/{schedule_id}", lambda i: request("PUT", f"/schedules/{_pick(data.schedules, i)}", json={"date_schedule": (datetime(2200, 1, 1, 9) + timedelta(days=i)).isoformat()})),
+        Scenario("GET", "/schedules/", lambda i: request("GET", "/schedules/", params={"month": month[1], "year": month[0]})),
+        Scenario("GET", "/schedules/total/schedules", lambda i: request("GET", "/schedules/total/schedules")),
+        Scenario("GET", "/schedules/total/schedules/by/month", lambda i: request("GET", "/schedules/total/schedules/by/month")),
+        Scenario("GET", "/schedules/total/schedules/by/service", lambda i: request("GET", "/schedules/total/schedules/by/service")),
+        # Importação e análises
+        Scenario("POST", "/import/", lambda i: request("POST", "/import/", content=ndjson.replace(f"i{run}", f"i{run}-{i}-").encode())),
+        Scenario("GET", "/analytics/revenue", lambda i: request("GET", "/analytics/revenue")),
+        Scenario("GET", "/analytics/revenue/by/service", lambda i: request("GET", "/analytics/revenue/by/service")),
+        Scenario("GET", "/analytics/revenue/by/client", lambda i: request("GET", "/analytics/revenue/by/client")),
+        Scenario("GET", "/analytics/top/pets", lambda i: request("GET", "/analytics/top/pets")),
+        Scenario("GET", "/analytics/cache/stats", lambda i: request("GET", "/analytics/cache/stats")),
+        # Remoções, por último e consumindo ids distintos
+        Scenario("DELETE", "/schedules/{schedule_id}", lambda i: _pop(data.schedules, i) and request("DELETE", f"/schedules/{_pop(data.schedules, i)}"), destructive=True),
+        Scenario("DELETE", "/pets/pets/{pet_id}", lambda i: _pop(pets_from_end, i) and request("DELETE", f"/pets/pets/{_pop(pets_from_end, i)}"), destructive=True),
+        Scenario("DELETE", "/clients/{client_id}", lambda i: _pop(data.clients, i) and request("DELETE", f"/clients/{_pop(data.clients, i)}"), destructive=True),
+        Scenario("DELETE", "/services/{service_id}", lambda i: _pop(data.services, i) and request("DELETE", f"/services/{_pop(data.services, i)}"), destructive=True),
+    ]
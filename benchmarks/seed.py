@@ -0,0 +1,108 @@
+"""Popula um banco com volumes configuráveis de clientes, pets, serviços e agendamentos."""
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.search import search_fields
+from app.stores import get_store
+
+BATCH_SIZE = 5000
+
+
+class SeedData:
+    """Ids e valores gerados, usados pelos cenários para montar as requisições."""
+
+    def __init__(self):
+        self.clients: list[ObjectId] = []
+        self.client_docs: list[dict] = []
+        self.pets: list[ObjectId] = []
+        self.pet_owner: dict[ObjectId, ObjectId] = {}
+        self.pet_names: list[str] = []
+        self.services: list[ObjectId] = []
+        self.schedules: list[ObjectId] = []
+        self.months: list[tuple[int, int]] = []
+
+
+async def _insert(collection, docs: list[dict]) -> None:
+    for start in range(0, len(docs), BATCH_SIZE):
+        await collection.insert_many(docs[start:start + BATCH_SIZE], ordered=False)
+
+
+async def seed(
+    db,
+    clients: int,
+    pets_per_client: int,
+    schedules_per_pet: int,
+    services: int,
+    start: datetime = datetime(2024, 1, 1, 8),
+    random_seed: int = 42,
+) -> SeedData:
+    """Insere os documentos direto nas coleções, no mesmo formato gravado pelas rotas.
+
+    Os agendamentos de cada pet ficam espaçados por dias para não conflitarem
+    na checagem de disponibilidade.
+    """
+    rng = random.Random(random_seed)
+    data = SeedData()
+    store = get_store()
+
+    service_docs = [
+        {
+            "_id": ObjectId(),
+            "type_service": f"servico-{index}",
+            "duration_in_minutes": rng.choice([15, 30, 45, 60]),
+            "price": float(rng.randint(20, 400)),
+            "store_id": store,
+        }
+        for index in range(services)
+    ]
+    data.services = [doc["_id"] for doc in service_docs]
+
+    client_docs, pet_docs, schedule_docs = [], [], []
+    slot = 0
+    for index in range(clients):
+        client_doc = {"_id": ObjectId(), "name": f"Cliente {index}", "cpf": f"{index:011d}", "age": rng.randint(18, 90), "is_admin": False, "store_id": store}
+        client_docs.append(client_doc)
+
+        for pet_index in range(pets_per_client):
+            name = f"Pet {index}-{pet_index}"
+            pet_doc = {
+                "_id": ObjectId(),
+                "client": client_doc["_id"],
+                "name": name,
+                "breed": rng.choice(["vira-lata", "poodle", "labrador", "siamês"]),
+                "age": rng.randint(1, 15),
+                "size_in_centimeters": rng.randint(20, 90),
+                **search_fields(name),
+                "store_id": store,
+            }
+            pet_docs.append(pet_doc)
+            data.pet_owner[pet_doc["_id"]] = client_doc["_id"]
+            data.pet_names.append(name)
+
+            for _ in range(schedules_per_pet):
+                # Um agendamento por vez na agenda, a cada 2 horas de um dia de 10 horas
+                date_schedule = start + timedelta(days=slot // 5, hours=2 * (slot % 5))
+                slot += 1
+                schedule_docs.append({
+                    "_id": ObjectId(),
+                    "client": client_doc["_id"],
+                    "pet": pet_doc["_id"],
+                    "services": rng.sample(data.services, k=min(len(data.services), rng.randint(1, 2))),
+                    "date_schedule": date_schedule,
+                    "store_id": store,
+                })
+
+    await _insert(db["services"], service_docs)
+    await _insert(db["client"], client_docs)
+    await _insert(db["pet"], pet_docs)
+    await _insert(db["schedule"], schedule_docs)
+
+    data.client_docs = client_docs
+    data.clients = [doc["_id"] for doc in client_docs]
+    data.pets = [doc["_id"] for doc in pet_docs]
+    data.schedules = [doc["_id"] for doc in schedule_docs]
+    data.months = sorted({(doc["date_schedule"].year, doc["date_schedule"].month) for doc in schedule_docs})
+
+    return data
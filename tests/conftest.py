@@ -0,0 +1,64 @@
+"""Fixtures dos testes: o app sobre o backend em memória de benchmarks.memory.
+
+    pip install pytest mongomock-motor
+    python -m pytest
+"""
+import os
+from uuid import uuid4
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+# O app lê o banco do ambiente na importação
+os.environ["MONGO_DB"] = "petshop_test"
+
+from benchmarks import memory
+
+memory.install()
+
+from fastapi.testclient import TestClient
+
+from app import database
+from app.main import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    database._transactions_supported = False
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def make_client(client):
+    def make(**fields) -> dict:
+        body = {"name": "Cliente", "cpf": uuid4().hex[:11], "age": 30, "is_admin": False, **fields}
+        response = client.post("/clients/", json=body)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return make
+
+
+@pytest.fixture
+def make_pet(client, make_client):
+    def make(owner: dict | None = None, **fields) -> dict:
+        owner = owner or make_client()
+        body = {"name": f"Pet {uuid4().hex[:8]}", "breed": "vira-lata", "age": 3, "size_in_centimeters": 40, "client": owner, **fields}
+        response = client.post(f"/pets/{owner['id']}/pet/", json=body)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return make
+
+
+@pytest.fixture
+def make_service(client):
+    def make(**fields) -> dict:
+        body = {"type_service": f"Banho {uuid4().hex[:8]}", "duration_in_minutes": 30, "price": 50.0, **fields}
+        response = client.post("/services/", json=body)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return make
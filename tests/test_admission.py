@@ -0,0 +1,19 @@
+import asyncio
+
+from app.admission import AdmissionPool
+
+
+def test_pool_can_be_reused_from_another_event_loop():
+    pool = AdmissionPool("test", limit=1, queue_size=1, timeout=1, retry_after=1)
+
+    async def contend():
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        pool.release()
+        await waiter
+        return pool.stats()["active"]
+
+    # Uma espera com o semáforo ocupado prende o semáforo ao loop
+    assert asyncio.run(contend()) == 1
+    assert asyncio.run(contend()) == 1
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app import database
+
+
+def test_revenue_uses_stored_price_and_catalog_price_for_legacy_schedules(client, make_pet, make_service):
+    pet = make_pet()
+    service = make_service(price=50.0)
+    response = client.post("/schedules/", json={
+        "client_id": pet["client"]["id"],
+        "pet_id": pet["id"],
+        "service_ids": [service["id"]],
+        "date_schedule": "2031-05-10T10:00:00",
+    })
+    assert response.status_code == 200, response.text
+    assert client.put(f"/services/{service['id']}", json={"price": 80.0}).status_code == 200
+
+    async def insert_legacy():
+        # Agendamento anterior ao snapshot de preços, sem `total_price`
+        await database.get_database()["schedule"].insert_one({
+            "store_id": "main",
+            "client": ObjectId(pet["client"]["id"]),
+            "pet": ObjectId(pet["id"]),
+            "services": [ObjectId(service["id"])],
+            "date_schedule": datetime(2031, 5, 11, 10),
+        })
+
+    client.portal.call(insert_legacy)
+    period = {"start": "2031-05-01T00:00:00", "end": "2031-06-01T00:00:00"}
+
+    response = client.get("/analytics/revenue", params={"period": "month", **period})
+    assert response.status_code == 200, response.text
+    assert response.json() == [{"period": "2031-05", "revenue": 130.0, "total_schedules": 2}]
+
+    response = client.get("/analytics/revenue/by/client", params=period)
+    assert response.status_code == 200, response.text
+    assert response.json() == [
+        {"client_id": pet["client"]["id"], "client_name": pet["client"]["name"], "revenue": 130.0, "total_schedules": 2}
+    ]
@@ -0,0 +1,20 @@
+def test_update_client_to_taken_cpf_is_rejected(client, make_client):
+    taken = make_client()
+    other = make_client()
+    body = {"name": other["name"], "cpf": taken["cpf"], "age": other["age"], "is_admin": False}
+
+    response = client.put(f"/clients/{other['id']}", json=body)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"O Cliente com o cpf {taken['cpf']} já foi cadastrado"
+    assert client.get(f"/clients/{other['id']}").json()["cpf"] == other["cpf"]
+
+
+def test_update_client_keeping_its_cpf(client, make_client):
+    existing = make_client()
+    body = {"name": "Novo nome", "cpf": existing["cpf"], "age": existing["age"], "is_admin": False}
+
+    response = client.put(f"/clients/{existing['id']}", json=body)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["name"] == "Novo nome"
@@ -0,0 +1,67 @@
+from datetime import date
+
+
+def test_rename_pet_to_existing_name_is_rejected(client, make_client, make_pet):
+    owner = make_client()
+    taken = make_pet(owner)
+    pet = make_pet(owner)
+
+    response = client.put(f"/pets/{pet['id']}", json={"name": taken["name"]})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"O cliente {owner['id']} já tem um pet com o nome {taken['name']} cadastrado"
+    assert client.get(f"/pets/{owner['id']}").status_code == 200
+
+
+def test_update_pet_keeping_its_name(client, make_pet):
+    pet = make_pet()
+
+    response = client.put(f"/pets/{pet['id']}", json={"name": pet["name"], "age": 4})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["age"] == 4
+
+
+def test_search_by_name_ranks_exact_prefix_word_and_substring(client, make_client, make_pet):
+    owner = make_client()
+    for name in ("Abolo", "Rex Bolado", "Bolinha", "Bol"):
+        make_pet(owner, name=name)
+
+    response = client.get("/pets/bol/pet-name", params={"client_id": owner["id"]})
+
+    assert response.status_code == 200, response.text
+    assert [pet["name"] for pet in response.json()] == ["Bol", "Bolinha", "Rex Bolado", "Abolo"]
+    assert "name_search" not in response.json()[0]
+
+    response = client.get("/pets/bol/pet-name", params={"client_id": owner["id"], "offset": 3})
+    assert [pet["name"] for pet in response.json()] == ["Abolo"]
+
+
+def _free_starts(client, day: str, service: dict) -> list[str]:
+    response = client.get("/schedules/availability", params={"date": day, "service_ids": [service["id"]]})
+    assert response.status_code == 200, response.text
+    return [slot["start"] for slot in response.json()["slots"]]
+
+
+def test_delete_pet_frees_only_the_days_of_its_schedules(client, make_pet, make_service):
+    from app.routes.ScheduleRoutes import availability
+
+    pet = make_pet()
+    service = make_service()
+    response = client.post("/schedules/", json={
+        "client_id": pet["client"]["id"],
+        "pet_id": pet["id"],
+        "service_ids": [service["id"]],
+        "date_schedule": "2030-03-05T10:00:00",
+    })
+    assert response.status_code == 200, response.text
+    assert "2030-03-05T10:00:00" not in _free_starts(client, "2030-03-05", service)
+    other_day = _free_starts(client, "2030-03-06", service)
+    other_day_index = availability._days[("main", date(2030, 3, 6))]
+
+    response = client.delete(f"/pets/pets/{pet['id']}")
+
+    assert response.status_code == 200, response.text
+    assert "2030-03-05T10:00:00" in _free_starts(client, "2030-03-05", service)
+    assert availability._days[("main", date(2030, 3, 6))] is other_day_index
+    assert _free_starts(client, "2030-03-06", service) == other_day
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app import database
+
+
+def _month_total(client, month: str) -> int:
+    months = client.get("/schedules/total/schedules/by/month").json()
+    return next((item["total_schedules"] for item in months if item["month"] == month), 0)
+
+
+def test_reschedule_within_month_keeps_month_total(client, make_pet, make_service):
+    pet = make_pet()
+    service = make_service()
+    response = client.post("/schedules/", json={
+        "client_id": pet["client"]["id"],
+        "pet_id": pet["id"],
+        "service_ids": [service["id"]],
+        "date_schedule": "2030-01-10T10:00:00",
+    })
+    assert response.status_code == 200, response.text
+    schedule_id = response.json()["id"]
+
+    for day in (15, 20):
+        response = client.put(f"/schedules/{schedule_id}", json={"date_schedule": f"2030-01-{day}T10:00:00"})
+        assert response.status_code == 200, response.text
+
+    assert _month_total(client, "2030-01") == 1
+
+    response = client.put(f"/schedules/{schedule_id}", json={"date_schedule": "2030-02-01T10:00:00"})
+    assert response.status_code == 200, response.text
+    assert _month_total(client, "2030-01") == 0
+    assert _month_total(client, "2030-02") == 1
+
+
+def _other_worker_books(client, pet: dict, service: dict, start: datetime) -> None:
+    """Grava direto no banco, sem passar pelo cache de horários deste processo."""
+    async def insert():
+        await database.get_database()["schedule"].insert_one({
+            "store_id": "main",
+            "client": ObjectId(pet["client"]["id"]),
+            "pet": ObjectId(pet["id"]),
+            "services": [ObjectId(service["id"])],
+            "date_schedule": start,
+            "end_time": start + timedelta(minutes=service["duration_in_minutes"]),
+        })
+
+    client.portal.call(insert)
+
+
+def _schedules_at(client, start: datetime) -> int:
+    async def count():
+        return await database.get_database()["schedule"].count_documents({"date_schedule": start})
+
+    return client.portal.call(count)
+
+
+def test_booking_taken_by_another_worker_is_rejected(client, make_pet, make_service):
+    pet = make_pet()
+    service = make_service()
+    start = datetime(2032, 4, 1, 9)
+    # Carrega o dia no cache antes da gravação do outro worker
+    assert client.get("/schedules/availability", params={"date": "2032-04-01", "service_ids": [service["id"]]}).status_code == 200
+    _other_worker_books(client, pet, service, start)
+    body = {"client_id": pet["client"]["id"], "pet_id": pet["id"], "service_ids": [service["id"]]}
+
+    response = client.post("/schedules/", json={**body, "date_schedule": start.isoformat()})
+    assert response.status_code == 409
+
+    response = client.post("/schedules/batch", json=[{**body, "date_schedule": (start + timedelta(minutes=15)).isoformat()}])
+    assert response.status_code == 200
+    assert response.json()[0]["error"] is not None
+
+    response = client.post("/schedules/", json={**body, "date_schedule": "2032-04-01T14:00:00"})
+    assert response.status_code == 200, response.text
+    schedule_id = response.json()["id"]
+    _other_worker_books(client, pet, service, datetime(2032, 4, 1, 16))
+    response = client.put(f"/schedules/{schedule_id}", json={"date_schedule": "2032-04-01T16:00:00"})
+    assert response.status_code == 409
+    assert client.get(f"/schedules/{schedule_id}").json()["date_schedule"] == "2032-04-01T14:00:00"
+
+    assert _schedules_at(client, start) == 1
+    assert _schedules_at(client, start + timedelta(minutes=15)) == 0
+    assert _schedules_at(client, datetime(2032, 4, 1, 16)) == 1